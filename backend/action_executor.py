@@ -0,0 +1,315 @@
+import json
+import logging
+import math
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from models import (
+    User, UserProfile, University, ShortlistedUniversity, Task,
+    UserStage, ProfileStrength, UniversityCategory
+)
+from cache import invalidate_profile, invalidate_user_context
+from task_ingest import normalize_task, existing_task_titles, insert_tasks
+
+logger = logging.getLogger("AICounsellor")
+
+APPLIED = "applied"
+SKIPPED = "skipped"
+FAILED = "failed"
+
+# Actions that only read; their results stand even if the batch is rolled back
+READ_ONLY = {"SEARCH_UNIVERSITIES"}
+
+
+def _as_int(value) -> Optional[int]:
+    if isinstance(value, bool):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _text(value) -> str:
+    if isinstance(value, (dict, list, tuple, set)):
+        raise ValueError(f"Expected text, got {type(value).__name__}")
+    return str(value)
+
+
+def _number(kind):
+    """Coerce to `kind`, rejecting booleans, NaN and infinity"""
+    def coerce(value):
+        if isinstance(value, bool):
+            raise ValueError("Expected a number, got a boolean")
+        try:
+            number = kind(value)
+        except OverflowError:
+            raise ValueError(f"Not a finite number: {value}")
+        if not math.isfinite(number):
+            raise ValueError(f"Not a finite number: {value}")
+        return number
+    return coerce
+
+
+def _countries(value) -> str:
+    # Stored as a JSON list, which recommendation_planner.parse_preferred_countries reads back
+    if isinstance(value, (list, tuple)):
+        return json.dumps([str(c).strip() for c in value if str(c).strip()])
+    return _text(value)
+
+
+# Profile columns the model may set, with the function each value is coerced by
+PROFILE_FIELDS = {
+    "education_level": _text, "degree": _text, "major": _text, "graduation_year": _number(int),
+    "gpa": _number(float), "age": _number(int), "intended_degree": _text, "field_of_study": _text,
+    "target_intake_year": _number(int), "preferred_countries": _countries, "budget_min": _number(float),
+    "budget_max": _number(float), "funding_plan": _text, "ielts_score": _number(float), "toefl_score": _number(int),
+    "gre_score": _number(int), "gmat_score": _number(int), "sop_status": _text,
+}
+
+
+class ActionBatch:
+    """All actions from one AI reply, applied in a single transaction.
+
+    Universities, shortlist rows, tasks and the profile the actions refer to are
+    loaded up front with one query each. Each action is then checked against
+    that data and either applied to the session or skipped. One commit follows.
+    If the commit fails, nothing from the batch is kept and every applied action
+    is reported as failed.
+    """
+
+    def __init__(self, actions: List[Dict], user: User, db: Session):
+        self.actions = actions
+        self.user = user
+        self.db = db
+        self.universities: Dict[int, University] = {}
+        self.shortlist: Dict[int, ShortlistedUniversity] = {}
+        self.tasks: Dict[int, Task] = {}
+        self.profile: Optional[UserProfile] = None
+        self.task_titles: set = set()
+        self.new_tasks: List[Dict] = []
+        self.context_changed = False
+        self.profile_changed = False
+
+    def _params(self, action: Dict) -> Dict:
+        params = action.get("params")
+        return params if isinstance(params, dict) else {}
+
+    def _task_row(self, params: Dict) -> Dict:
+        return normalize_task({**params, "title": params.get("title") or "New Task"})
+
+    def _ids(self, names, key: str) -> set:
+        ids = set()
+        for action in self.actions:
+            if action.get("action") in names:
+                value = _as_int(self._params(action).get(key))
+                if value is not None:
+                    ids.add(value)
+        return ids
+
+    def prefetch(self) -> None:
+        names = {action.get("action") for action in self.actions}
+        university_ids = self._ids({"SHORTLIST_UNIVERSITY", "LOCK_UNIVERSITY"}, "university_id")
+        if university_ids:
+            self.universities = {
+                uni.id: uni for uni in
+                self.db.query(University).filter(University.id.in_(university_ids))
+            }
+            self.shortlist = {
+                row.university_id: row for row in
+                self.db.query(ShortlistedUniversity).filter(
+                    ShortlistedUniversity.user_id == self.user.id,
+                    ShortlistedUniversity.university_id.in_(university_ids)
+                )
+            }
+        task_ids = self._ids({"DELETE_TASK"}, "task_id")
+        if task_ids:
+            self.tasks = {
+                task.id: task for task in
+                self.db.query(Task).filter(Task.user_id == self.user.id, Task.id.in_(task_ids))
+            }
+        if "CREATE_TASK" in names:
+            self.task_titles = existing_task_titles(self.db, self.user.id, (
+                self._task_row(self._params(a))["title"]
+                for a in self.actions if a.get("action") == "CREATE_TASK"
+            ))
+        if "UPDATE_PROFILE" in names:
+            self.profile = self.db.query(UserProfile).filter(UserProfile.user_id == self.user.id).first()
+
+    def execute(self) -> List[Dict]:
+        """Apply every action and commit once; returns one result per action, in order"""
+        if not self.actions:
+            return []
+        self.prefetch()
+
+        results = []
+        for action in self.actions:
+            name = action.get("action")
+            handler = self.HANDLERS.get(name)
+            if handler is None:
+                results.append({"action": name, "status": SKIPPED, "detail": "Unknown action"})
+                continue
+            try:
+                result = handler(self, self._params(action))
+            except Exception as e:
+                logger.warning(f"Could not apply AI action {action}: {str(e)}")
+                result = {"status": FAILED, "detail": str(e)}
+            results.append({"action": name, **result})
+
+        if any(result["status"] == APPLIED for result in results):
+            try:
+                # Every CREATE_TASK in the reply goes in as one statement
+                insert_tasks(self.db, self.user.id, self.new_tasks)
+                self.db.commit()
+            except Exception as e:
+                logger.error(f"Rolling back AI actions for user {self.user.id}: {str(e)}")
+                self.db.rollback()
+                # Replaced outright so no payload (e.g. PROFILE_UPDATE fields) suggests a saved change
+                return [
+                    {"action": result["action"], "status": FAILED, "detail": "Not saved: the batch was rolled back"}
+                    if result["status"] == APPLIED and result["action"] not in READ_ONLY else result
+                    for result in results
+                ]
+            if self.profile_changed:
+                invalidate_profile(self.user.id)
+            if self.context_changed:
+                invalidate_user_context(self.user.id)
+        return results
+
+    def search_universities(self, params: Dict) -> Dict:
+        country = params.get("country")
+        max_pricing = params.get("max_pricing")
+        min_ranking = params.get("min_ranking")
+        scholarship_only = params.get("scholarship_only", False)
+
+        query = self.db.query(University)
+        if country:
+            query = query.filter(University.country.ilike(f"%{country}%"))
+        if max_pricing:
+            query = query.filter(University.tuition_fee_min <= max_pricing)
+        if min_ranking:
+            query = query.filter(University.ranking >= min_ranking)
+        if scholarship_only:
+            query = query.filter(University.scholarship_available == True)
+
+        # Format results for the frontend
+        results = [
+            {
+                "id": uni.id,
+                "name": uni.name,
+                "country": uni.country,
+                "ranking": uni.ranking,
+                "tuition": uni.tuition_fee_min,
+                "scholarship": uni.scholarship_available
+            }
+            for uni in query.limit(5)
+        ]
+        return {"status": APPLIED, "type": "UNIVERSITY_SEARCH", "results": results}
+
+    def create_task(self, params: Dict) -> Dict:
+        row = self._task_row(params)
+        if row["title"] in self.task_titles:
+            return {"status": SKIPPED, "detail": f"Task '{row['title']}' already exists"}
+        self.task_titles.add(row["title"])
+        self.new_tasks.append(row)
+        return {"status": APPLIED, "detail": f"Created task '{row['title']}'"}
+
+    def update_stage(self, params: Dict) -> Dict:
+        stage = params.get("stage")
+        if stage not in [s.value for s in UserStage]:
+            return {"status": SKIPPED, "detail": f"Unknown stage '{stage}'"}
+        self.user.current_stage = UserStage(stage)
+        self.context_changed = True
+        return {"status": APPLIED, "detail": f"Stage set to {stage}"}
+
+    def shortlist_university(self, params: Dict) -> Dict:
+        uni_id = _as_int(params.get("university_id"))
+        if uni_id not in self.universities:
+            return {"status": SKIPPED, "detail": "University not found"}
+        if uni_id in self.shortlist:
+            return {"status": SKIPPED, "detail": "Already shortlisted"}
+        category = params.get("category", "target")
+        if category not in [c.value for c in UniversityCategory]:
+            category = "target"
+        row = ShortlistedUniversity(
+            user_id=self.user.id,
+            university_id=uni_id,
+            category=UniversityCategory(category),
+            fit_score=params.get("fit_score", 70),
+            risk_level=params.get("risk_level", "Medium"),
+            ai_reasoning=params.get("reasoning", "Recommended by AI Counsellor")
+        )
+        self.db.add(row)
+        # A LOCK_UNIVERSITY later in the same reply finds the new row
+        self.shortlist[uni_id] = row
+        # Update stage if needed
+        if self.user.current_stage == UserStage.DISCOVERING_UNIVERSITIES:
+            self.user.current_stage = UserStage.FINALIZING_UNIVERSITIES
+        self.context_changed = True
+        return {"status": APPLIED, "detail": f"Shortlisted {self.universities[uni_id].name}"}
+
+    def lock_university(self, params: Dict) -> Dict:
+        uni_id = _as_int(params.get("university_id"))
+        row = self.shortlist.get(uni_id)
+        if row is None:
+            return {"status": SKIPPED, "detail": "University is not on the shortlist"}
+        row.is_locked = True
+        row.locked_at = datetime.utcnow()
+        self.user.current_stage = UserStage.PREPARING_APPLICATIONS
+        self.context_changed = True
+        return {"status": APPLIED, "detail": f"Locked {self.universities[uni_id].name}"}
+
+    def update_profile(self, params: Dict) -> Dict:
+        if self.profile is None:
+            return {"status": SKIPPED, "detail": "No profile"}
+        # Only known columns with values of the right type, so one bad key
+        # cannot fail the commit for the whole reply
+        values = {}
+        for field, value in params.items():
+            if field not in PROFILE_FIELDS:
+                continue
+            try:
+                values[field] = None if value is None else PROFILE_FIELDS[field](value)
+            except (TypeError, ValueError):
+                if field == "gpa":
+                    return {"status": SKIPPED, "detail": f"Invalid GPA '{value}'"}
+        if not values:
+            return {"status": SKIPPED, "detail": "No editable profile fields"}
+        for field, value in values.items():
+            setattr(self.profile, field, value)
+
+        # Recalculate strengths if GPA change
+        gpa = values.get("gpa")
+        if gpa is not None:
+            if gpa >= 3.5:
+                self.profile.academic_strength = ProfileStrength.STRONG
+            elif gpa >= 3.0:
+                self.profile.academic_strength = ProfileStrength.AVERAGE
+            else:
+                self.profile.academic_strength = ProfileStrength.WEAK
+        self.profile_changed = True
+        return {"status": APPLIED, "type": "PROFILE_UPDATE", "fields": list(values)}
+
+    def delete_task(self, params: Dict) -> Dict:
+        task = self.tasks.pop(_as_int(params.get("task_id")), None)
+        if task is None:
+            return {"status": SKIPPED, "detail": "Task not found"}
+        self.db.delete(task)
+        return {"status": APPLIED, "detail": f"Deleted task '{task.title}'"}
+
+    HANDLERS = {
+        "SEARCH_UNIVERSITIES": search_universities,
+        "CREATE_TASK": create_task,
+        "UPDATE_STAGE": update_stage,
+        "SHORTLIST_UNIVERSITY": shortlist_university,
+        "LOCK_UNIVERSITY": lock_university,
+        "UPDATE_PROFILE": update_profile,
+        "DELETE_TASK": delete_task,
+    }
+
+
+def execute_ai_actions(actions: List[Dict], user: User, db: Session) -> List[Dict]:
+    """Execute the actions from one AI reply in one transaction; one result per action"""
+    return ActionBatch(actions, user, db).execute()
@@ -0,0 +1,166 @@
+import ast
+import json
+import logging
+import re
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger("AICounsellor")
+
+ACTION = "ACTION:"
+PARAMS = "PARAMS:"
+
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_PY_LITERALS = re.compile(r"\b(True|False|None)\b")
+
+
+def parse_params(text: str) -> Dict:
+    """Parse a PARAMS payload, tolerating the usual LLM slips.
+
+    Accepts strict JSON first, then retries with code fences and trailing
+    commas removed, Python literals (True/None, single quotes) and text after
+    the closing brace. Anything that is still not an object yields {}.
+    """
+    try:
+        params = json.loads(text)
+    except (ValueError, TypeError):
+        params = _parse_loose(text)
+    if not isinstance(params, dict):
+        logger.warning(f"Ignoring non-object action params: {text}")
+        return {}
+    return params
+
+
+def _parse_loose(text: str):
+    candidate = text.strip().strip("`").strip()
+    if candidate.lower().startswith("json"):
+        candidate = candidate[4:].strip()
+    start, end = candidate.find("{"), candidate.rfind("}")
+    if start == -1 or end < start:
+        logger.warning(f"Failed to parse action params: {text}")
+        return {}
+    candidate = _TRAILING_COMMA.sub(r"\1", candidate[start:end + 1])
+    try:
+        return json.loads(candidate)
+    except ValueError:
+        pass
+    try:
+        return ast.literal_eval(candidate)
+    except (ValueError, SyntaxError):
+        pass
+    try:
+        return json.loads(_PY_LITERALS.sub(lambda m: {"True": "true", "False": "false", "None": "null"}[m.group(1)], candidate))
+    except ValueError:
+        logger.warning(f"Failed to parse action params: {text}")
+        return {}
+
+
+class ActionStreamParser:
+    """Single-pass, incremental parser for model replies.
+
+    Feed it text chunks as they arrive; it returns ("text", str) events with the
+    user-visible text and ("action", {"action": ..., "params": ...}) events in
+    reply order. An `ACTION:` line is hidden together with a directly following
+    `PARAMS:` line and the visible text comes out stripped, matching the old
+    `_clean_message`/`_parse_actions` pair. Text is released as soon as a line
+    can no longer turn into an action line.
+    """
+
+    def __init__(self):
+        self._line = ""             # current line, not yet released
+        self._line_visible = False  # current line already known to be visible
+        self._pending_action = None # ACTION name waiting to see if PARAMS follows
+        self._kept_lines = 0
+        self._started = False       # any non-whitespace text released yet
+        self._trailing = ""         # whitespace held back until more text follows
+        self.text_parts: List[str] = []
+        self.actions: List[Dict] = []
+
+    def feed(self, chunk: str) -> List[Tuple[str, object]]:
+        """Consume a chunk of model output and return the events it completes"""
+        events = []
+        pieces = chunk.split("\n")
+        last = len(pieces) - 1
+        for i, piece in enumerate(pieces):
+            if piece:
+                if self._line_visible:
+                    self._emit_text(events, piece)
+                else:
+                    self._line += piece
+                    # Complete lines are classified once in _end_line; only the open tail needs an early look
+                    if i == last and not self._could_be_hidden():
+                        self._release_line(events)
+            if i < last:
+                self._end_line(events)
+        return events
+
+    def close(self) -> List[Tuple[str, object]]:
+        """Flush the last line and any action still waiting for its PARAMS"""
+        events = []
+        self._end_line(events)
+        self._emit_pending_action(events)
+        return events
+
+    @property
+    def message(self) -> str:
+        return "".join(self.text_parts)
+
+    def _could_be_hidden(self) -> bool:
+        """Whether the open line may still turn out to be an ACTION/PARAMS line"""
+        head = self._line.lstrip()
+        if not head or head.startswith(ACTION) or ACTION.startswith(head):
+            return True
+        if self._pending_action is not None:
+            return head.startswith(PARAMS) or PARAMS.startswith(head)
+        return False
+
+    def _release_line(self, events) -> None:
+        self._emit_pending_action(events)
+        text = ("\n" if self._kept_lines else "") + self._line
+        self._kept_lines += 1
+        self._line = ""
+        self._line_visible = True
+        self._emit_text(events, text)
+
+    def _end_line(self, events) -> None:
+        if not self._line_visible:
+            stripped = self._line.strip()
+            if stripped.startswith(ACTION):
+                self._emit_pending_action(events)
+                self._pending_action = stripped.replace(ACTION, "").strip()
+            elif self._pending_action is not None and stripped.startswith(PARAMS):
+                name, self._pending_action = self._pending_action, None
+                self._emit_action(events, name, parse_params(self._line.replace(PARAMS, "").strip()))
+            else:
+                self._release_line(events)
+        self._line = ""
+        self._line_visible = False
+
+    def _emit_pending_action(self, events) -> None:
+        if self._pending_action is not None:
+            name, self._pending_action = self._pending_action, None
+            self._emit_action(events, name, {})
+
+    def _emit_action(self, events, name: str, params: Dict) -> None:
+        action = {"action": name, "params": params}
+        self.actions.append(action)
+        events.append(("action", action))
+
+    def _emit_text(self, events, text: str) -> None:
+        """Apply the final .strip() incrementally: drop leading whitespace, hold trailing whitespace"""
+        text = self._trailing + text
+        if not self._started:
+            text = text.lstrip()
+        body = text.rstrip()
+        self._trailing = text[len(body):]
+        if body:
+            self._started = True
+            self.text_parts.append(body)
+            events.append(("text", body))
+
+
+def parse_reply(text: str) -> Tuple[str, List[Dict]]:
+    """Parse a complete reply into (clean message, actions) in one pass"""
+    parser = ActionStreamParser()
+    parser.feed(text)
+    parser.close()
+    return parser.message, parser.actions
@@ -5,8 +5,17 @@ import logging
 import traceback
 from typing import Dict, List, Optional, Any
 from dotenv import load_dotenv
-from models import User, UserProfile, ShortlistedUniversity, University
+from models import User, UserProfile, ShortlistedUniversity, University, ChatMessage, ConversationSummary
 from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
+import numpy as np
+from fit_scoring import UniversityCatalog, RankedUniversities, score_catalog, top_k_indices
+from cache import recommendation_cache, profile_versions, catalog_version, user_context_cache, user_context_key
+from action_parser import ActionStreamParser, parse_reply
+from llm_cache import create_llm_cache
+from llm_client import LLMClient
+from recommendation_planner import RecommendationPlan, materialized_ranking
+from requirement_index import requirement_index
 
 # Setup logging
 logging.basicConfig(
@@ -17,6 +26,37 @@ logger = logging.getLogger("AICounsellor")
 
 load_dotenv()
 
+# Past messages included in each chat prompt
+CHAT_HISTORY_TURNS = 10
+# Approximate token budgets for the recent-message tail and the rolling summary
+CHAT_HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "1200"))
+CHAT_SUMMARY_TOKEN_BUDGET = int(os.getenv("CHAT_SUMMARY_TOKEN_BUDGET", "400"))
+# Unsummarized messages folded per model call; longer backlogs are folded in several chunks
+CHAT_SUMMARY_MAX_FOLD = 50
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token), enough for budgeting prompts"""
+    return (len(text) + 3) // 4
+
+
+def _history_line(msg: Dict) -> str:
+    return f"{msg['role'].upper()}: {msg['content']}\n"
+
+
+def _history_tail(chat_history: List[Dict], budget: int, after_id: int = 0) -> List[Dict]:
+    """Newest messages after `after_id` that fit in `budget` tokens; always keeps the newest one"""
+    tail, used = [], 0
+    for msg in reversed(chat_history[-CHAT_HISTORY_TURNS:]):
+        if (msg.get("id") or 0) <= after_id:
+            break
+        used += estimate_tokens(_history_line(msg))
+        if tail and used > budget:
+            break
+        tail.append(msg)
+    tail.reverse()
+    return tail
+
 class AICounsellorError(Exception):
     """Base exception for AI Counsellor"""
     pass
@@ -32,6 +72,17 @@ class AIGenerationError(AICounsellorError):
 class AICounsellor:
     def __init__(self):
         self.use_mock = False
+        # Rate limit, in-flight limit, retries and circuit breaker for every model call
+        self.llm_client = LLMClient()
+        # Exact-match reply cache in front of every model call; None when LLM_CACHE_BACKEND=off
+        self.llm_cache = create_llm_cache()
+        if os.getenv("LLM_BACKEND", "gemini").lower() == "fake":
+            # Local stand-in for load tests: same network-shaped path, no quota
+            from fake_llm import FakeGenerativeModel
+            self.model = FakeGenerativeModel.from_env()
+            self.model_name = self.model.model_name
+            logger.warning("LLM_BACKEND=fake: answering with the local fake model (no Gemini calls).")
+            return
         try:
             api_key = os.getenv("GEMINI_API_KEY")
             # If no key is found, or it's a placeholder, we enter 'Mock Mode'
@@ -50,6 +101,48 @@ class AICounsellor:
             self.use_mock = True
             self.model = None
 
+    def _cached_reply(self, prompt: str, bypass_cache: bool) -> Optional[str]:
+        if self.llm_cache is None or bypass_cache:
+            return None
+        return self.llm_cache.get(getattr(self.model, "model_name", ""), prompt)
+
+    def _store_reply(self, prompt: str, text: str) -> None:
+        # Stored even when the lookup was bypassed, so a regenerated reply replaces the old one
+        if self.llm_cache is not None:
+            self.llm_cache.set(getattr(self.model, "model_name", ""), prompt, text)
+
+    def _discard_reply(self, prompt: str) -> None:
+        if self.llm_cache is not None:
+            self.llm_cache.discard(getattr(self.model, "model_name", ""), prompt)
+
+    async def _generate(self, prompt: str, bypass_cache: bool = False) -> str:
+        """Complete model reply through the LLM client, without blocking the event loop.
+        
+        Identical prompts are answered from the LLM response cache unless `bypass_cache` is set.
+        Raises LLMUnavailableError immediately while the circuit breaker is open.
+        """
+        cached = self._cached_reply(prompt, bypass_cache)
+        if cached is not None:
+            return cached
+        text = await self.llm_client.generate(self.model, prompt)
+        self._store_reply(prompt, text)
+        return text
+
+    async def _generate_stream(self, prompt: str, bypass_cache: bool = False):
+        """Yield response text chunks as the model produces them, under the same limits as _generate.
+        
+        A cached reply is yielded as a single chunk; a fresh one is cached once the stream completes.
+        """
+        cached = self._cached_reply(prompt, bypass_cache)
+        if cached is not None:
+            yield cached
+            return
+        parts = []
+        async for text in self.llm_client.stream(self.model, prompt):
+            parts.append(text)
+            yield text
+        self._store_reply(prompt, "".join(parts))
+
     def _generate_mock_response(self, message: str, user: User, profile: UserProfile) -> Dict:
         """
         Generates a local, rule-based response without contacting the Gemini API.
@@ -76,7 +169,18 @@ class AICounsellor:
         }
 
     def get_user_context(self, user: User, profile: UserProfile, db: Session) -> str:
-        """Build comprehensive user context for AI"""
+        """User context for the AI, rebuilt only after the user's profile, shortlist or stage changed"""
+        # Read the stamps before building so a concurrent change lands under a newer key
+        key = user_context_key(user.id)
+        context = user_context_cache.get(key)
+        if context is None:
+            context = self._build_user_context(user, profile, db)
+            if context is not None:
+                user_context_cache.set(key, context)
+        return context or "User context could not be built due to an internal error."
+
+    def _build_user_context(self, user: User, profile: UserProfile, db: Session) -> Optional[str]:
+        """Build comprehensive user context for AI; None if it could not be built"""
         try:
             # Get shortlisted universities
             shortlisted = db.query(ShortlistedUniversity).filter(
@@ -130,13 +234,12 @@ TOP 10 UNIVERSITY MATCHES (AVAILABLE FOR ACTIONS):
             return context
         except Exception as e:
             logger.error(f"Error building user context: {str(e)}")
-            return "User context could not be built due to an internal error."
+            return None
 
     def _get_top_matches_context(self, profile: UserProfile, db: Session) -> str:
         """Get summarized list of top 10 matches for AI context"""
         try:
-            universities = db.query(University).all()
-            recs = self.recommend_universities(profile, universities)[:10]
+            recs = self.get_recommendations(profile, db, limit=10)
             
             lines = []
             for r in recs:
@@ -191,40 +294,26 @@ Be concise, premium, and professional. Use bullet points for lists."""
         message: str,
         user: User,
         profile: UserProfile,
-        chat_history: List[Dict],
-        db: Session
+        conversation: str,
+        bypass_cache: bool = False
     ) -> Dict:
-        """Process chat message and return response with potential actions"""
+        """Process chat message and return response with potential actions.
+        
+        `conversation` is the prompt from build_conversation(); no database access
+        happens here, so callers can end their transaction before awaiting this.
+        """
         
         # Check if we should use Mock Mode (No Key scenario)
         if self.use_mock or not self.model:
             return self._generate_mock_response(message, user, profile)
 
         try:
-            # Build context
-            user_context = self.get_user_context(user, profile, db)
-            system_prompt = self.get_system_prompt()
-            
-            # Build conversation history
-            conversation = f"{system_prompt}\n\n{user_context}\n\nCONVERSATION HISTORY:\n"
-            for msg in chat_history[-10:]:  # Last 10 messages for context
-                conversation += f"{msg['role'].upper()}: {msg['content']}\n"
-            
-            conversation += f"USER: {message}\nASSISTANT:"
-            
             # Generate response with advanced error handling for Quota/Network
             try:
-                response = self.model.generate_content(conversation)
-                if not response or not response.text:
-                    raise AIGenerationError("Empty response from AI")
-                
-                ai_message = response.text
+                ai_message = await self._generate(conversation, bypass_cache=bypass_cache)
                 
-                # Parse for actions (this has its own internal error handling)
-                actions = self._parse_actions(ai_message)
-                
-                # Clean message (remove action syntax)
-                clean_message = self._clean_message(ai_message)
+                # Split the reply into visible text and action commands in one pass
+                clean_message, actions = parse_reply(ai_message)
                 
                 return {
                     "message": clean_message,
@@ -241,61 +330,186 @@ Be concise, premium, and professional. Use bullet points for lists."""
             logger.error(f"Unexpected error in AI Chat flow: {str(e)}")
             return self._generate_mock_response(message, user, profile)
     
-    def _parse_actions(self, message: str) -> List[Dict]:
-        """Parse action commands from AI response"""
-        actions = []
+    async def chat_stream(
+        self,
+        message: str,
+        user: User,
+        profile: UserProfile,
+        conversation: str,
+        bypass_cache: bool = False
+    ):
+        """Stream a chat reply.
+        
+        Yields ("token", text) for each piece of visible text as it arrives, with
+        action lines already hidden, then one ("done", result) where result has
+        the same shape as chat(). The final message in result is authoritative.
+        """
+        if self.use_mock or not self.model:
+            result = self._generate_mock_response(message, user, profile)
+            yield "token", result["message"]
+            yield "done", result
+            return
+        
         try:
-            lines = message.split('\n')
+            parser = ActionStreamParser()
+            received = False
+            async for chunk in self._generate_stream(conversation, bypass_cache=bypass_cache):
+                received = received or bool(chunk)
+                for kind, value in parser.feed(chunk):
+                    if kind == "text":
+                        yield "token", value
+            for kind, value in parser.close():
+                if kind == "text":
+                    yield "token", value
             
-            i = 0
-            while i < len(lines):
-                line = lines[i].strip()
-                if line.startswith('ACTION:'):
-                    action_name = line.replace('ACTION:', '').strip()
-                    params = {}
-                    
-                    if i + 1 < len(lines) and lines[i + 1].strip().startswith('PARAMS:'):
-                        try:
-                            params_str = lines[i + 1].replace('PARAMS:', '').strip()
-                            params = json.loads(params_str)
-                            # Increment i to skip the PARAMS line we just processed
-                            i += 1
-                        except json.JSONDecodeError as e:
-                            logger.warning(f"Failed to parse action params: {params_str}. Error: {e}")
-                    
-                    actions.append({
-                        "action": action_name,
-                        "params": params
-                    })
-                i += 1
-        except Exception as e:
-            logger.error(f"Error parsing actions: {str(e)}")
+            if not received:
+                raise AIGenerationError("Empty response from AI")
+            result = {
+                "message": parser.message,
+                "actions": parser.actions,
+                "success": True,
+                "is_mock": False
+            }
+        except Exception as api_err:
+            logger.error(f"Gemini streaming call failed: {str(api_err)}. Switching to safe fallback.")
+            result = self._generate_mock_response(message, user, profile)
+        
+        yield "done", result
+    
+    def build_conversation(
+        self,
+        message: str,
+        user: User,
+        profile: UserProfile,
+        chat_history: List[Dict],
+        db: Session,
+        summary: Optional[ConversationSummary] = None
+    ) -> str:
+        """Assemble the chat prompt: system prompt, user context, conversation summary and a budgeted tail"""
+        # Build context
+        user_context = self.get_user_context(user, profile, db)
+        system_prompt = self.get_system_prompt()
+        
+        # Messages already in the summary are left out; the rest is trimmed to the token budget
+        summarized_through = summary.last_message_id if summary else 0
+        tail = _history_tail(chat_history, CHAT_HISTORY_TOKEN_BUDGET, summarized_through)
         
-        return actions
+        conversation = f"{system_prompt}\n\n{user_context}\n\n"
+        if summary and summary.summary:
+            conversation += f"CONVERSATION SUMMARY (earlier messages):\n{summary.summary}\n\n"
+        conversation += "CONVERSATION HISTORY:\n"
+        conversation += "".join(_history_line(msg) for msg in tail)
+        conversation += f"USER: {message}\nASSISTANT:"
+        
+        # Size the same prompt would have had with the last CHAT_HISTORY_TURNS raw messages
+        raw_history = "".join(_history_line(msg) for msg in chat_history[-CHAT_HISTORY_TURNS:])
+        unbounded = estimate_tokens(system_prompt + user_context + raw_history + message)
+        logger.info(
+            f"Chat prompt for user {user.id}: ~{estimate_tokens(conversation)} tokens "
+            f"(raw last {CHAT_HISTORY_TURNS} messages: ~{unbounded} tokens; "
+            f"{len(tail)} recent messages, summary {'yes' if summary and summary.summary else 'no'})"
+        )
+        return conversation
+    
+    def plan_summary_fold(self, user_id: int, db: Session) -> Optional[Dict]:
+        """The next chunk of messages that have left the recent window and are due to
+        be folded into the user's rolling summary, as plain data; None when nothing is due.
+        
+        Folds until the unsummarized tail fits in half the history budget, so the
+        next turn's new messages still fit without dropping anything unsummarized.
+        Chunks are the oldest CHAT_SUMMARY_MAX_FOLD due messages, so plan, summarize
+        and save in a loop until this returns None.
+        Only reads; pass the result to summarize_fold() and save_summary_fold().
+        """
+        summary = db.query(ConversationSummary).filter(ConversationSummary.user_id == user_id).first()
+        summarized_through = summary.last_message_id if summary else 0
+        
+        recent = db.query(ChatMessage).filter(
+            ChatMessage.user_id == user_id,
+            ChatMessage.id > summarized_through
+        ).order_by(ChatMessage.id.desc()).limit(CHAT_HISTORY_TURNS).all()
+        recent.reverse()
+        keep = _history_tail(
+            [{"id": m.id, "role": m.role, "content": m.content} for m in recent],
+            CHAT_HISTORY_TOKEN_BUDGET // 2,
+            summarized_through
+        )
+        if not keep:
+            return None
+        
+        # Oldest CHAT_SUMMARY_MAX_FOLD unsummarized messages older than the kept tail
+        fold = db.query(ChatMessage).filter(
+            ChatMessage.user_id == user_id,
+            ChatMessage.id > summarized_through,
+            ChatMessage.id < keep[0]["id"]
+        ).order_by(ChatMessage.id).limit(CHAT_SUMMARY_MAX_FOLD).all()
+        if not fold:
+            return None
+        
+        return {
+            "previous": summary.summary if summary else "",
+            "summarized_through": summarized_through,
+            "folded_through": fold[-1].id,
+            "messages": [{"role": m.role, "content": m.content} for m in fold],
+        }
     
-    def _clean_message(self, message: str) -> str:
-        """Remove action syntax from message"""
+    async def summarize_fold(self, plan: Dict) -> str:
+        """The updated summary text for a plan from plan_summary_fold(); no database access"""
+        return await self._summarize(plan["previous"], plan["messages"])
+    
+    def save_summary_fold(self, user_id: int, plan: Dict, updated: str, db: Session) -> bool:
+        """Store the summary for `plan` and commit; False if another turn folded these messages first"""
+        summary = db.query(ConversationSummary).filter(ConversationSummary.user_id == user_id).first()
+        if summary is None:
+            if plan["summarized_through"]:
+                return False
+            summary = ConversationSummary(user_id=user_id)
+            db.add(summary)
+        elif summary.last_message_id != plan["summarized_through"]:
+            # Another turn folded these messages while we were summarizing
+            return False
+        summary.summary = updated
+        summary.last_message_id = plan["folded_through"]
         try:
-            lines = message.split('\n')
-            clean_lines = []
-            
-            i = 0
-            while i < len(lines):
-                line = lines[i].strip()
-                if line.startswith('ACTION:'):
-                    # Check if next line is PARAMS
-                    if i + 1 < len(lines) and lines[i + 1].strip().startswith('PARAMS:'):
-                        i += 2
-                    else:
-                        i += 1
-                else:
-                    clean_lines.append(lines[i])
-                    i += 1
-            
-            return '\n'.join(clean_lines).strip()
-        except Exception as e:
-            logger.error(f"Error cleaning message: {str(e)}")
-            return message # Return original if cleaning fails
+            db.commit()
+        except IntegrityError:
+            # Concurrent first summary for this user; keep theirs
+            db.rollback()
+            return False
+        logger.info(
+            f"Conversation summary for user {user_id}: folded {len(plan['messages'])} messages, "
+            f"~{estimate_tokens(updated)} tokens"
+        )
+        return True
+    
+    async def _summarize(self, previous: str, messages: List[Dict]) -> str:
+        """Merge `messages` into `previous`, with the model when available"""
+        max_chars = CHAT_SUMMARY_TOKEN_BUDGET * 4
+        transcript = "".join(_history_line(m) for m in messages)
+        if not self.use_mock and self.model:
+            prompt = f"""Update the running summary of a study-abroad counselling conversation.
+Keep the student's goals, decisions, preferences, universities discussed, tasks agreed and open questions.
+Drop greetings and small talk. Write plain sentences, at most {CHAT_SUMMARY_TOKEN_BUDGET * 3 // 4} words.
+
+CURRENT SUMMARY:
+{previous or "(none yet)"}
+
+NEW MESSAGES:
+{transcript}
+UPDATED SUMMARY:"""
+            try:
+                return (await self._generate(prompt)).strip()[:max_chars]
+            except Exception as e:
+                logger.warning(f"Summary generation failed, keeping an extractive summary: {str(e)}")
+        
+        # Extractive fallback: one clipped line per message, oldest lines dropped first
+        lines = previous.split("\n") if previous else []
+        for m in messages:
+            content = " ".join(m["content"].split())
+            lines.append(f"{m['role'].upper()}: {content[:200]}{'...' if len(content) > 200 else ''}")
+        while len(lines) > 1 and sum(len(line) + 1 for line in lines) > max_chars:
+            lines.pop(0)
+        return "\n".join(lines)[-max_chars:]
     
     def analyze_profile(self, profile: UserProfile) -> Dict:
         """Analyze profile strength and provide recommendations"""
@@ -343,45 +557,166 @@ Be concise, premium, and professional. Use bullet points for lists."""
     def recommend_universities(
         self,
         profile: UserProfile,
-        universities: List[University]
+        universities: List[University],
+        limit: Optional[int] = None
     ) -> List[Dict]:
-        """Recommend universities based on profile"""
+        """Recommend universities based on profile, best fit first.
+        
+        With `limit`, only the top `limit` rows are selected and get reasoning text.
+        """
+        return self._rank_universities(profile, universities, limit)[0]
+    
+    def _rank_universities(
+        self,
+        profile: UserProfile,
+        universities: List[University],
+        limit: Optional[int] = None
+    ):
+        """Score and rank universities, returning (recommendations, RankedUniversities)"""
         try:
-            recommendations = []
-            
-            for uni in universities:
-                # Calculate fit score
-                fit_score = self._calculate_fit_score(profile, uni)
-                
-                # Determine category
-                if fit_score >= 80:
-                    category = "safe"
-                elif fit_score >= 60:
-                    category = "target"
-                else:
-                    category = "dream"
-                
-                # Determine risk level
-                if fit_score >= 75:
-                    risk = "Low"
-                elif fit_score >= 50:
-                    risk = "Medium"
-                else:
-                    risk = "High"
-                
-                recommendations.append({
-                    "university": uni,
-                    "fit_score": fit_score,
-                    "category": category,
-                    "risk_level": risk,
-                    "reasoning": self._generate_reasoning(profile, uni, fit_score)
-                })
-            
-            return sorted(recommendations, key=lambda x: x['fit_score'], reverse=True)
+            catalog = UniversityCatalog.from_universities(universities)
+            scores = self._score_catalog(profile, catalog)
+            order = top_k_indices(scores, limit)
+            ranked = RankedUniversities(catalog.ids[order], scores[order])
+            return [
+                self._build_recommendation(profile, catalog.universities[i], float(scores[i]))
+                for i in order.tolist()
+            ], ranked
+        except Exception as e:
+            logger.error(f"Error recommending universities: {str(e)}")
+            return [], None
+    
+    def _score_catalog(self, profile: UserProfile, catalog: UniversityCatalog) -> np.ndarray:
+        try:
+            return score_catalog(profile, catalog)
+        except TypeError as e:
+            # Non-numeric profile values: keep the per-row rules and their fallbacks
+            logger.warning(f"Vectorized scoring unavailable ({e}). Scoring row by row.")
+            return np.array(
+                [self._calculate_fit_score(profile, uni) for uni in catalog.universities],
+                dtype=np.float64
+            )
+    
+    def get_recommendations(
+        self,
+        profile: UserProfile,
+        db: Session,
+        limit: Optional[int] = None,
+        preferred_only: bool = False
+    ) -> List[Dict]:
+        """Ranked recommendations for a stored profile.
+        
+        Scoring runs over a lean, pre-filtered column set (see RecommendationPlan)
+        and the ranking is cached per profile and catalog version; full rows are
+        loaded only for the universities that are returned.
+        """
+        try:
+            ranked = self.rank_for_profile(profile, db, limit=limit, preferred_only=preferred_only)
+            return self.hydrate_recommendations(profile, db, ranked, preferred_only=preferred_only)
         except Exception as e:
             logger.error(f"Error recommending universities: {str(e)}")
             return []
     
+    def rank_for_profile(
+        self,
+        profile: UserProfile,
+        db: Session,
+        limit: Optional[int] = None,
+        preferred_only: bool = False
+    ) -> RankedUniversities:
+        """Cached (university id, fit score) ranking for a stored profile"""
+        key = (
+            profile.user_id, profile_versions.get(profile.user_id), catalog_version.get(),
+            limit, preferred_only
+        )
+        ranked = recommendation_cache.get(key)
+        if ranked is None and not preferred_only:
+            ranked = materialized_ranking(db, profile, limit)
+            if ranked is not None:
+                recommendation_cache.set(key, ranked)
+        if ranked is None:
+            plan = RecommendationPlan(profile, preferred_only=preferred_only)
+            ranked = plan.rank(db, lambda catalog: self._score_catalog(profile, catalog), limit)
+            recommendation_cache.set(key, ranked)
+        return ranked
+    
+    def hydrate_recommendations(
+        self,
+        profile: UserProfile,
+        db: Session,
+        ranked: RankedUniversities,
+        preferred_only: bool = False
+    ) -> List[Dict]:
+        """Load the full rows for a ranking and build the recommendation dicts"""
+        plan = RecommendationPlan(profile, preferred_only=preferred_only)
+        ids = ranked.ids.tolist()
+        by_id = plan.fetch_universities(db, ids)
+        return [
+            self._build_recommendation(profile, by_id[uni_id], fit_score)
+            for uni_id, fit_score in zip(ids, ranked.scores.tolist())
+            if uni_id in by_id
+        ]
+    
+    def tier_recommendations(
+        self,
+        profile: UserProfile,
+        db: Session,
+        category: Optional[str] = None,
+        country: Optional[str] = None,
+        limit: Optional[int] = None
+    ) -> List[Dict]:
+        """Recommendations in one category ("safe", "target", "dream") and/or country.
+        
+        Answered from the sorted requirement index, so only rows in matching bands are scored.
+        """
+        try:
+            requirement_index.ensure_loaded(db)
+            pairs = requirement_index.query(profile, category=category, country=country, limit=limit)
+        except TypeError as e:
+            logger.warning(f"Requirement index unavailable for this profile ({e}). Filtering the full ranking.")
+            recs = [
+                r for r in self.get_recommendations(profile, db)
+                if (not category or r["category"] == category)
+                and (not country or (r["university"].country or "").lower().strip() == country.lower().strip())
+            ]
+            return recs if limit is None else recs[:limit]
+        
+        ranked = RankedUniversities(
+            np.array([uni_id for uni_id, _ in pairs], dtype=np.int64),
+            np.array([score for _, score in pairs], dtype=np.float64)
+        )
+        return self.hydrate_recommendations(profile, db, ranked)
+    
+    def _build_recommendation(self, profile: UserProfile, uni: University, fit_score: float) -> Dict:
+        category, risk = self._categorize(fit_score)
+        return {
+            "university": uni,
+            "fit_score": fit_score,
+            "category": category,
+            "risk_level": risk,
+            "reasoning": self._generate_reasoning(profile, uni, fit_score)
+        }
+    
+    def _categorize(self, fit_score: float):
+        """Map a fit score to its (category, risk level) pair"""
+        # Determine category
+        if fit_score >= 80:
+            category = "safe"
+        elif fit_score >= 60:
+            category = "target"
+        else:
+            category = "dream"
+        
+        # Determine risk level
+        if fit_score >= 75:
+            risk = "Low"
+        elif fit_score >= 50:
+            risk = "Medium"
+        else:
+            risk = "High"
+        
+        return category, risk
+    
     def _calculate_fit_score(self, profile: UserProfile, uni: University) -> float:
         """Calculate how well a university fits the student's profile"""
         try:
@@ -455,10 +790,13 @@ Be concise, premium, and professional. Use bullet points for lists."""
         self,
         user: User,
         profile: UserProfile,
-        university: University,
-        db: Session
+        university: University
     ) -> List[Dict]:
-        """Generate specific application tasks for a locked university"""
+        """Generate specific application tasks for a locked university.
+        
+        Only reads attributes already loaded on the objects, so they can come
+        from a session the caller has already closed.
+        """
         if self.use_mock or not self.model:
             return self._generate_mock_tasks(university)
 
@@ -483,19 +821,20 @@ Be concise, premium, and professional. Use bullet points for lists."""
             ]
             """
             
-            response = self.model.generate_content(prompt)
-            if not response or not response.text:
-                return self._generate_mock_tasks(university)
-            
             # Extract JSON from response
-            text = response.text
+            text = await self._generate(prompt)
             start = text.find('[')
             end = text.rfind(']') + 1
             if start != -1 and end != -1:
                 tasks_json = text[start:end]
-                tasks = json.loads(tasks_json)
+                try:
+                    tasks = json.loads(tasks_json)
+                except ValueError:
+                    self._discard_reply(prompt)
+                    raise
                 return tasks
             
+            self._discard_reply(prompt)
             return self._generate_mock_tasks(university)
         except Exception as e:
             logger.error(f"Error generating AI tasks: {str(e)}")
@@ -0,0 +1,95 @@
+"""
+Benchmark: single-pass ActionStreamParser vs. the old two-pass _parse_actions/_clean_message.
+
+Times both on long replies with many actions; tests/test_action_parser.py
+checks that they agree. Run from the backend directory:
+    python -m benchmarks.bench_action_parser
+"""
+import json
+import re
+import time
+
+from action_parser import ActionStreamParser, parse_reply
+
+REPLY_ACTIONS = 200
+RUNS = 50
+
+
+def legacy_parse_actions(message):
+    """AICounsellor._parse_actions before the single-pass parser"""
+    actions = []
+    lines = message.split('\n')
+    i = 0
+    while i < len(lines):
+        line = lines[i].strip()
+        if line.startswith('ACTION:'):
+            action_name = line.replace('ACTION:', '').strip()
+            params = {}
+            if i + 1 < len(lines) and lines[i + 1].strip().startswith('PARAMS:'):
+                try:
+                    params = json.loads(lines[i + 1].replace('PARAMS:', '').strip())
+                    i += 1
+                except json.JSONDecodeError:
+                    pass
+            actions.append({"action": action_name, "params": params})
+        i += 1
+    return actions
+
+
+def legacy_clean_message(message):
+    """AICounsellor._clean_message before the single-pass parser"""
+    lines = message.split('\n')
+    clean_lines = []
+    i = 0
+    while i < len(lines):
+        line = lines[i].strip()
+        if line.startswith('ACTION:'):
+            if i + 1 < len(lines) and lines[i + 1].strip().startswith('PARAMS:'):
+                i += 2
+            else:
+                i += 1
+        else:
+            clean_lines.append(lines[i])
+            i += 1
+    return '\n'.join(clean_lines).strip()
+
+
+def long_reply(actions):
+    parts = []
+    for i in range(actions):
+        parts.append(f"Step {i}: here is some advice about your application and the next deadline.")
+        parts.append("ACTION: CREATE_TASK")
+        parts.append(f'PARAMS: {{"title": "Task {i}", "description": "Follow up on step {i}", "priority": {i % 3 + 1}}}')
+    return "\n".join(parts)
+
+
+def best_of(fn):
+    times = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    reply = long_reply(REPLY_ACTIONS)
+    tokens = re.findall(r"\S+\s*|\s+", reply)
+
+    def streamed():
+        parser = ActionStreamParser()
+        for token in tokens:
+            parser.feed(token)
+        parser.close()
+
+    legacy = best_of(lambda: (legacy_parse_actions(reply), legacy_clean_message(reply)))
+    single = best_of(lambda: parse_reply(reply))
+    stream = best_of(streamed)
+    print(f"reply: {len(reply):,} chars, {REPLY_ACTIONS} actions, {len(tokens):,} stream tokens")
+    print(f"old _parse_actions + _clean_message: {legacy * 1000:8.2f} ms")
+    print(f"parse_reply (single pass):           {single * 1000:8.2f} ms  ({legacy / single:.2f}x)")
+    print(f"ActionStreamParser, token by token:  {stream * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
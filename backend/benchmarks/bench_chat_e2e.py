@@ -0,0 +1,202 @@
+"""
+Benchmark: end-to-end chat latency through the FastAPI app against the local fake LLM.
+
+Every simulated student signs up, creates a profile, then has a conversation that
+alternates /chat and /chat/stream turns, shortlists a university and locks it,
+then waits on the background job that generates application tasks through the model. Requests go through the
+real routes, auth, database and LLMClient; only the model is the fake selected
+by LLM_BACKEND=fake, so no Gemini quota is used.
+
+Reports p50/p95/p99 latency per endpoint (time to first token for streams),
+request throughput, and the size of the prompts the model received.
+
+Run from the backend directory:
+    python -m benchmarks.bench_chat_e2e [--users 20] [--turns 6]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import tempfile
+import time
+from collections import defaultdict
+
+# Configure the app before it is imported: throwaway SQLite database, fake model,
+# no reply cache (every turn reaches the model) and a rate limit that never throttles
+_db_path = os.path.join(tempfile.mkdtemp(), "bench_chat_e2e.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{_db_path}"
+os.environ["LLM_BACKEND"] = "fake"
+os.environ.setdefault("FAKE_LLM_LATENCY", "0.3")
+os.environ.setdefault("FAKE_LLM_TOKEN_DELAY", "0.01")
+os.environ["LLM_CACHE_BACKEND"] = "off"
+os.environ.setdefault("LLM_RATE_PER_MINUTE", "100000")
+os.environ.setdefault("LLM_RATE_BURST", "1000")
+
+import httpx
+
+from main import app
+from jobs import job_queue
+from ai_counsellor import ai_counsellor, estimate_tokens
+from database import Base, engine
+from seed import seed_universities
+
+PROFILE = dict(
+    education_level="Bachelor's", degree="B.Tech", major="Computer Science", graduation_year=2024,
+    gpa=3.5, intended_degree="Master's", field_of_study="Computer Science", target_intake_year=2026,
+    preferred_countries="Germany, Canada", budget_min=10000, budget_max=40000,
+    funding_plan="Self-funded", ielts_score=7.5, sop_status="Draft"
+)
+MESSAGES = [
+    "Which universities fit my profile?",
+    "How strong is my GPA for Germany?",
+    "What should I do about my SOP?",
+    "Can you compare TU Munich and Toronto?",
+    "What scholarships could I apply for?",
+    "Which deadlines should I plan around?",
+]
+
+
+async def timed(latencies, name, request):
+    start = time.perf_counter()
+    response = await request
+    latencies[name].append(time.perf_counter() - start)
+    response.raise_for_status()
+    return response
+
+
+async def stream_turn(headers, message, latencies):
+    """Drive /chat/stream on the ASGI app directly: httpx's ASGITransport buffers the
+    whole body, which would hide when the first token left the server"""
+    body = json.dumps({"message": message}).encode()
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": "/chat/stream", "raw_path": b"/chat/stream", "query_string": b"",
+        "root_path": "", "client": ("127.0.0.1", 0), "server": ("bench", 80),
+        "headers": [(b"host", b"bench"), (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode())]
+                   + [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+    }
+    start = time.perf_counter()
+    first = None
+    sent = False
+    done = asyncio.Event()
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(event):
+        nonlocal first
+        if event["type"] == "http.response.start" and event["status"] != 200:
+            raise RuntimeError(f"/chat/stream returned {event['status']}")
+        if event["type"] == "http.response.body":
+            if first is None and event.get("body", b"").startswith(b"event: token"):
+                first = time.perf_counter() - start
+            if not event.get("more_body", False):
+                done.set()
+
+    await app(scope, receive, send)
+    complete = time.perf_counter() - start
+    latencies["/chat/stream (first token)"].append(first if first is not None else complete)
+    latencies["/chat/stream (complete)"].append(complete)
+
+
+async def student(client, i, turns, latencies):
+    auth = await timed(latencies, "/auth/signup", client.post(
+        "/auth/signup",
+        json={"email": f"student{i}@example.com", "full_name": f"Student {i}", "password": "bench-password"}
+    ))
+    headers = {"Authorization": f"Bearer {auth.json()['access_token']}"}
+    await timed(latencies, "/profile", client.post("/profile", headers=headers, json=PROFILE))
+
+    for turn in range(turns):
+        message = MESSAGES[(i + turn) % len(MESSAGES)]
+        if turn % 2:
+            await stream_turn(headers, message, latencies)
+        else:
+            await timed(latencies, "/chat", client.post("/chat", headers=headers, json={"message": message}))
+
+    recommendations = await timed(latencies, "/universities/recommendations", client.get(
+        "/universities/recommendations", headers=headers, params={"limit": 5}
+    ))
+    choices = recommendations.json()
+    pick = choices[i % len(choices)]
+    shortlisted = await timed(latencies, "/shortlist", client.post("/shortlist", headers=headers, json={
+        "university_id": pick["university"]["id"],
+        "category": pick["category"],
+        "fit_score": pick["fit_score"],
+        "risk_level": pick["risk_level"],
+        "ai_reasoning": pick["reasoning"],
+    }))
+    start = time.perf_counter()
+    locked = await timed(latencies, "/shortlist/lock", client.post(
+        "/shortlist/lock", headers=headers, json={"shortlist_id": shortlisted.json()["id"], "lock": True}
+    ))
+    # Application tasks are generated by a background job; wait for it like the client does
+    job = await client.get(f"/jobs/{locked.json()['job_id']}", headers=headers, params={"wait": 30})
+    if job.json()["status"] != "succeeded":
+        raise RuntimeError(f"Task generation job did not succeed: {job.json()}")
+    latencies["lock -> tasks ready (job)"].append(time.perf_counter() - start)
+
+
+def percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def report(latencies, elapsed, users):
+    print(f"{'endpoint':<32}{'count':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    requests = 0
+    for name, times in latencies.items():
+        ordered = sorted(times)
+        if not name.endswith(("(first token)", "(job)")):
+            requests += len(ordered)
+        print(f"{name:<32}{len(ordered):>7}"
+              f"{percentile(ordered, 0.50) * 1000:>9.0f}"
+              f"{percentile(ordered, 0.95) * 1000:>9.0f}"
+              f"{percentile(ordered, 0.99) * 1000:>9.0f}")
+    print(f"\n{users} concurrent students, {requests} requests in {elapsed:.2f}s "
+          f"-> {requests / elapsed:.1f} req/s")
+
+    prompts = sorted(ai_counsellor.model.prompt_chars)
+    if prompts:
+        print(f"prompts sent to the model: {len(prompts)}, "
+              f"mean {statistics.mean(prompts):.0f} chars (~{estimate_tokens('x' * int(statistics.mean(prompts)))} tokens), "
+              f"p95 {percentile(prompts, 0.95)} chars, max {prompts[-1]} chars")
+    client = ai_counsellor.llm_client.stats()
+    print(f"llm_client: {client['calls']} calls, max {client['max_in_flight']} in flight, "
+          f"{client['retries']} retries, {client['failures']} failures, "
+          f"{client['rate_limit']['throttled']} throttled, circuit {client['circuit']['state']}")
+
+
+async def main(users, turns):
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    Base.metadata.create_all(bind=engine)
+    seed_universities()
+    # ASGITransport does not run startup events; start the job workers directly
+    await job_queue.start()
+
+    latencies = defaultdict(list)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*[student(client, i, turns, latencies) for i in range(users)])
+        elapsed = time.perf_counter() - start
+    await job_queue.stop()
+
+    print(f"fake LLM: first token {ai_counsellor.model.latency * 1000:.0f} ms, "
+          f"{ai_counsellor.model.token_delay * 1000:.0f} ms/token\n")
+    report(latencies, elapsed, users)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=6)
+    args = parser.parse_args()
+    asyncio.run(main(args.users, args.turns))
@@ -0,0 +1,53 @@
+"""
+Benchmark: time-to-first-token of AICounsellor.chat_stream vs. the full wait of chat().
+
+Uses the local fake model, so no quota is used. Run from the backend directory:
+    python -m benchmarks.bench_chat_stream
+"""
+import asyncio
+import statistics
+import time
+
+from benchmarks.bench_concurrent_chat import USER, PROFILE, make_counsellor
+from fake_llm import FakeGenerativeModel
+
+RUNS = 10
+FIRST_TOKEN_LATENCY = 0.3
+TOKEN_DELAY = 0.02
+
+
+async def measure_stream(counsellor):
+    start = time.perf_counter()
+    first_token = None
+    async for kind, _ in counsellor.chat_stream("hello", USER, PROFILE, "USER: hello"):
+        if kind == "token" and first_token is None:
+            first_token = time.perf_counter() - start
+    return first_token, time.perf_counter() - start
+
+
+async def measure_blocking(counsellor):
+    start = time.perf_counter()
+    await counsellor.chat("hello", USER, PROFILE, "USER: hello")
+    return time.perf_counter() - start
+
+
+async def main():
+    counsellor = make_counsellor()
+    counsellor.model = FakeGenerativeModel(latency=FIRST_TOKEN_LATENCY, token_delay=TOKEN_DELAY)
+
+    ttft, stream_total, blocking_total = [], [], []
+    for _ in range(RUNS):
+        first, total = await measure_stream(counsellor)
+        ttft.append(first)
+        stream_total.append(total)
+        blocking_total.append(await measure_blocking(counsellor))
+
+    ms = lambda values: f"{statistics.median(values) * 1000:8.0f} ms"
+    print(f"fake model: first token after {FIRST_TOKEN_LATENCY * 1000:.0f} ms, then {TOKEN_DELAY * 1000:.0f} ms/token")
+    print(f"/chat        first visible text: {ms(blocking_total)}")
+    print(f"/chat/stream first visible text: {ms(ttft)}")
+    print(f"/chat/stream complete:           {ms(stream_total)}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
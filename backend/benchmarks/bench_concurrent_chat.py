@@ -0,0 +1,66 @@
+"""
+Benchmark: N concurrent AICounsellor.chat calls against a local fake model.
+
+With the non-blocking call path, N chats should finish in roughly the time of
+one (up to LLM_MAX_CONCURRENCY). The blocking baseline calls the synchronous
+`generate_content` on the event loop, as chat() used to.
+
+Run from the backend directory:
+    python -m benchmarks.bench_concurrent_chat
+"""
+import asyncio
+import time
+from types import SimpleNamespace
+
+from ai_counsellor import AICounsellor
+from llm_client import LLM_MAX_CONCURRENCY
+from fake_llm import FakeGenerativeModel
+
+LATENCY = 0.5
+CONCURRENCY = [1, 4, min(8, LLM_MAX_CONCURRENCY)]
+
+USER = SimpleNamespace(id=1, full_name="Benchmark User")
+PROFILE = SimpleNamespace(gpa=3.5, preferred_countries="Germany")
+
+
+def make_counsellor():
+    counsellor = AICounsellor.__new__(AICounsellor)
+    AICounsellor.__init__(counsellor)
+    counsellor.use_mock = False
+    counsellor.model = FakeGenerativeModel(latency=LATENCY)
+    # Every call should reach the model
+    counsellor.llm_cache = None
+    return counsellor
+
+
+async def run_chats(counsellor, n):
+    start = time.perf_counter()
+    results = await asyncio.gather(*[
+        counsellor.chat(f"message {i}", USER, PROFILE, f"USER: message {i}") for i in range(n)
+    ])
+    assert all(not r["is_mock"] for r in results), "fell back to the mock response"
+    return time.perf_counter() - start
+
+
+async def run_blocking(counsellor, n):
+    async def blocking_chat():
+        counsellor.model.generate_content("prompt")
+
+    start = time.perf_counter()
+    await asyncio.gather(*[blocking_chat() for _ in range(n)])
+    return time.perf_counter() - start
+
+
+async def main():
+    counsellor = make_counsellor()
+    print(f"fake model latency: {LATENCY * 1000:.0f} ms, LLM_MAX_CONCURRENCY={LLM_MAX_CONCURRENCY}")
+    print(f"{'chats':>6} {'blocking (s)':>13} {'async (s)':>10}")
+    for n in CONCURRENCY:
+        blocking = await run_blocking(counsellor, n)
+        concurrent = await run_chats(counsellor, n)
+        print(f"{n:>6} {blocking:>13.2f} {concurrent:>10.2f}")
+        assert concurrent < LATENCY * 2, f"{n} concurrent chats took {concurrent:.2f}s"
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
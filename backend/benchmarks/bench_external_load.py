@@ -0,0 +1,116 @@
+"""
+Benchmark: cold start of the global university search, JSON dataset vs. mapped snapshot.
+
+The JSON path is what startup used to do after the download: parse the dataset and
+build the country and name indexes. The snapshot path maps the file written by
+`uni_snapshot.py build` and answers a first query. Results of both are checked
+against each other on a few searches.
+
+Run from the backend directory:
+    python -m benchmarks.bench_external_load [--source world_universities_and_domains.json]
+
+Without --source a synthetic dataset of the same shape (~10k records) is used.
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from collections import defaultdict
+
+from uni_snapshot import UniversitySnapshot, build_snapshot, fetch_dataset, normalize
+from external_unis import ExternalUniversitySearch
+
+REPEATS = 5
+QUERIES = [
+    {"country": "germany"},
+    {"country": "United States"},
+    {},
+]
+WORDS = ("state national technical institute technology science applied arts medical polytechnic "
+         "international federal royal central northern southern munich berlin london oxford tokyo "
+         "paris delhi toronto sydney boston texas california").split()
+
+
+def make_dataset(n=10_000, seed=7):
+    rng = random.Random(seed)
+    countries = ["United States", "United Kingdom", "Germany", "India", "Canada", "France", "Japan"]
+    countries += [f"Country {i}" for i in range(190)]
+    records = []
+    for i in range(n):
+        words = " ".join(w.capitalize() for w in rng.sample(WORDS, rng.randint(1, 3)))
+        name = rng.choice([f"University of {words}", f"{words} University", f"{words} Institute"])
+        domain = name.lower().replace(" ", "")[:20] + ".edu"
+        records.append({
+            "web_pages": [f"http://www.{domain}/"], "name": name if rng.random() < 0.7 else f"{name} {i}",
+            "alpha_two_code": "XX", "state-province": None, "domains": [domain],
+            "country": rng.choice(countries[:7]) if rng.random() < 0.8 else rng.choice(countries),
+        })
+    return records
+
+
+def load_json(raw):
+    """Parse and index the dataset the way load_data did before snapshots"""
+    data = json.loads(raw)
+    country_index = defaultdict(list)
+    name_index = {}
+    for uni in data:
+        country_index[uni["country"].lower().strip()].append(uni)
+        name_index[uni["name"].lower().strip()] = uni
+    return data, country_index, name_index
+
+
+def reference_search(data, country=None):
+    """Linear scan with the country search semantics: exact country, first of each name"""
+    results, seen = [], set()
+    matches = [u for u in data if not country or normalize(u["country"]) == normalize(country)]
+    for uni in matches:
+        if uni["name"] not in seen:
+            seen.add(uni["name"])
+            results.append(uni)
+    return results
+
+
+def best_of(fn):
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(source):
+    records = fetch_dataset(source) if source else make_dataset()
+    raw = json.dumps(records)
+    path = os.path.join(tempfile.mkdtemp(), "world_universities.snap")
+    build_time = best_of(lambda: build_snapshot(records, path, source or "synthetic"))
+
+    search = ExternalUniversitySearch()
+    search.path = path
+    search.load_data()
+    for query in QUERIES:
+        got = search.search(limit=100_000, **query)
+        assert got == reference_search(records, **query), f"snapshot search diverges for {query}"
+
+    json_time = best_of(lambda: load_json(raw))
+
+    def open_and_query():
+        snapshot = UniversitySnapshot(path)
+        search.match(snapshot, "university of")
+
+    snapshot_time = best_of(open_and_query)
+    print(f"{len(records)} universities, snapshot {os.path.getsize(path) / 1e6:.1f} MB "
+          f"(JSON {len(raw) / 1e6:.1f} MB), built in {build_time * 1000:.0f} ms")
+    print(f"{'cold start':<34}{'ms':>10}")
+    print(f"{'parse JSON + build indexes':<34}{json_time * 1000:>10.2f}")
+    print(f"{'map snapshot + first query':<34}{snapshot_time * 1000:>10.2f}")
+    print(f"speedup {json_time / snapshot_time:.0f}x (the JSON path also needs the download)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--source", help="dataset URL or local JSON file")
+    args = parser.parse_args()
+    main(args.source)
@@ -0,0 +1,93 @@
+"""
+Benchmark: memory per record of the global university search, in-process dicts vs. snapshot.
+
+Before the snapshot every worker held the parsed dataset as a list of dicts, plus
+`country_index`, `name_index` and a Trie copied from `name_index`. Now records
+live in the mapped snapshot file as string-table ids, and the Python heap holds
+little beyond the section views. The file's pages are shared by every worker
+mapping it and only read in as queries touch them.
+
+Run from the backend directory:
+    python -m benchmarks.bench_external_memory [--source world_universities_and_domains.json]
+"""
+import argparse
+import gc
+import json
+import os
+import tempfile
+import tracemalloc
+from collections import defaultdict
+
+from benchmarks.bench_external_load import make_dataset
+from external_unis import ExternalUniversitySearch
+from uni_snapshot import UniversitySnapshot, build_snapshot, fetch_dataset
+
+try:
+    from pytrie import Trie
+except ImportError:
+    Trie = None
+
+QUERIES = ["university of", "technology", "munich", "state univ"]
+
+
+def heap_bytes(build):
+    """Bytes still allocated on the Python heap by whatever `build` returns"""
+    gc.collect()
+    tracemalloc.start()
+    kept = build()
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return size
+
+
+def load_dicts(raw):
+    """The structures load_data kept before the snapshot"""
+    data = json.loads(raw)
+    country_index = defaultdict(list)
+    name_index = {}
+    for uni in data:
+        country_index[uni["country"].lower().strip()].append(uni)
+        name_index[uni["name"].lower().strip()] = uni
+    prefix_tree = Trie(**name_index) if Trie is not None else None
+    return data, country_index, name_index, prefix_tree
+
+
+def main(source):
+    records = fetch_dataset(source) if source else make_dataset()
+    raw = json.dumps(records)
+    path = os.path.join(tempfile.mkdtemp(), "world_universities.snap")
+    build_snapshot(records, path, source or "synthetic")
+    n = len(records)
+
+    before = heap_bytes(lambda: load_dicts(raw))
+
+    def open_and_search():
+        search = ExternalUniversitySearch()
+        search.snapshot = UniversitySnapshot(path)
+        for query in QUERIES:
+            search.search(name=query, limit=40)
+        return search.snapshot
+
+    after = heap_bytes(open_and_search)
+    snapshot = UniversitySnapshot(path)
+    sections = snapshot.header["sections"]
+    record_bytes = sum(length for name, (_, length, _) in sections.items() if name.startswith(("field_", "string")))
+    json_bytes = sum(len(json.dumps(r, ensure_ascii=False, separators=(",", ":")).encode("utf-8")) for r in records)
+
+    print(f"{n} universities, {len(snapshot.strings)} distinct strings in the shared table")
+    print(f"{'':<44}{'bytes/record':>14}{'total MB':>10}")
+    trie = "" if Trie is not None else " (no trie: pytrie not installed)"
+    print(f"{'heap: dicts + indexes' + trie:<44}{before / n:>14.0f}{before / 1e6:>10.2f}")
+    print(f"{'heap: mapped snapshot, after 4 searches':<44}{after / n:>14.0f}{after / 1e6:>10.2f}")
+    print(f"{'snapshot file (shared, paged on demand)':<44}{os.path.getsize(path) / n:>14.0f}{os.path.getsize(path) / 1e6:>10.2f}")
+    print(f"{'  of which records as string-table columns':<44}{record_bytes / n:>14.0f}{record_bytes / 1e6:>10.2f}")
+    print(f"{'  records as JSON text, for comparison':<44}{json_bytes / n:>14.0f}{json_bytes / 1e6:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--source", help="dataset URL or local JSON file")
+    args = parser.parse_args()
+    main(args.source)
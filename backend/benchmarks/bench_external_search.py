@@ -0,0 +1,185 @@
+"""
+Benchmark: external university name search, token/trigram index vs. prefix lookup and scan.
+
+Before the inverted index a name query was a prefix lookup on the full lowercased
+name (the trie), with a linear substring scan over every record as the fallback.
+The prefix lookup misses words that do not start the name; the scan finds them
+but touches all records. The index answers multi-word, any-position AND queries
+from its posting lists; its matches are checked against the scan.
+
+Fuzzy mode is timed on misspelled words (random edits of words in the dataset):
+trigram-pruned candidates against comparing every indexed word, with recall.
+
+Paging is timed on browsing and name queries: decoding, deduplicating and slicing the whole
+result list per page (as search used to) against slicing the deduplicated lists.
+
+Run from the backend directory:
+    python -m benchmarks.bench_external_search [--source world_universities_and_domains.json]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from bisect import bisect_left
+
+from benchmarks.bench_external_load import make_dataset
+from external_unis import MAX_EDITS, ExternalUniversitySearch, allowed_edits, edit_distance
+from uni_snapshot import build_snapshot, fetch_dataset, normalize, tokenize
+
+REPEATS = 200
+MISSPELLINGS = 300
+QUERIES = [
+    "university of",      # leading words: the prefix lookup finds these too
+    "munich",             # a word inside the name
+    "technology",
+    "nich",               # part of a word
+    "state university",   # AND of two words
+    "tech inst",          # two word prefixes
+    "university",         # very common word
+    "zzzz",               # no match
+]
+
+
+def percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def timings(fn):
+    times = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return result, percentile(times, 0.5) * 1000, percentile(times, 0.99) * 1000
+
+
+def misspell(word, edits, rng):
+    for _ in range(edits):
+        i = rng.randrange(len(word))
+        kind = rng.choice(("substitute", "insert", "delete"))
+        letter = rng.choice("abcdefghijklmnopqrstuvwxyz")
+        if kind == "substitute":
+            word = word[:i] + letter + word[i + 1:]
+        elif kind == "insert":
+            word = word[:i] + letter + word[i:]
+        else:
+            word = word[:i] + word[i + 1:]
+    return word
+
+
+def fuzzy_report(search, snapshot, vocabulary):
+    rng = random.Random(3)
+    words = [w for w in vocabulary if len(w) >= 6]
+    cases = []
+    for _ in range(MISSPELLINGS):
+        word = rng.choice(words)
+        cases.append((word, misspell(word, rng.randint(1, MAX_EDITS), rng)))
+
+    def brute_force(term):
+        edits = allowed_edits(term, MAX_EDITS)
+        return {w for w in vocabulary if edit_distance(term, w, edits) <= edits}
+
+    indexed, scanned, found = [], [], 0
+    for word, typo in cases:
+        start = time.perf_counter()
+        ids = search.match(snapshot, typo, max_edits=MAX_EDITS)
+        indexed.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        expected = brute_force(typo)
+        scanned.append(time.perf_counter() - start)
+        pruned = {snapshot.tokens.keys[pos].decode("utf-8")
+                  for pos in search._fuzzy_tokens(snapshot, typo, MAX_EDITS)}
+        assert pruned == expected, f"trigram pruning lost matches for {typo!r}"
+        # A short misspelling may be allowed fewer edits than it took
+        if set(snapshot.tokens.get(word).tolist()) & set(ids):
+            found += 1
+    indexed.sort()
+    scanned.sort()
+    print(f"\nfuzzy (max_edits={MAX_EDITS}), {len(cases)} misspelled words, {len(vocabulary)} indexed words")
+    print(f"{'':<34}{'p50 ms':>9}{'p99 ms':>9}")
+    print(f"{'match with trigram pruning':<34}{percentile(indexed, 0.5) * 1000:>9.3f}{percentile(indexed, 0.99) * 1000:>9.3f}")
+    print(f"{'edit distance to every word':<34}{percentile(scanned, 0.5) * 1000:>9.3f}{percentile(scanned, 0.99) * 1000:>9.3f}")
+    print(f"misspelled word's universities found: {found}/{len(cases)}")
+
+
+PAGES = [
+    ({"country": "United States"}, 0),
+    ({"country": "United States"}, 400),
+    ({}, 0),
+    ({}, 4000),
+    ({"name": "university"}, 0),
+]
+
+
+def paging_report(search, snapshot, records):
+    def materialize(country=None, name=None, limit=40, offset=0):
+        """The old pipeline: every matching record decoded and deduplicated before slicing"""
+        if name:
+            ids = search.match(snapshot, name, country)
+        elif country:
+            ids = [i for i, r in enumerate(records) if normalize(r["country"]) == normalize(country)]
+        else:
+            ids = range(len(records))
+        unique, seen = [], set()
+        for record_id in ids:
+            uni = snapshot.record(record_id)
+            if uni["name"] not in seen:
+                unique.append(uni)
+                seen.add(uni["name"])
+        return unique[offset:offset + limit]
+
+    print(f"\n{'page (limit 40)':<40}{'total':>7}{'materialize p50 ms':>20}{'page p50 ms':>13}")
+    for query, offset in PAGES:
+        old, old_p50, _ = timings(lambda: materialize(offset=offset, **query))
+        page, new_p50, _ = timings(lambda: search.search_page(limit=40, offset=offset, **query))
+        assert page["results"] == old, f"paged results diverge for {query} at {offset}"
+        label = f"{query or 'all'} @ {offset}"
+        print(f"{label:<40}{page['total']:>7}{old_p50:>20.3f}{new_p50:>13.3f}")
+
+
+def main(source):
+    records = fetch_dataset(source) if source else make_dataset()
+    path = os.path.join(tempfile.mkdtemp(), "world_universities.snap")
+    build_snapshot(records, path, source or "synthetic")
+    search = ExternalUniversitySearch()
+    search.path = path
+    search.load_data(refresh=False)
+    snapshot = search.snapshot
+
+    # The trie's view of the data: sorted full names; and the dicts the scan walked
+    names = sorted(normalize(r["name"]) for r in records)
+    lowered = [(normalize(r["name"]), r) for r in records]
+
+    def prefix_lookup(query):
+        key = normalize(query)
+        start = bisect_left(names, key)
+        return names[start:bisect_left(names, key + "￿", start)]
+
+    def scan(query):
+        terms = tokenize(query)
+        return [r for name, r in lowered if all(term in name for term in terms)]
+
+    print(f"{len(records)} universities, {REPEATS} runs per query\n")
+    print(f"{'query':<20}{'prefix hits':>12}{'scan hits':>10}{'index hits':>11}"
+          f"{'scan p50/p99 ms':>18}{'index p50/p99 ms':>19}")
+    for query in QUERIES:
+        prefix_hits = len(prefix_lookup(query))
+        scanned, scan_p50, scan_p99 = timings(lambda: scan(query))
+        ids, index_p50, index_p99 = timings(lambda: search.match(snapshot, query))
+        if all(len(term) >= 3 for term in tokenize(query)):
+            assert len(ids) == len(scanned), f"index and scan disagree on {query!r}"
+        print(f"{query!r:<20}{prefix_hits:>12}{len(scanned):>10}{len(ids):>11}"
+              f"{scan_p50:>9.3f}/{scan_p99:<8.3f}{index_p50:>10.3f}/{index_p99:<8.3f}")
+
+    vocabulary = [snapshot.tokens.keys[pos].decode("utf-8") for pos in range(len(snapshot.tokens))]
+    fuzzy_report(search, snapshot, vocabulary)
+    paging_report(search, snapshot, records)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--source", help="dataset URL or local JSON file")
+    args = parser.parse_args()
+    main(args.source)
@@ -0,0 +1,66 @@
+"""
+Benchmark: per-row `_calculate_fit_score` vs. the vectorized `score_catalog`.
+
+Run from the backend directory:
+    python -m benchmarks.bench_fit_scoring
+"""
+import random
+import time
+from types import SimpleNamespace
+
+from ai_counsellor import AICounsellor
+from fit_scoring import UniversityCatalog, score_catalog
+
+SIZES = [1_000, 10_000, 100_000]
+REPEATS = 5
+
+
+def make_universities(n, seed=42):
+    rng = random.Random(seed)
+    unis = []
+    for i in range(n):
+        unis.append(SimpleNamespace(
+            id=i + 1,
+            min_gpa=None if rng.random() < 0.1 else round(rng.uniform(2.0, 4.0), 1),
+            min_ielts=None if rng.random() < 0.1 else round(rng.uniform(5.5, 8.0) * 2) / 2,
+            tuition_fee_max=None if rng.random() < 0.05 else rng.choice([0, rng.uniform(2_000, 70_000)]),
+            living_cost_yearly=None if rng.random() < 0.05 else rng.uniform(5_000, 25_000),
+        ))
+    return unis
+
+
+PROFILES = [
+    SimpleNamespace(gpa=3.6, ielts_score=7.5, budget_max=45_000),
+    SimpleNamespace(gpa=3.0, ielts_score=None, budget_max=20_000),
+    SimpleNamespace(gpa=None, ielts_score=6.5, budget_max=0),
+]
+
+
+def best_of(fn):
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    counsellor = AICounsellor.__new__(AICounsellor)
+    print(f"{'universities':>12} {'per-row (ms)':>14} {'vectorized (ms)':>16} {'speedup':>8}")
+    for n in SIZES:
+        unis = make_universities(n)
+        catalog = UniversityCatalog.from_universities(unis)
+
+        for profile in PROFILES:
+            expected = [counsellor._calculate_fit_score(profile, u) for u in unis]
+            assert score_catalog(profile, catalog).tolist() == expected, "vectorized scores diverge"
+
+        profile = PROFILES[0]
+        scalar = best_of(lambda: [counsellor._calculate_fit_score(profile, u) for u in unis])
+        vector = best_of(lambda: score_catalog(profile, catalog))
+        print(f"{n:>12,} {scalar * 1000:>14.2f} {vector * 1000:>16.2f} {scalar / vector:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
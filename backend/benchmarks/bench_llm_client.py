@@ -0,0 +1,100 @@
+"""
+Benchmark: LLMClient behaviour against a fake model that injects 429s and latency.
+
+1. Quota storm (every call returns 429 after 300 ms): time until /chat falls back,
+   with no protection vs. retries + circuit breaker.
+2. Flaky upstream (30% of calls return 429): share of chats answered by the model
+   with and without retries.
+3. Recovery: the breaker lets one trial call through after the cooldown and closes.
+
+Run from the backend directory:
+    python -m benchmarks.bench_llm_client
+"""
+import asyncio
+import statistics
+import time
+
+from benchmarks.bench_concurrent_chat import USER, PROFILE, make_counsellor
+from fake_llm import FakeGenerativeModel
+from llm_client import LLMClient
+
+CHATS = 40
+CONCURRENCY = 8
+ERROR_LATENCY = 0.3
+COOLDOWN = 1.0
+# High enough that the token bucket never throttles these scenarios
+RATE = dict(rate_per_minute=60_000, burst=100)
+
+
+def make(client, model):
+    counsellor = make_counsellor()
+    counsellor.model = model
+    counsellor.llm_client = client
+    return counsellor
+
+
+async def run_chats(counsellor, n=CHATS):
+    """(per-chat seconds, share answered by the model)"""
+    gate = asyncio.Semaphore(CONCURRENCY)
+
+    async def one(i):
+        async with gate:
+            start = time.perf_counter()
+            result = await counsellor.chat(f"message {i}", USER, PROFILE, f"USER: message {i}")
+            return time.perf_counter() - start, not result["is_mock"]
+
+    results = await asyncio.gather(*[one(i) for i in range(n)])
+    return [t for t, _ in results], sum(ok for _, ok in results) / n
+
+
+def summary(times):
+    ordered = sorted(times)
+    p95 = ordered[int(0.95 * (len(ordered) - 1))]
+    return f"p50 {statistics.median(times) * 1000:7.0f} ms   p95 {p95 * 1000:7.0f} ms"
+
+
+async def quota_storm():
+    print(f"1. Quota storm: {CHATS} chats, every call -> 429 after {ERROR_LATENCY * 1000:.0f} ms")
+    storm = lambda: FakeGenerativeModel(latency=0.05, error_rate=1.0, error_latency=ERROR_LATENCY, seed=1)
+
+    unprotected = LLMClient(max_retries=0, breaker_threshold=10**9, **RATE)
+    times, _ = await run_chats(make(unprotected, model := storm()))
+    print(f"   no retries, no breaker:  {summary(times)}   upstream calls {model.calls}")
+
+    protected = LLMClient(max_retries=2, retry_base_delay=0.05, breaker_threshold=5, breaker_cooldown=60, **RATE)
+    times, _ = await run_chats(make(protected, model := storm()))
+    circuit = protected.stats()["circuit"]
+    print(f"   retries + breaker:       {summary(times)}   upstream calls {model.calls}, "
+          f"circuit {circuit['state']}, {circuit['rejected']} calls failed fast")
+
+
+async def flaky_upstream():
+    print(f"2. Flaky upstream: {CHATS} chats, 30% of calls -> 429")
+    for label, retries in (("no retries", 0), ("2 jittered retries", 2)):
+        client = LLMClient(max_retries=retries, retry_base_delay=0.05, breaker_threshold=10**9, **RATE)
+        model = FakeGenerativeModel(latency=0.05, error_rate=0.3, seed=7)
+        times, answered = await run_chats(make(client, model))
+        print(f"   {label:<24} answered by model {answered:5.0%}   {summary(times)}")
+
+
+async def recovery():
+    print(f"3. Recovery: breaker cooldown {COOLDOWN:.0f}s")
+    client = LLMClient(max_retries=0, breaker_threshold=3, breaker_cooldown=COOLDOWN, **RATE)
+    model = FakeGenerativeModel(latency=0.05, fail_first=3, seed=1)
+    counsellor = make(client, model)
+    for i in range(4):
+        await counsellor.chat(f"failing {i}", USER, PROFILE, f"USER: failing {i}")
+    print(f"   after 3 failures: {client.breaker.state}, upstream calls {model.calls}")
+    await asyncio.sleep(COOLDOWN)
+    result = await counsellor.chat("after cooldown", USER, PROFILE, "USER: after cooldown")
+    print(f"   after cooldown:   {client.breaker.state}, trial call answered by model: {not result['is_mock']}")
+
+
+async def main():
+    await quota_storm()
+    await flaky_upstream()
+    await recovery()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,72 @@
+"""
+Benchmark: full ORM load + scoring vs. the RecommendationPlan column pushdown.
+
+Uses a throwaway SQLite database. Run from the backend directory:
+    python -m benchmarks.bench_recommendation_query
+"""
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mktemp(suffix='.db')}"
+
+from database import Base, SessionLocal, engine
+from models import University
+from ai_counsellor import AICounsellor
+from recommendation_planner import RecommendationPlan
+from benchmarks.bench_fit_scoring import make_universities
+
+SIZES = [1_000, 10_000, 50_000]
+LIMIT = 10
+DESCRIPTION = "Lorem ipsum dolor sit amet. " * 40
+
+
+def populate(db, n):
+    db.query(University).delete()
+    db.bulk_insert_mappings(University, [
+        {
+            "name": f"University {u.id}",
+            "country": "Germany" if u.id % 3 else "Canada",
+            "min_gpa": u.min_gpa,
+            "min_ielts": u.min_ielts,
+            "tuition_fee_max": u.tuition_fee_max,
+            "living_cost_yearly": u.living_cost_yearly,
+            "programs": "Computer Science, Engineering, Business, Law, Medicine",
+            "description": DESCRIPTION,
+        }
+        for u in make_universities(n)
+    ])
+    db.commit()
+
+
+def main():
+    Base.metadata.create_all(bind=engine)
+    counsellor = AICounsellor.__new__(AICounsellor)
+    profile = SimpleNamespace(user_id=1, gpa=3.6, ielts_score=7.5, budget_max=30_000, preferred_countries="Germany")
+    db = SessionLocal()
+
+    print(f"{'universities':>12} {'full ORM (ms)':>14} {'pushdown (ms)':>14} {'pushdown+countries (ms)':>24}")
+    for n in SIZES:
+        populate(db, n)
+
+        start = time.perf_counter()
+        db.expunge_all()
+        counsellor.recommend_universities(profile, db.query(University).all(), limit=LIMIT)
+        full = time.perf_counter() - start
+
+        timings = []
+        for preferred_only in (False, True):
+            db.expunge_all()
+            start = time.perf_counter()
+            plan = RecommendationPlan(profile, preferred_only=preferred_only)
+            ranked = plan.rank(db, lambda catalog: counsellor._score_catalog(profile, catalog), LIMIT)
+            plan.fetch_universities(db, ranked.ids.tolist())
+            timings.append(time.perf_counter() - start)
+
+        print(f"{n:>12,} {full * 1000:>14.1f} {timings[0] * 1000:>14.1f} {timings[1] * 1000:>24.1f}")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
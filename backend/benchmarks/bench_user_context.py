@@ -0,0 +1,86 @@
+"""
+Benchmark: per-turn cost of AICounsellor.get_user_context with and without the context cache.
+
+Simulates a chat session where the shortlist changes every few turns. Uses a
+throwaway SQLite database. Run from the backend directory:
+    python -m benchmarks.bench_user_context
+"""
+import os
+import tempfile
+import time
+
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mktemp(suffix='.db')}"
+
+from database import Base, SessionLocal, engine
+from models import ProfileStrength, ShortlistedUniversity, UniversityCategory, User, UserProfile, UserStage
+from ai_counsellor import AICounsellor
+from cache import invalidate_user_context, recommendation_cache, user_context_cache
+from benchmarks.bench_recommendation_query import populate
+
+CATALOG_SIZE = 10_000
+TURNS = 200
+SHORTLIST_EVERY = 10  # turns between shortlist changes, each bumps the context stamp
+
+
+def create_user(db):
+    user = User(
+        email="bench@example.com", full_name="Bench User", hashed_password="x",
+        onboarding_completed=True, current_stage=UserStage.DISCOVERING_UNIVERSITIES
+    )
+    db.add(user)
+    db.flush()
+    profile = UserProfile(
+        user_id=user.id, education_level="Bachelor's", degree="BSc", major="Computer Science",
+        graduation_year=2024, gpa=3.6, intended_degree="Master's", field_of_study="Computer Science",
+        target_intake_year=2026, preferred_countries='["Germany", "Canada"]', budget_min=10_000,
+        budget_max=30_000, funding_plan="Self-funded", ielts_score=7.5, sop_status="Draft",
+        academic_strength=ProfileStrength.STRONG, exam_strength=ProfileStrength.STRONG,
+        sop_strength=ProfileStrength.AVERAGE
+    )
+    db.add(profile)
+    db.commit()
+    return user, profile
+
+
+def run_session(counsellor, db, user, profile, mode):
+    recommendation_cache.clear()
+    user_context_cache.clear()
+    user_context_cache.hits = user_context_cache.misses = 0
+    db.query(ShortlistedUniversity).delete()
+    db.commit()
+
+    start = time.perf_counter()
+    for turn in range(TURNS):
+        if turn and turn % SHORTLIST_EVERY == 0:
+            db.add(ShortlistedUniversity(
+                user_id=user.id, university_id=turn, category=UniversityCategory.TARGET,
+                fit_score=70, risk_level="Medium", ai_reasoning="bench"
+            ))
+            db.commit()
+            invalidate_user_context(user.id)
+        if mode == "no caches":
+            recommendation_cache.clear()
+        if mode != "context cache":
+            user_context_cache.clear()
+        counsellor.get_user_context(user, profile, db)
+    return (time.perf_counter() - start) / TURNS, user_context_cache.stats()["hit_rate"]
+
+
+def main():
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    populate(db, CATALOG_SIZE)
+    user, profile = create_user(db)
+    counsellor = AICounsellor.__new__(AICounsellor)
+
+    print(f"{CATALOG_SIZE:,} universities, {TURNS} turns, shortlist change every {SHORTLIST_EVERY} turns")
+    print(f"{'mode':>26} {'ms/turn':>9} {'context hit rate':>17}")
+    for mode in ("no caches", "recommendation cache only", "context cache"):
+        per_turn, hit_rate = run_session(counsellor, db, user, profile, mode)
+        rate = f"{hit_rate:.0%}" if mode == "context cache" else "-"
+        print(f"{mode:>26} {per_turn * 1000:>9.3f} {rate:>17}")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import os
+import sys
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Any, Callable, Hashable, Optional
+
+
+class LRUCache:
+    """Thread-safe LRU cache bounded by entry count and approximate memory.
+
+    `sizeof` returns the size in bytes charged for a value; entries are evicted
+    least-recently-used first until both limits hold again.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        max_bytes: Optional[int] = None,
+        sizeof: Callable[[Any], int] = sys.getsizeof
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        size = self.sizeof(value)
+        with self._lock:
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._entries and (
+                len(self._entries) > self.max_entries
+                or (self.max_bytes is not None and self._bytes > self.max_bytes)
+            ):
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def pop(self, key: Hashable) -> Any:
+        """Remove one entry and return its value, or None if it is not cached"""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return None
+            self._bytes -= entry[1]
+            return entry[0]
+
+    def discard_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Drop every entry whose key matches `predicate`"""
+        with self._lock:
+            stale = [key for key in self._entries if predicate(key)]
+            for key in stale:
+                _, size = self._entries.pop(key)
+                self._bytes -= size
+            return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None
+            }
+
+
+class VersionStamps:
+    """Monotonic per-key version counters used to build cache keys"""
+
+    def __init__(self):
+        self._versions = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable = None) -> int:
+        return self._versions[key]
+
+    def bump(self, key: Hashable = None) -> int:
+        with self._lock:
+            self._versions[key] += 1
+            return self._versions[key]
+
+
+# Ranked recommendations, keyed by (user_id, profile version, catalog version, limit)
+recommendation_cache = LRUCache(
+    max_entries=int(os.getenv("RECOMMENDATION_CACHE_MAX_ENTRIES", "2048")),
+    max_bytes=int(os.getenv("RECOMMENDATION_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+    sizeof=lambda ranked: ranked.nbytes
+)
+profile_versions = VersionStamps()
+catalog_version = VersionStamps()
+
+# Prebuilt AI context strings, keyed by (user_id, context version, profile version, catalog version)
+user_context_cache = LRUCache(
+    max_entries=int(os.getenv("USER_CONTEXT_CACHE_MAX_ENTRIES", "4096")),
+    max_bytes=int(os.getenv("USER_CONTEXT_CACHE_MAX_BYTES", str(32 * 1024 * 1024))),
+    sizeof=sys.getsizeof
+)
+context_versions = VersionStamps()
+
+
+def user_context_key(user_id: int) -> tuple:
+    return (user_id, context_versions.get(user_id), profile_versions.get(user_id), catalog_version.get())
+
+
+def invalidate_user_context(user_id: int) -> None:
+    """Call after changes to a user's shortlist, locks or stage"""
+    context_versions.bump(user_id)
+    user_context_cache.discard_where(lambda key: key[0] == user_id)
+
+
+def invalidate_profile(user_id: int) -> None:
+    """Call after any change to a user's profile fields"""
+    profile_versions.bump(user_id)
+    recommendation_cache.discard_where(lambda key: key[0] == user_id)
+    user_context_cache.discard_where(lambda key: key[0] == user_id)
+
+
+def invalidate_catalog() -> None:
+    """Call after universities are added, removed or edited"""
+    catalog_version.bump()
+    recommendation_cache.clear()
+    user_context_cache.clear()
@@ -1,83 +1,233 @@
-import json
-import requests
-import uuid
-from collections import defaultdict
-from pytrie import Trie
+import os
+import threading
+from typing import Dict, List
+
+import numpy as np
+
+from uni_snapshot import (
+    SNAPSHOT_PATH, SOURCE_URL, SnapshotError, UniversitySnapshot,
+    build_snapshot, fetch_dataset, normalize, tokenize, trigrams, word_trigrams
+)
+
+# Relevance of a query term by how it matches a word of the name
+EXACT_TOKEN = 6
+TOKEN_PREFIX = 4
+SUBSTRING = 3
+# Fuzzy matches score FUZZY minus the number of edits
+FUZZY = 3
+# Extra for names that start with the whole query, as the old prefix search returned
+NAME_PREFIX = 8
+MAX_EDITS = 2
+# Trigram candidates are checked against the names directly once this few remain
+VERIFY_BELOW = 64
+
+def allowed_edits(word: str, max_edits: int) -> int:
+    """Edits tolerated for a query word: none up to 2 letters, one up to 5, then two; at most `max_edits`"""
+    if len(word) <= 2:
+        return 0
+    return min(max_edits, 1 if len(word) <= 5 else MAX_EDITS)
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Levenshtein distance of `a` and `b`, or limit + 1 as soon as it must exceed `limit`.
+
+    Only the diagonal band of width 2 * limit + 1 is computed.
+    """
+    over = limit + 1
+    if abs(len(a) - len(b)) > limit:
+        return over
+    previous = [j if j <= limit else over for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        current = [i if i <= limit else over] + [over] * len(b)
+        low, high = max(1, i - limit), min(len(b), i + limit)
+        for j in range(low, high + 1):
+            current[j] = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (a[i - 1] != b[j - 1]),
+                over
+            )
+        if min(current[low - 1:high + 1]) > limit:
+            return over
+        previous = current
+    return previous[-1]
+
 
 class ExternalUniversitySearch:
+    """Search over the global university dataset, served from a memory-mapped snapshot.
+
+    Startup only maps the snapshot file built by `python uni_snapshot.py build`;
+    the network is used only when a refresh is asked for, which downloads the
+    dataset, rewrites the snapshot and swaps it in.
+    """
     _instance = None
-    
+
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(ExternalUniversitySearch, cls).__new__(cls)
-            cls._instance.data = []
-            cls._instance.country_index = defaultdict(list)
-            cls._instance.name_index = dict()
-            cls._instance.prefix_tree = None
-            cls._instance.loaded = False
+            cls._instance.snapshot = None
+            cls._instance.path = SNAPSHOT_PATH
+            cls._instance._lock = threading.Lock()
         return cls._instance
 
-    def load_data(self):
-        if self.loaded:
+    @property
+    def loaded(self) -> bool:
+        return self.snapshot is not None
+
+    def load_data(self, refresh: bool = False):
+        """Map the snapshot; with `refresh`, rebuild it from the network first"""
+        if self.loaded and not refresh:
             return
-        
-        try:
-            print("Loading global university data...")
-            response = requests.get("https://raw.githubusercontent.com/Hipo/university-domains-list/master/world_universities_and_domains.json")
-            self.data = response.json()
-            
-            for i in self.data:
-                # Basic cleaning
-                name_clean = i['name'].lower().strip()
-                country_clean = i['country'].lower().strip()
-                
-                self.country_index[country_clean].append(i)
-                # Primary name index
-                self.name_index[name_clean] = i
-                
-                # Optional: Only index words if name is very long to avoid massive overhead
-                # We'll stick to primary names for memory stability on small servers
-            
-            self.prefix_tree = Trie(**self.name_index)
-            self.loaded = True
-            print(f"✅ Loaded {len(self.data)} universities globally.")
-        except Exception as e:
-            print(f"Error loading global uni data: {e}")
-
-    def search(self, country=None, name=None, limit=20, offset=0):
+        with self._lock:
+            if self.loaded and not refresh:
+                return
+            try:
+                if refresh:
+                    print(f"Refreshing global university data from {SOURCE_URL}...")
+                    build_snapshot(fetch_dataset(SOURCE_URL), self.path, SOURCE_URL)
+                elif not os.path.exists(self.path):
+                    print(f"⚠️ No global university snapshot at {self.path}; "
+                          "run `python uni_snapshot.py build` or set EXTERNAL_UNIS_REFRESH=1")
+                    return
+                # Searches already running keep the snapshot they started with
+                self.snapshot = UniversitySnapshot(self.path)
+                print(f"✅ Loaded {len(self.snapshot)} universities globally (snapshot {self.snapshot.version}).")
+            except (OSError, ValueError, SnapshotError) as e:
+                print(f"Error loading global uni data: {e}")
+
+    def info(self) -> dict:
+        return self.snapshot.info() if self.snapshot is not None else {"path": self.path, "loaded": False}
+
+    def results(self, snapshot: UniversitySnapshot, country=None, name=None, fuzzy=False, max_edits=MAX_EDITS, count=None):
+        """Record ids a search returns, one per distinct university name, in order,
+        with the number of results; with `count`, only the first `count` ids.
+
+        Browsing a country or the whole dataset reads the lists deduplicated when
+        the snapshot was built, so nothing is scanned. Name queries deduplicate
+        the matches, then only the first `count` of them are selected and sorted.
+        """
+        if name:
+            ids, total = self._scored_matches(snapshot, name, country, max_edits if fuzzy else 0)
+            # Records of one name score the same and the lowest id ranks first, so the
+            # first record of each name in id order is its best-ranked one
+            _, first = np.unique(np.asarray(snapshot.columns["name"])[ids], return_index=True)
+            ids = ids[first]
+            key = self._rank_key(snapshot, ids, total)
+            if count is not None and count < len(ids):
+                top = np.argpartition(key, count - 1)[:count] if count > 0 else np.zeros(0, dtype=np.intp)
+                return ids[top[np.argsort(key[top])]], len(ids)
+            return ids[np.argsort(key)], len(ids)
+        ids = snapshot.in_country(normalize(country)) if country else snapshot.unique_ids
+        return ids, len(ids)
+
+    def search_page(self, country=None, name=None, limit=20, offset=0, fuzzy=False, max_edits=MAX_EDITS) -> dict:
+        """One page of results with the total count, the offset of the next page
+        (None on the last one) and the snapshot version the positions refer to"""
         if not self.loaded:
             self.load_data()
-            
-        filtered = self.data
-        
-        if name and country:
-            name = name.lower().strip()
-            country = country.lower().strip()
-            # Try prefix match first
-            try:
-                name_matches = self.prefix_tree.values(prefix=name)
-                filtered = [uni for uni in name_matches if uni['country'].lower() == country]
-            except:
-                filtered = [uni for uni in self.data if name in uni['name'].lower() and uni['country'].lower() == country]
-        elif name:
-            name = name.lower().strip()
-            try:
-                filtered = self.prefix_tree.values(prefix=name)
-            except:
-                filtered = [uni for uni in self.data if name in uni['name'].lower()]
-        elif country:
-            country = country.lower().strip()
-            filtered = self.country_index.get(country, [])
-
-        # Remove duplicates (since we indexed by multiple words)
-        unique_results = []
-        seen_names = set()
-        for uni in filtered:
-            if uni['name'] not in seen_names:
-                unique_results.append(uni)
-                seen_names.add(uni['name'])
-        
-        # Paginate
-        return unique_results[offset : offset + limit]
+        snapshot = self.snapshot
+        if snapshot is None:
+            return {"results": [], "total": 0, "next_offset": None, "version": None}
+
+        offset = max(offset, 0)
+        end = offset + max(limit, 0)
+        ids, total = self.results(snapshot, country=country, name=name, fuzzy=fuzzy, max_edits=max_edits, count=end)
+        # Only the page is decoded from the string table
+        return {
+            "results": [snapshot.record(int(record_id)) for record_id in ids[offset:end]],
+            "total": total,
+            "next_offset": end if end < total else None,
+            "version": snapshot.version,
+        }
+
+    def search(self, country=None, name=None, limit=20, offset=0, fuzzy=False, max_edits=MAX_EDITS):
+        return self.search_page(country, name, limit, offset, fuzzy, max_edits)["results"]
+
+    def _fuzzy_tokens(self, snapshot: UniversitySnapshot, term: str, max_edits: int) -> Dict[int, int]:
+        """Positions of indexed words within the allowed edits of `term`, with their distance.
+
+        A word within k edits of the term shares at least all but 3k of the term's
+        padded trigrams, so candidates come from counting trigram hits per word;
+        only those are compared letter by letter.
+        """
+        edits = allowed_edits(term, max_edits)
+        if edits == 0:
+            return {}
+        grams = word_trigrams(term)
+        hits = np.bincount(
+            np.concatenate([np.asarray(snapshot.word_trigrams.get(gram)) for gram in grams]).astype(np.intp),
+            minlength=len(snapshot.tokens)
+        )
+        found = {}
+        for pos in np.flatnonzero(hits >= len(grams) - 3 * edits).tolist():
+            word = snapshot.tokens.keys[pos].decode("utf-8")
+            distance = edit_distance(term, word, edits)
+            if distance <= edits:
+                found[pos] = distance
+        return found
+
+    def _term_scores(self, snapshot: UniversitySnapshot, term: str, max_edits: int = 0) -> np.ndarray:
+        """Per record, how `term` matches its name: a whole word, a word prefix, elsewhere (3+ chars),
+        a word within `max_edits` edits, or 0"""
+        scores = np.zeros(len(snapshot), dtype=np.int8)
+        tokens = snapshot.tokens
+        words = tokens.prefix_range(term)
+        if words:
+            # Keys sharing a prefix are adjacent, so their postings form one slice
+            scores[np.asarray(tokens.ids[tokens.starts[words.start]:tokens.starts[words.stop]])] = TOKEN_PREFIX
+            scores[np.asarray(tokens.get(term))] = EXACT_TOKEN
+        if len(term) >= 3:
+            postings = sorted((np.asarray(snapshot.trigrams.get(gram)) for gram in trigrams(term)), key=len)
+            candidates = postings[0][scores[postings[0]] == 0]
+            for ids in postings[1:]:
+                if len(candidates) < VERIFY_BELOW:
+                    break
+                candidates = np.intersect1d(candidates, ids, assume_unique=True)
+            key = term.encode("utf-8")
+            names, rank = snapshot.names, snapshot.name_rank
+            scores[[i for i in candidates.tolist() if key in names[rank[i]]]] = SUBSTRING
+        if max_edits:
+            for pos, distance in self._fuzzy_tokens(snapshot, term, max_edits).items():
+                ids = np.asarray(tokens.postings(pos))
+                scores[ids] = np.maximum(scores[ids], FUZZY - distance)
+        return scores
+
+    def _scored_matches(self, snapshot: UniversitySnapshot, query: str, country=None, max_edits: int = 0):
+        """Ids of records matching every word of `query`, ascending, and every record's relevance"""
+        total = np.zeros(len(snapshot), dtype=np.int16)
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return np.zeros(0, dtype=np.intp), total
+        matched = np.ones(len(snapshot), dtype=bool)
+        if country:
+            country_pos = snapshot.country(normalize(country))
+            if country_pos is None:
+                return np.zeros(0, dtype=np.intp), total
+            matched &= np.asarray(snapshot.record_country) == country_pos
+
+        for term in terms:
+            scores = self._term_scores(snapshot, term, max_edits)
+            matched &= scores > 0
+            total += scores
+        ids = np.flatnonzero(matched)
+        if len(ids):
+            total[np.asarray(snapshot.name_prefix(normalize(query)))] += NAME_PREFIX
+        return ids, total
+
+    @staticmethod
+    def _rank_key(snapshot: UniversitySnapshot, ids: np.ndarray, total: np.ndarray) -> np.ndarray:
+        """One integer per id ordering by relevance, then name; name ranks are unique, so no ties"""
+        return -total[ids].astype(np.int64) * len(snapshot) + np.asarray(snapshot.name_rank)[ids]
+
+    def match(self, snapshot: UniversitySnapshot, query: str, country=None, max_edits: int = 0) -> List[int]:
+        """Ids of names matching every word of `query`, most relevant first.
+
+        Each word is looked up in the token index (whole word or word prefix) and,
+        from three characters on, in the trigram index for matches anywhere in
+        the name. With `max_edits`, a word may also match a misspelled one.
+        Results are ranked by how well the words matched, then by name.
+        """
+        ids, total = self._scored_matches(snapshot, query, country, max_edits)
+        return ids[np.argsort(self._rank_key(snapshot, ids, total))].tolist()
 
 external_search = ExternalUniversitySearch()
@@ -0,0 +1,141 @@
+import asyncio
+import json
+import os
+import random
+import re
+import time
+from collections import deque
+from types import SimpleNamespace
+
+try:
+    from google.api_core import exceptions as google_exceptions
+except ImportError:  # pragma: no cover - google-generativeai always ships api_core
+    google_exceptions = None
+
+
+class FakeUpstreamError(Exception):
+    """Stand-in for a google.api_core HTTP error when api_core is unavailable"""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+
+def upstream_error(code: int, message: str = "Injected by FakeGenerativeModel") -> Exception:
+    """The exception the real SDK raises for an HTTP status (429 -> ResourceExhausted)"""
+    if google_exceptions is not None:
+        return google_exceptions.from_http_status(code, message)
+    return FakeUpstreamError(code, message)
+
+
+class FakeGenerativeModel:
+    """Local stand-in for `genai.GenerativeModel` used by benchmarks.
+
+    Answers every prompt with a canned reply without any network access or
+    quota usage. The first token arrives after `latency` seconds and each
+    following token after `token_delay` seconds; non-streaming calls wait for
+    the whole reply.
+
+    Failures can be injected: the first `fail_first` calls, and then a random
+    `error_rate` share of calls, raise the SDK error for `error_code` (429 by
+    default) after `error_latency` seconds.
+
+    Task-generation and summary prompts get replies in the shape their callers
+    parse. Prompt sizes of recent calls are kept in `prompt_chars`.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.5,
+        token_delay: float = 0.0,
+        reply: str = None,
+        model_name: str = "fake-llm",
+        error_rate: float = 0.0,
+        fail_first: int = 0,
+        error_code: int = 429,
+        error_latency: float = 0.0,
+        seed: int = None
+    ):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.model_name = model_name
+        self.reply = reply or (
+            "Here are a few universities that fit your profile.\n"
+            "- Technical University of Munich\n"
+            "- University of Toronto\n"
+            "ACTION: CREATE_TASK\n"
+            'PARAMS: {"title": "Shortlist 5 universities", "priority": 3}\n'
+            "Let me know which of these you'd like to explore further."
+        )
+        self.error_rate = error_rate
+        self.fail_first = fail_first
+        self.error_code = error_code
+        self.error_latency = error_latency
+        self._random = random.Random(seed)
+        self.calls = 0
+        self.errors = 0
+        self.prompt_chars = deque(maxlen=10000)
+
+    @classmethod
+    def from_env(cls) -> "FakeGenerativeModel":
+        """Configured by FAKE_LLM_* variables; used when LLM_BACKEND=fake"""
+        seed = os.getenv("FAKE_LLM_SEED")
+        return cls(
+            latency=float(os.getenv("FAKE_LLM_LATENCY", "0.5")),
+            token_delay=float(os.getenv("FAKE_LLM_TOKEN_DELAY", "0.02")),
+            error_rate=float(os.getenv("FAKE_LLM_ERROR_RATE", "0")),
+            error_code=int(os.getenv("FAKE_LLM_ERROR_CODE", "429")),
+            error_latency=float(os.getenv("FAKE_LLM_ERROR_LATENCY", "0")),
+            seed=int(seed) if seed else None
+        )
+
+    def _reply_for(self, prompt: str) -> str:
+        if "OUTPUT FORMAT (Strict JSON)" in prompt:
+            return json.dumps([
+                {"title": f"Application step {i}", "description": "Generated by the fake model", "priority": 5 - i}
+                for i in range(5)
+            ])
+        if "UPDATED SUMMARY:" in prompt:
+            return "The student is exploring universities and discussed their shortlist with the counsellor."
+        return self.reply
+
+    @staticmethod
+    def _tokens(text: str):
+        # Words with their trailing whitespace, roughly how Gemini chunks text
+        return re.findall(r"\S+\s*|\s+", text)
+
+    def _total_latency(self, text: str) -> float:
+        return self.latency + self.token_delay * max(0, len(self._tokens(text)) - 1)
+
+    def _should_fail(self, prompt: str) -> bool:
+        self.calls += 1
+        self.prompt_chars.append(len(prompt))
+        if self.calls <= self.fail_first or (self.error_rate and self._random.random() < self.error_rate):
+            self.errors += 1
+            return True
+        return False
+
+    def generate_content(self, prompt: str):
+        if self._should_fail(prompt):
+            time.sleep(self.error_latency)
+            raise upstream_error(self.error_code)
+        text = self._reply_for(prompt)
+        time.sleep(self._total_latency(text))
+        return SimpleNamespace(text=text)
+
+    async def generate_content_async(self, prompt: str, stream: bool = False):
+        if self._should_fail(prompt):
+            await asyncio.sleep(self.error_latency)
+            raise upstream_error(self.error_code)
+        text = self._reply_for(prompt)
+        if stream:
+            return self._stream(text)
+        await asyncio.sleep(self._total_latency(text))
+        return SimpleNamespace(text=text)
+
+    async def _stream(self, text: str):
+        await asyncio.sleep(self.latency)
+        for i, token in enumerate(self._tokens(text)):
+            if i:
+                await asyncio.sleep(self.token_delay)
+            yield SimpleNamespace(text=token)
@@ -0,0 +1,140 @@
+import numpy as np
+from typing import Iterable, List, Optional
+from models import University, UserProfile
+
+
+class UniversityCatalog:
+    """Column-oriented view of the university requirement fields used for fit scoring.
+
+    Missing values are stored as NaN so a whole catalog can be scored in one
+    vectorized pass instead of one `_calculate_fit_score` call per row.
+    """
+
+    def __init__(
+        self,
+        ids: np.ndarray,
+        min_gpa: np.ndarray,
+        min_ielts: np.ndarray,
+        total_cost: np.ndarray,
+        universities: Optional[List[University]] = None
+    ):
+        self.ids = ids
+        self.min_gpa = min_gpa
+        self.min_ielts = min_ielts
+        self.total_cost = total_cost
+        # Original objects, kept so callers can map a row back to its University
+        self.universities = universities
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def from_universities(cls, universities: Iterable[University]) -> "UniversityCatalog":
+        universities = list(universities)
+        return cls.from_rows(
+            [
+                (u.id, u.min_gpa, u.min_ielts, u.tuition_fee_max, u.living_cost_yearly)
+                for u in universities
+            ],
+            universities=universities
+        )
+
+    @classmethod
+    def from_rows(cls, rows, universities: Optional[List[University]] = None) -> "UniversityCatalog":
+        """Build from (id, min_gpa, min_ielts, tuition_fee_max, living_cost_yearly) tuples"""
+        n = len(rows)
+        ids = np.fromiter((r[0] if r[0] is not None else -1 for r in rows), dtype=np.int64, count=n)
+        min_gpa = np.fromiter((np.nan if r[1] is None else r[1] for r in rows), dtype=np.float64, count=n)
+        min_ielts = np.fromiter((np.nan if r[2] is None else r[2] for r in rows), dtype=np.float64, count=n)
+        # Same `or 0` semantics as `_calculate_fit_score`
+        total_cost = np.fromiter(((r[3] or 0) + (r[4] or 0) for r in rows), dtype=np.float64, count=n)
+        return cls(ids, min_gpa, min_ielts, total_cost, universities=universities)
+
+
+def score_catalog(profile: UserProfile, catalog: UniversityCatalog) -> np.ndarray:
+    """Score a profile against every university in the catalog.
+
+    Mirrors `AICounsellor._calculate_fit_score` exactly. Raises TypeError when
+    a profile field is not numeric so the caller can fall back to the scalar path.
+    """
+    scores = np.full(len(catalog), 50.0)
+
+    # GPA match
+    if profile.gpa is not None:
+        gpa = _as_number(profile.gpa)
+        known = ~np.isnan(catalog.min_gpa)
+        scores += np.where(
+            known,
+            np.where(gpa >= catalog.min_gpa + 0.5, 20.0, np.where(gpa >= catalog.min_gpa, 10.0, -20.0)),
+            0.0
+        )
+
+    # IELTS match
+    if profile.ielts_score is not None:
+        ielts = _as_number(profile.ielts_score)
+        known = ~np.isnan(catalog.min_ielts)
+        scores += np.where(
+            known,
+            np.where(ielts >= catalog.min_ielts + 0.5, 15.0, np.where(ielts >= catalog.min_ielts, 7.0, -15.0)),
+            0.0
+        )
+
+    # Budget match
+    if profile.budget_max:
+        budget = _as_number(profile.budget_max)
+        cost = catalog.total_cost
+        scores += np.where(
+            cost > 0,
+            np.where(cost <= budget, 15.0, np.where(cost <= budget * 1.2, 5.0, -20.0)),
+            0.0
+        )
+
+    return np.clip(scores, 0.0, 100.0)
+
+
+def profile_signature(profile: UserProfile) -> str:
+    """Identifies the profile fields fit scoring depends on"""
+    return repr((profile.gpa, profile.ielts_score, profile.budget_max))
+
+
+def _as_number(value) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise TypeError(f"Expected a number, got {type(value).__name__}")
+    return value
+
+
+def top_k_indices(scores: np.ndarray, k: Optional[int] = None) -> np.ndarray:
+    """Row indices of the k best scores, best first.
+
+    Ties keep catalog order, so the result is the same as the first k rows of a
+    stable descending sort, but only O(n) work is done when k is small.
+    """
+    n = len(scores)
+    if k is None or k >= n:
+        return np.argsort(-scores, kind="stable")
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+
+    kth = np.partition(scores, n - k)[n - k]
+    above = np.flatnonzero(scores > kth)
+    ties = np.flatnonzero(scores == kth)[: k - len(above)]
+    selected = np.concatenate([above, ties])
+    return selected[np.lexsort((selected, -scores[selected]))]
+
+
+class RankedUniversities:
+    """University ids with their fit scores, in rank order"""
+
+    def __init__(self, ids: np.ndarray, scores: np.ndarray):
+        self.ids = ids
+        self.scores = scores
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def nbytes(self) -> int:
+        return self.ids.nbytes + self.scores.nbytes
+
+    def __getitem__(self, index: slice) -> "RankedUniversities":
+        return RankedUniversities(self.ids[index], self.scores[index])
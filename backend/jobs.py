@@ -0,0 +1,286 @@
+import asyncio
+import inspect
+import json
+import logging
+import os
+import random
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import Job, JobStatus
+
+logger = logging.getLogger("AICounsellor")
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# Retry n waits a random delay up to base * 2^(n-1) seconds
+JOB_RETRY_BASE_DELAY = float(os.getenv("JOB_RETRY_BASE_DELAY", "2"))
+
+FINISHED = (JobStatus.SUCCEEDED, JobStatus.FAILED)
+
+
+class PermanentJobError(Exception):
+    """Raised by a handler when retrying cannot help; the job fails without further attempts"""
+    pass
+
+
+class JobQueue:
+    """In-process queue for work that should not hold up a response.
+
+    Every job is a row in the `jobs` table, written before it is queued, so
+    pending work survives a restart: `start()` queues whatever is still pending
+    or was left running. Workers run on the app's event loop; synchronous
+    handlers run in a thread. A failing job is retried with jittered
+    exponential backoff until `max_attempts`, then marked failed; one that
+    raises PermanentJobError is marked failed straight away.
+    """
+
+    def __init__(
+        self,
+        workers: int = JOB_WORKERS,
+        max_attempts: int = JOB_MAX_ATTEMPTS,
+        retry_base_delay: float = JOB_RETRY_BASE_DELAY,
+        session_factory: Callable = SessionLocal
+    ):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay
+        self.session_factory = session_factory
+        self._handlers: Dict[str, Callable] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks = []
+        self._waiters: Dict[int, asyncio.Event] = {}
+        self._lock = threading.Lock()
+        self.succeeded = 0
+        self.failed = 0
+        self.retried = 0
+
+    def handler(self, kind: str):
+        """Register `fn(payload) -> result dict` (sync or async) for jobs of `kind`"""
+        def register(fn: Callable) -> Callable:
+            self._handlers[kind] = fn
+            return fn
+        return register
+
+    @property
+    def running(self) -> bool:
+        return self._loop is not None
+
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        db = self.session_factory()
+        try:
+            # Jobs a previous process was running when it stopped are run again
+            db.query(Job).filter(Job.status == JobStatus.RUNNING).update(
+                {Job.status: JobStatus.PENDING}, synchronize_session=False
+            )
+            db.commit()
+            pending = [row.id for row in db.query(Job.id).filter(Job.status == JobStatus.PENDING).order_by(Job.id)]
+        finally:
+            db.close()
+        for job_id in pending:
+            self._queue.put_nowait(job_id)
+        if pending:
+            logger.info(f"Job queue: resuming {len(pending)} pending jobs")
+        self._tasks = [self._loop.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._loop = None
+
+    def enqueue(
+        self,
+        kind: str,
+        payload: Optional[Dict[str, Any]] = None,
+        user_id: Optional[int] = None,
+        dedupe: bool = False,
+        db: Optional[Session] = None
+    ) -> Job:
+        """Persist a job and queue it; safe to call from request threads.
+
+        Pass the request's `db` to write the job in the caller's transaction:
+        their pending changes commit together with the job, and no second pooled
+        connection is taken while theirs is held. With `dedupe`, a job of the
+        same kind and payload that has not started yet is returned instead of
+        adding another one.
+        """
+        if kind not in self._handlers:
+            raise ValueError(f"No handler registered for job kind '{kind}'")
+        encoded = json.dumps(payload or {}, sort_keys=True)
+        own_session = db is None
+        if own_session:
+            db = self.session_factory()
+        try:
+            if dedupe:
+                existing = db.query(Job).filter(
+                    Job.kind == kind,
+                    Job.payload == encoded,
+                    Job.status == JobStatus.PENDING
+                ).first()
+                if existing is not None:
+                    db.commit()
+                    return existing
+            job = Job(
+                kind=kind,
+                payload=encoded,
+                user_id=user_id,
+                status=JobStatus.PENDING,
+                attempts=0,
+                max_attempts=self.max_attempts
+            )
+            db.add(job)
+            db.flush()
+            job_id = job.id
+            db.commit()
+            if own_session:
+                db.refresh(job)
+                db.expunge(job)
+        finally:
+            if own_session:
+                db.close()
+        # Before start() the row simply waits; start() picks up everything pending
+        self._dispatch(job_id)
+        return job
+
+    def _dispatch(self, job_id: int, delay: float = 0) -> None:
+        loop = self._loop
+        if loop is None:
+            return
+        if delay > 0:
+            loop.call_soon_threadsafe(loop.call_later, delay, self._queue.put_nowait, job_id)
+        else:
+            loop.call_soon_threadsafe(self._queue.put_nowait, job_id)
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                logger.error(f"Job {job_id}: worker error: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    def _claim(self, job_id: int):
+        """Mark a pending job running; None if it is gone or another worker has it"""
+        db = self.session_factory()
+        try:
+            claimed = db.query(Job).filter(Job.id == job_id, Job.status == JobStatus.PENDING).update(
+                {Job.status: JobStatus.RUNNING, Job.attempts: Job.attempts + 1},
+                synchronize_session=False
+            )
+            db.commit()
+            if not claimed:
+                return None
+            job = db.query(Job).filter(Job.id == job_id).first()
+            return job.kind, json.loads(job.payload), job.attempts, job.max_attempts
+        finally:
+            db.close()
+
+    def _status(self, job_id: int) -> Optional[JobStatus]:
+        db = self.session_factory()
+        try:
+            return db.query(Job.status).filter(Job.id == job_id).scalar()
+        finally:
+            db.close()
+
+    def _record(self, job_id: int, status: JobStatus, result=None, error: Optional[str] = None) -> None:
+        db = self.session_factory()
+        try:
+            job = db.query(Job).filter(Job.id == job_id).first()
+            job.status = status
+            job.error = error
+            if status in FINISHED:
+                job.finished_at = datetime.utcnow()
+                job.result = json.dumps(result, default=str) if result is not None else None
+            db.commit()
+        finally:
+            db.close()
+
+    async def _run(self, job_id: int) -> None:
+        # Bookkeeping queries run in threads so a busy pool never stalls the event loop
+        claimed = await asyncio.to_thread(self._claim, job_id)
+        if claimed is None:
+            return
+        kind, payload, attempts, max_attempts = claimed
+        fn = self._handlers.get(kind)
+        try:
+            if fn is None:
+                raise LookupError(f"No handler registered for job kind '{kind}'")
+            if inspect.iscoroutinefunction(fn):
+                result = await fn(payload)
+            else:
+                result = await asyncio.to_thread(fn, payload)
+        except Exception as e:
+            error = f"{type(e).__name__}: {str(e)}"
+            if attempts < max_attempts and fn is not None and not isinstance(e, PermanentJobError):
+                delay = random.uniform(0, self.retry_base_delay * 2 ** (attempts - 1))
+                logger.warning(f"Job {job_id} ({kind}) attempt {attempts} failed, retrying in {delay:.1f}s: {error}")
+                await asyncio.to_thread(self._record, job_id, JobStatus.PENDING, None, error)
+                with self._lock:
+                    self.retried += 1
+                self._dispatch(job_id, delay)
+                return
+            logger.error(f"Job {job_id} ({kind}) failed after {attempts} attempts: {error}")
+            await asyncio.to_thread(self._record, job_id, JobStatus.FAILED, None, error)
+            with self._lock:
+                self.failed += 1
+        else:
+            await asyncio.to_thread(self._record, job_id, JobStatus.SUCCEEDED, result)
+            with self._lock:
+                self.succeeded += 1
+        waiter = self._waiters.pop(job_id, None)
+        if waiter is not None:
+            waiter.set()
+
+    async def wait(self, job_id: int, timeout: float) -> None:
+        """Return once the job has finished, or after `timeout` seconds"""
+        waiter = self._waiters.setdefault(job_id, asyncio.Event())
+        # It may have finished before we started listening
+        if await asyncio.to_thread(self._status, job_id) in FINISHED:
+            # Other requests may be waiting on the same event; wake them before dropping it
+            waiter.set()
+            self._waiters.pop(job_id, None)
+            return
+        try:
+            await asyncio.wait_for(waiter.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "running": self.running,
+                "workers": self.workers,
+                "queued": self._queue.qsize() if self._queue is not None else 0,
+                "succeeded": self.succeeded,
+                "failed": self.failed,
+                "retried": self.retried,
+                "kinds": sorted(self._handlers),
+            }
+
+
+def job_to_dict(job: Job) -> dict:
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status.value,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error,
+        "created_at": job.created_at,
+        "finished_at": job.finished_at,
+    }
+
+
+job_queue = JobQueue()
@@ -0,0 +1,216 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from cache import LRUCache
+
+logger = logging.getLogger("AICounsellor")
+
+
+class MemoryBackend:
+    """Process-local storage on top of LRUCache; values are (expires_at, text)"""
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self._lru = LRUCache(
+            max_entries=max_entries,
+            max_bytes=max_bytes,
+            sizeof=lambda entry: len(entry[1].encode("utf-8"))
+        )
+
+    def get(self, key: str) -> Optional[tuple]:
+        return self._lru.get(key)
+
+    def set(self, key: str, text: str, expires_at: float) -> None:
+        self._lru.set(key, (expires_at, text))
+
+    def delete(self, key: str) -> None:
+        self._lru.pop(key)
+
+    def clear(self) -> None:
+        self._lru.clear()
+
+    def stats(self) -> dict:
+        stats = self._lru.stats()
+        return {
+            "entries": stats["entries"],
+            "bytes": stats["bytes"],
+            "max_entries": stats["max_entries"],
+            "max_bytes": stats["max_bytes"],
+            "evictions": stats["evictions"],
+        }
+
+
+class DiskBackend:
+    """SQLite file shared by every worker on the host; survives restarts"""
+
+    def __init__(self, path: str, max_entries: int, max_bytes: int):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_responses ("
+            "key TEXT PRIMARY KEY, text TEXT NOT NULL, size INTEGER NOT NULL, "
+            "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_responses_accessed_at ON llm_responses (accessed_at)")
+
+    def get(self, key: str) -> Optional[tuple]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT expires_at, text FROM llm_responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                self._conn.execute(
+                    "UPDATE llm_responses SET accessed_at = ? WHERE key = ?", (time.time(), key)
+                )
+            return row
+
+    def set(self, key: str, text: str, expires_at: float) -> None:
+        size = len(text.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_responses (key, text, size, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, text, size, expires_at, now)
+            )
+            self._conn.execute("DELETE FROM llm_responses WHERE expires_at <= ?", (now,))
+            self._evict()
+
+    def _evict(self) -> None:
+        count, total = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_responses"
+        ).fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        # Walk least-recently-used first until both limits hold again
+        stale = []
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM llm_responses ORDER BY accessed_at"
+        ):
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            stale.append((key,))
+            count -= 1
+            total -= size
+        self._conn.executemany("DELETE FROM llm_responses WHERE key = ?", stale)
+        self.evictions += len(stale)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_responses")
+
+    def stats(self) -> dict:
+        with self._lock:
+            count, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_responses"
+            ).fetchone()
+        return {
+            "entries": count,
+            "bytes": total,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+            "path": self.path,
+        }
+
+
+class LLMResponseCache:
+    """Exact-match cache of model replies keyed by sha256(model name + prompt).
+
+    Entries expire after `ttl` seconds; the backend bounds size with LRU eviction.
+    Only complete, non-empty replies should be stored.
+    """
+
+    def __init__(self, backend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    @staticmethod
+    def key(model_name: str, prompt: str) -> str:
+        digest = hashlib.sha256()
+        digest.update(model_name.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(prompt.encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, model_name: str, prompt: str) -> Optional[str]:
+        key = self.key(model_name, prompt)
+        entry = self.backend.get(key)
+        expired = entry is not None and entry[0] <= time.time()
+        if expired:
+            self.backend.delete(key)
+        with self._lock:
+            if entry is None or expired:
+                self.misses += 1
+                self.expired += expired
+                return None
+            self.hits += 1
+        return entry[1]
+
+    def set(self, model_name: str, prompt: str, text: str) -> None:
+        if not text:
+            return
+        try:
+            self.backend.set(self.key(model_name, prompt), text, time.time() + self.ttl)
+        except sqlite3.Error as e:
+            logger.warning(f"Could not store LLM response in cache: {str(e)}")
+
+    def discard(self, model_name: str, prompt: str) -> None:
+        """Forget a reply the caller could not use, so the next call asks the model again"""
+        self.backend.delete(self.key(model_name, prompt))
+
+    def clear(self) -> None:
+        self.backend.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                "backend": type(self.backend).__name__.replace("Backend", "").lower(),
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            }
+        stats.update(self.backend.stats())
+        return stats
+
+
+def create_llm_cache() -> Optional[LLMResponseCache]:
+    """Cache configured by LLM_CACHE_* environment variables; None when LLM_CACHE_BACKEND=off"""
+    backend_name = os.getenv("LLM_CACHE_BACKEND", "memory").lower()
+    ttl = float(os.getenv("LLM_CACHE_TTL_SECONDS", "3600"))
+    max_entries = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1000"))
+    max_bytes = int(os.getenv("LLM_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+
+    if backend_name == "off":
+        return None
+    if backend_name == "disk":
+        path = os.getenv("LLM_CACHE_PATH", ".llm_cache.sqlite3")
+        try:
+            return LLMResponseCache(DiskBackend(path, max_entries, max_bytes), ttl)
+        except sqlite3.Error as e:
+            logger.warning(f"Could not open LLM cache at {path} ({str(e)}); using memory instead")
+    elif backend_name != "memory":
+        logger.warning(f"Unknown LLM_CACHE_BACKEND '{backend_name}'; using memory")
+    return LLMResponseCache(MemoryBackend(max_entries, max_bytes), ttl)
@@ -0,0 +1,369 @@
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+import weakref
+from typing import AsyncIterator, Optional
+
+from dotenv import load_dotenv
+
+logger = logging.getLogger("AICounsellor")
+
+load_dotenv()
+
+# Upper bound on concurrent model calls per process, and per-call timeout
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+# Token bucket: sustained calls per minute and burst size
+LLM_RATE_PER_MINUTE = float(os.getenv("LLM_RATE_PER_MINUTE", "300"))
+LLM_RATE_BURST = int(os.getenv("LLM_RATE_BURST", "20"))
+# Retries for transient failures (429, 5xx, timeouts) with full-jitter exponential backoff
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "8"))
+# Circuit breaker: consecutive failed calls before opening, and how long it stays open
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "5"))
+LLM_BREAKER_COOLDOWN_SECONDS = float(os.getenv("LLM_BREAKER_COOLDOWN_SECONDS", "30"))
+
+TRANSIENT_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    """Base exception for the LLM client"""
+    pass
+
+
+class LLMTimeoutError(LLMError):
+    """The model did not answer (or stalled mid-stream) within the timeout"""
+    pass
+
+
+class LLMEmptyResponseError(LLMError):
+    """The model answered without any text"""
+    pass
+
+
+class LLMUnavailableError(LLMError):
+    """Call refused locally: circuit open or rate limit wait too long"""
+    pass
+
+
+def is_transient(error: Exception) -> bool:
+    """Errors worth retrying and counting against upstream health"""
+    if isinstance(error, (LLMTimeoutError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    # google.api_core exceptions carry the HTTP status in `code` (ResourceExhausted -> 429)
+    code = getattr(error, "code", None)
+    try:
+        return int(code) in TRANSIENT_STATUS_CODES
+    except (TypeError, ValueError):
+        return False
+
+
+class TokenBucket:
+    """Token-bucket rate limiter shared by every event loop in the process"""
+
+    def __init__(self, rate_per_second: float, capacity: int):
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.throttled = 0
+
+    def _reserve(self) -> float:
+        """Take a token, possibly going into debt; returns how long the caller must wait"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            self.throttled += 1
+            return -self._tokens / self.rate
+
+    def _refund(self) -> None:
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + 1)
+
+    async def acquire(self, max_wait: float) -> None:
+        wait = self._reserve()
+        if wait > max_wait:
+            self._refund()
+            raise LLMUnavailableError(f"Rate limit: next model call slot in {wait:.1f}s")
+        if wait:
+            await asyncio.sleep(wait)
+
+    def stats(self) -> dict:
+        with self._lock:
+            tokens = min(self.capacity, self._tokens + (time.monotonic() - self._updated) * self.rate)
+            return {
+                "rate_per_minute": round(self.rate * 60, 2),
+                "burst": self.capacity,
+                "tokens": round(tokens, 2),
+                "throttled": self.throttled,
+            }
+
+
+class CircuitBreaker:
+    """Closed -> open after `threshold` consecutive failures; one trial call after `cooldown`.
+
+    While open, calls are refused immediately so callers can fall back without
+    waiting for a request that is very likely to fail.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.rejected = 0
+        self.times_opened = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = self.HALF_OPEN
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info("LLM circuit closed: upstream recovered")
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.threshold):
+                if self.state == self.CLOSED:
+                    logger.warning(f"LLM circuit opened after {self.failures} consecutive failures")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self.times_opened += 1
+
+    def release(self) -> None:
+        """The admitted call ended without telling us anything about upstream health"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def stats(self) -> dict:
+        with self._lock:
+            retry_in = None
+            if self.state == self.OPEN:
+                retry_in = round(max(0.0, self.cooldown - (time.monotonic() - self.opened_at)), 2)
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "threshold": self.threshold,
+                "cooldown_seconds": self.cooldown,
+                "retry_in_seconds": retry_in,
+                "times_opened": self.times_opened,
+                "rejected": self.rejected,
+            }
+
+
+class LLMClient:
+    """Every model call goes through here: circuit breaker, rate limit, in-flight limit,
+    timeout and jittered retries of transient errors.
+
+    The model is passed per call so it can be swapped (e.g. for a fake) at runtime.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = LLM_MAX_CONCURRENCY,
+        timeout: float = LLM_TIMEOUT_SECONDS,
+        rate_per_minute: float = LLM_RATE_PER_MINUTE,
+        burst: int = LLM_RATE_BURST,
+        max_retries: int = LLM_MAX_RETRIES,
+        retry_base_delay: float = LLM_RETRY_BASE_DELAY,
+        retry_max_delay: float = LLM_RETRY_MAX_DELAY,
+        breaker_threshold: int = LLM_BREAKER_THRESHOLD,
+        breaker_cooldown: float = LLM_BREAKER_COOLDOWN_SECONDS
+    ):
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.bucket = TokenBucket(rate_per_minute / 60.0, burst)
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_cooldown)
+        self._slots = weakref.WeakKeyDictionary()
+        self._counts_lock = threading.Lock()
+        self.in_flight = 0
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+
+    def _slot(self) -> asyncio.Semaphore:
+        """In-flight limiter for the running event loop (semaphores can't be shared across loops)"""
+        loop = asyncio.get_running_loop()
+        slot = self._slots.get(loop)
+        if slot is None:
+            slot = self._slots[loop] = asyncio.Semaphore(self.max_in_flight)
+        return slot
+
+    def _count(self, field: str, delta: int = 1) -> None:
+        with self._counts_lock:
+            setattr(self, field, getattr(self, field) + delta)
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt))
+
+    def _admit(self) -> None:
+        if not self.breaker.allow():
+            raise LLMUnavailableError("AI service is temporarily unavailable (circuit open)")
+
+    def _record(self, error: Optional[Exception]) -> None:
+        if error is None:
+            self.breaker.record_success()
+        elif is_transient(error):
+            self._count("failures")
+            self.breaker.record_failure()
+        else:
+            # Bad request, safety block, empty answer: the upstream itself is fine
+            self.breaker.release()
+
+    async def generate(self, model, prompt: str) -> str:
+        """Complete reply text for `prompt`"""
+        self._admit()
+        attempt = 0
+        try:
+            while True:
+                try:
+                    text = await self._attempt(model, prompt)
+                except Exception as e:
+                    if is_transient(e) and attempt < self.max_retries:
+                        attempt += 1
+                        self._count("retries")
+                        delay = self._backoff(attempt)
+                        logger.warning(f"Transient LLM error ({e}); retry {attempt}/{self.max_retries} in {delay:.2f}s")
+                        await asyncio.sleep(delay)
+                        continue
+                    self._record(e)
+                    raise
+                self._record(None)
+                return text
+        except asyncio.CancelledError:
+            # Caller gave up (client gone, request timed out); frees a half-open trial slot
+            self.breaker.release()
+            raise
+
+    async def _attempt(self, model, prompt: str) -> str:
+        await self.bucket.acquire(max_wait=self.timeout)
+        async with self._slot():
+            self._count("calls")
+            self._count("in_flight")
+            try:
+                if not hasattr(model, "generate_content_async"):
+                    call = asyncio.to_thread(model.generate_content, prompt)
+                else:
+                    call = model.generate_content_async(prompt)
+                response = await asyncio.wait_for(call, timeout=self.timeout)
+            except asyncio.TimeoutError:
+                raise LLMTimeoutError(f"AI did not respond within {self.timeout:.0f}s")
+            finally:
+                self._count("in_flight", -1)
+        if not response or not response.text:
+            raise LLMEmptyResponseError("Empty response from AI")
+        return response.text
+
+    async def stream(self, model, prompt: str) -> AsyncIterator[str]:
+        """Yield reply text chunks; retries only happen before the first chunk is sent"""
+        self._admit()
+        attempt = 0
+        sent = False
+        try:
+            while True:
+                chunks = self._stream_attempt(model, prompt)
+                try:
+                    async for text in chunks:
+                        sent = True
+                        yield text
+                    break
+                except Exception as e:
+                    if not sent and is_transient(e) and attempt < self.max_retries:
+                        attempt += 1
+                        self._count("retries")
+                        delay = self._backoff(attempt)
+                        logger.warning(f"Transient LLM error ({e}); retry {attempt}/{self.max_retries} in {delay:.2f}s")
+                        await asyncio.sleep(delay)
+                        continue
+                    self._record(e)
+                    raise
+                finally:
+                    # Frees the in-flight slot now rather than when the generator is collected
+                    await chunks.aclose()
+        except (GeneratorExit, asyncio.CancelledError):
+            # Consumer stopped reading or was cancelled; says nothing about upstream health
+            self.breaker.release()
+            raise
+        self._record(None)
+
+    async def _stream_attempt(self, model, prompt: str) -> AsyncIterator[str]:
+        await self.bucket.acquire(max_wait=self.timeout)
+        async with self._slot():
+            self._count("calls")
+            self._count("in_flight")
+            try:
+                if not hasattr(model, "generate_content_async"):
+                    response = await asyncio.wait_for(
+                        asyncio.to_thread(model.generate_content, prompt), timeout=self.timeout
+                    )
+                    if not response or not response.text:
+                        raise LLMEmptyResponseError("Empty response from AI")
+                    yield response.text
+                    return
+                response = await asyncio.wait_for(
+                    model.generate_content_async(prompt, stream=True), timeout=self.timeout
+                )
+                chunks = response.__aiter__()
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), timeout=self.timeout)
+                    except StopAsyncIteration:
+                        break
+                    try:
+                        text = chunk.text
+                    except ValueError:
+                        # Chunks without text parts (e.g. safety metadata)
+                        continue
+                    if text:
+                        yield text
+            except asyncio.TimeoutError:
+                raise LLMTimeoutError(f"AI stalled for more than {self.timeout:.0f}s")
+            finally:
+                self._count("in_flight", -1)
+
+    def stats(self) -> dict:
+        with self._counts_lock:
+            counts = {
+                "in_flight": self.in_flight,
+                "max_in_flight": self.max_in_flight,
+                "calls": self.calls,
+                "retries": self.retries,
+                "failures": self.failures,
+                "max_retries": self.max_retries,
+                "timeout_seconds": self.timeout,
+            }
+        return {**counts, "rate_limit": self.bucket.stats(), "circuit": self.breaker.stats()}
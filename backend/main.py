@@ -1,9 +1,13 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, BackgroundTasks, Depends, HTTPException, Response, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import text
+from sqlalchemy import text, and_, or_, update
 from typing import List
 from datetime import datetime
+import base64
+import hashlib
+import importlib.util
 import json
 import os
 import traceback
@@ -12,24 +16,32 @@ from google.auth.transport import requests as google_requests
 import requests
 import secrets
 
-from database import engine, get_db, Base
+from database import engine, get_db, Base, SessionLocal
 from models import (
     User, UserProfile, University, ShortlistedUniversity,
-    Task, ChatMessage, UserStage, ProfileStrength, TaskStatus
+    Task, ChatMessage, ConversationSummary, Job, JobStatus, UserStage, ProfileStrength, TaskStatus
 )
 from schemas import (
     UserCreate, UserLogin, GoogleLogin, UserResponse, Token,
     ProfileCreate, ProfileUpdate, ProfileResponse,
     UniversityResponse, ShortlistCreate, ShortlistResponse,
-    TaskCreate, TaskUpdate, TaskResponse,
+    TaskCreate, TaskUpdate, TaskResponse, TaskBatchRequest, TaskBatchResult,
     ChatMessageCreate, ChatMessageResponse, ChatRequest, LockUniversity, DashboardResponse
 )
 from auth import (
     get_password_hash, verify_password, create_access_token,
     get_current_active_user
 )
-from ai_counsellor import ai_counsellor
-from external_unis import external_search
+from ai_counsellor import ai_counsellor, CHAT_HISTORY_TURNS
+from action_executor import execute_ai_actions
+from jobs import PermanentJobError, job_queue, job_to_dict
+from task_ingest import ingest_tasks, normalize_task, existing_task_titles, insert_tasks
+from external_unis import external_search, MAX_EDITS
+from requirement_index import requirement_index, TIER_RANGES
+from cache import (
+    recommendation_cache, profile_versions, catalog_version, user_context_cache,
+    invalidate_profile, invalidate_catalog, invalidate_user_context
+)
 
 # Create database tables
 # app = FastAPI
@@ -57,7 +69,13 @@ def health_check(db: Session = Depends(get_db)):
         "timestamp": datetime.now().isoformat(),
         "database": db_status,
         "environment": "production" if os.getenv("DATABASE_URL") else "development",
-        "engine_state": "ready" if external_search.loaded else "initializing"
+        "engine_state": "ready" if external_search.loaded else "initializing",
+        "external_dataset": external_search.info(),
+        "recommendation_cache": recommendation_cache.stats(),
+        "user_context_cache": user_context_cache.stats(),
+        "llm_cache": ai_counsellor.llm_cache.stats() if ai_counsellor and ai_counsellor.llm_cache else None,
+        "llm_client": ai_counsellor.llm_client.stats() if ai_counsellor else None,
+        "jobs": job_queue.stats()
     }
 
 @app.get("/debug/protocol")
@@ -82,42 +100,26 @@ def get_diagnostics():
     }
 
 @app.on_event("startup")
-def startup_event():
-    # Helper to run initialization in background
-    def run_initialization():
-        try:
-            print("🚀 Starting background initialization...")
-            Base.metadata.create_all(bind=engine)
-            
-            # Auto-seed if database is empty
-            try:
-                from seed import seed_universities
-                from database import SessionLocal
-                db = SessionLocal()
-                try:
-                    if db.query(University).count() == 0:
-                        print("🚀 Production DB is empty. Initializing seed...")
-                        seed_universities()
-                    else:
-                        print(f"✅ Database already has {db.query(University).count()} universities.")
-                finally:
-                    db.close()
-            except ImportError:
-                print("⚠️  NOTICE: seed.py not found. Skipping auto-seeding. Make sure to provide university data elsewhere.")
-            except Exception as se:
-                print(f"❌ Error during auto-seeding: {se}")
-            
-            # Loader for global uni data
-            print("🌍 Loading global research engine data...")
-            external_search.load_data()
-            print("✅ Background initialization complete.")
-        except Exception as e:
-            print(f"❌ Background initialization failed: {e}")
-            traceback.print_exc()
-
-    # Start initialization in background so health check passes immediately
-    import threading
-    threading.Thread(target=run_initialization, daemon=True).start()
+async def startup_event():
+    print("🚀 Starting background initialization...")
+    Base.metadata.create_all(bind=engine)
+    # create_all skips indexes on tables that already exist
+    for index in ChatMessage.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+    
+    # Mapping the global university snapshot takes milliseconds; no network involved
+    external_search.load_data()
+    
+    # Seeding (and a dataset refresh, if asked for) run as jobs so health check passes immediately
+    await job_queue.start()
+    job_queue.enqueue("seed_catalog", dedupe=True)
+    if os.getenv("EXTERNAL_UNIS_REFRESH", "0") == "1":
+        job_queue.enqueue("load_external_dataset", {"refresh": True}, dedupe=True)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Unfinished jobs stay in the jobs table and resume on the next start
+    await job_queue.stop()
 
 @app.get("/maintenance/seed")
 def seed_production_data(db: Session = Depends(get_db)):
@@ -135,6 +137,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Job-Id", "X-Total-Count"],
 )
 
 # ==================== AUTH ROUTES ====================
@@ -174,7 +177,6 @@ def signup(user_data: UserCreate, db: Session = Depends(get_db)):
         }
     except Exception as e:
         print(f"SIGNUP ERROR: {str(e)}")
-        import traceback
         traceback.print_exc()
         if isinstance(e, HTTPException):
             raise e
@@ -310,6 +312,24 @@ def get_current_user_info(current_user: User = Depends(get_current_active_user))
 
 # ==================== PROFILE ROUTES ====================
 
+INITIAL_TASKS = [
+    {
+        "title": "Complete English proficiency test",
+        "description": "Take IELTS or TOEFL if not already done",
+        "priority": 5
+    },
+    {
+        "title": "Start SOP draft",
+        "description": "Begin writing your Statement of Purpose",
+        "priority": 4
+    },
+    {
+        "title": "Research universities",
+        "description": "Explore universities that match your profile",
+        "priority": 3
+    }
+]
+
 @app.post("/profile", response_model=ProfileResponse)
 def create_profile(
     profile_data: ProfileCreate,
@@ -364,35 +384,14 @@ def create_profile(
     current_user.onboarding_completed = True
     current_user.current_stage = UserStage.DISCOVERING_UNIVERSITIES
     
+    # Create initial tasks in the same transaction
+    ingest_tasks(db, current_user.id, INITIAL_TASKS)
+    
     db.commit()
     db.refresh(profile)
+    invalidate_profile(current_user.id)
     
-    # Create initial tasks
-    initial_tasks = [
-        Task(
-            user_id=current_user.id,
-            title="Complete English proficiency test",
-            description="Take IELTS or TOEFL if not already done",
-            priority=5
-        ),
-        Task(
-            user_id=current_user.id,
-            title="Start SOP draft",
-            description="Begin writing your Statement of Purpose",
-            priority=4
-        ),
-        Task(
-            user_id=current_user.id,
-            title="Research universities",
-            description="Explore universities that match your profile",
-            priority=3
-        )
-    ]
-    
-    for task in initial_tasks:
-        db.add(task)
-    
-    db.commit()
+    job_queue.enqueue("warm_recommendations", {"user_id": current_user.id}, user_id=current_user.id, dedupe=True, db=db)
     
     return profile
 
@@ -424,6 +423,7 @@ def skip_onboarding(
     current_user.onboarding_completed = True
     current_user.current_stage = UserStage.BUILDING_PROFILE
     db.commit()
+    invalidate_profile(current_user.id)
     return {"status": "success"}
 
 @app.get("/profile", response_model=ProfileResponse)
@@ -474,6 +474,8 @@ def update_profile(
     
     db.commit()
     db.refresh(profile)
+    invalidate_profile(current_user.id)
+    job_queue.enqueue("warm_recommendations", {"user_id": current_user.id}, user_id=current_user.id, dedupe=True, db=db)
     
     return profile
 
@@ -526,11 +528,74 @@ def get_universities(
     universities = query.all()
     return universities
 
+RECOMMENDATION_UNIVERSITY_FIELDS = (
+    "id", "name", "country", "city", "ranking", "programs",
+    "min_gpa", "min_ielts", "min_toefl", "min_gre", "min_gmat",
+    "tuition_fee_min", "tuition_fee_max", "living_cost_yearly",
+    "acceptance_rate", "description", "website"
+)
+
+def _serialize_recommendation(rec: dict) -> dict:
+    # Manually serialize to avoid 500 errors with SQLAlchemy objects
+    uni = rec["university"]
+    return {
+        "fit_score": rec["fit_score"],
+        "category": rec["category"],
+        "risk_level": rec["risk_level"],
+        "reasoning": rec["reasoning"],
+        "university": {field: getattr(uni, field) for field in RECOMMENDATION_UNIVERSITY_FIELDS}
+    }
+
+def _encode_recommendation_cursor(offset: int, user_id: int) -> str:
+    state = {"o": offset, "p": profile_versions.get(user_id), "c": catalog_version.get()}
+    return base64.urlsafe_b64encode(json.dumps(state).encode()).decode()
+
+def _decode_recommendation_cursor(cursor: str, user_id: int) -> int:
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        offset = int(state["o"])
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    if state.get("p") != profile_versions.get(user_id) or state.get("c") != catalog_version.get():
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Recommendations changed since this cursor was issued. Restart from the first page."
+        )
+    return offset
+
+def _stream_recommendations(user_id: int, ranked, preferred_only: bool, chunk_size: int = 100):
+    # Runs after the request session is closed, so it uses its own
+    db = SessionLocal()
+    try:
+        profile = db.query(UserProfile).filter(UserProfile.user_id == user_id).first()
+        for start in range(0, len(ranked), chunk_size):
+            chunk = ai_counsellor.hydrate_recommendations(
+                profile, db, ranked[start:start + chunk_size], preferred_only=preferred_only
+            )
+            for rec in chunk:
+                yield json.dumps(_serialize_recommendation(rec)) + "\n"
+            # Drop hydrated rows so memory stays flat across chunks
+            db.expunge_all()
+    finally:
+        db.close()
+
 @app.get("/universities/recommendations")
 def get_recommendations(
+    response: Response,
+    limit: int = None,
+    cursor: str = None,
+    stream: bool = False,
+    preferred_only: bool = False,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
+    """
+    Ranked university recommendations.
+    
+    With `limit`, results are paginated; the cursor for the next page is returned
+    in the X-Next-Cursor header. With `stream=true`, results are sent as NDJSON
+    (one recommendation per line) as they are serialized.
+    """
     profile = db.query(UserProfile).filter(
         UserProfile.user_id == current_user.id
     ).first()
@@ -541,94 +606,169 @@ def get_recommendations(
             detail="Profile not found. Complete onboarding first."
         )
     
-    # Get universities
-    universities = db.query(University).all()
+    offset = _decode_recommendation_cursor(cursor, current_user.id) if cursor else 0
     
-    # Get recommendations from AI
-    raw_recommendations = ai_counsellor.recommend_universities(profile, universities)
+    # Rank one row past the page to know whether another page exists
+    ranked = ai_counsellor.rank_for_profile(
+        profile, db,
+        limit=None if limit is None else offset + limit + 1,
+        preferred_only=preferred_only
+    )
+    page = ranked[offset:] if limit is None else ranked[offset:offset + limit]
+    if limit is not None and len(ranked) > offset + limit:
+        next_cursor = _encode_recommendation_cursor(offset + limit, current_user.id)
+        response.headers["X-Next-Cursor"] = next_cursor
+    else:
+        next_cursor = None
+    
+    if stream:
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+        return StreamingResponse(
+            _stream_recommendations(current_user.id, page, preferred_only),
+            media_type="application/x-ndjson",
+            headers=headers
+        )
     
-    # Manually serialize to avoid 500 errors with SQLAlchemy objects
-    serialized_recs = []
-    for rec in raw_recommendations:
-        uni = rec["university"]
-        serialized_recs.append({
-            "fit_score": rec["fit_score"],
-            "category": rec["category"],
-            "risk_level": rec["risk_level"],
-            "reasoning": rec["reasoning"],
-            "university": {
-                "id": uni.id,
-                "name": uni.name,
-                "country": uni.country,
-                "city": uni.city,
-                "ranking": uni.ranking,
-                "programs": uni.programs,
-                "min_gpa": uni.min_gpa,
-                "min_ielts": uni.min_ielts,
-                "min_toefl": uni.min_toefl,
-                "min_gre": uni.min_gre,
-                "min_gmat": uni.min_gmat,
-                "tuition_fee_min": uni.tuition_fee_min,
-                "tuition_fee_max": uni.tuition_fee_max,
-                "living_cost_yearly": uni.living_cost_yearly,
-                "acceptance_rate": uni.acceptance_rate,
-                "description": uni.description,
-                "website": uni.website
-            }
-        })
-    
-    return serialized_recs
+    raw_recommendations = ai_counsellor.hydrate_recommendations(
+        profile, db, page, preferred_only=preferred_only
+    )
+    return [_serialize_recommendation(rec) for rec in raw_recommendations]
+
+@app.get("/universities/recommendations/tier")
+def get_tier_recommendations(
+    category: str = None,
+    country: str = None,
+    limit: int = None,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """All safe/target/dream schools for the profile, or the top N in a country"""
+    if category and category not in TIER_RANGES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"category must be one of: {', '.join(TIER_RANGES)}"
+        )
+    
+    profile = db.query(UserProfile).filter(
+        UserProfile.user_id == current_user.id
+    ).first()
+    
+    if not profile:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Profile not found. Complete onboarding first."
+        )
+    
+    raw_recommendations = ai_counsellor.tier_recommendations(
+        profile, db, category=category, country=country, limit=limit
+    )
+    return [_serialize_recommendation(rec) for rec in raw_recommendations]
+
+def _external_search_key(country, name, fuzzy, max_edits) -> str:
+    query = json.dumps([country, name, fuzzy, max_edits if fuzzy else None])
+    return hashlib.sha256(query.encode()).hexdigest()[:12]
+
+def _encode_external_cursor(offset: int, version: str, query_key: str) -> str:
+    state = {"o": offset, "v": version, "q": query_key}
+    return base64.urlsafe_b64encode(json.dumps(state).encode()).decode()
+
+def _decode_external_cursor(cursor: str, query_key: str) -> int:
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        offset = int(state["o"])
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    if state.get("q") != query_key:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor belongs to a different search")
+    if state.get("v") != (external_search.snapshot.version if external_search.loaded else None):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="University dataset changed since this cursor was issued. Restart from the first page."
+        )
+    return offset
 
 @app.get("/external-universities/search")
 def search_global_universities(
+    response: Response,
     country: str = None,
     name: str = None,
     limit: int = 40,
     offset: int = 0,
+    cursor: str = None,
+    fuzzy: bool = False,
+    max_edits: int = MAX_EDITS,
     current_user: User = Depends(get_current_active_user)
 ):
-    """Search global university database (Hipo dataset)"""
-    results = external_search.search(country=country, name=name, limit=limit, offset=offset)
-    return results
+    """Search global university database (Hipo dataset).
+    
+    Every word of `name` must match a word of the university name, the start of
+    one, or (from three letters on) any part of it; best matches come first.
+    With `fuzzy`, words may also be misspelled by up to `max_edits` letters
+    (one for words of up to five letters); exact matches still rank first.
+    
+    X-Total-Count holds the number of results. While more remain, X-Next-Cursor
+    holds a cursor for the next page; pass it as `cursor` instead of `offset`.
+    """
+    if fuzzy and not 0 <= max_edits <= MAX_EDITS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"max_edits must be between 0 and {MAX_EDITS}"
+        )
+    query_key = _external_search_key(country, name, fuzzy, max_edits)
+    if cursor:
+        offset = _decode_external_cursor(cursor, query_key)
+    page = external_search.search_page(
+        country=country, name=name, limit=limit, offset=offset, fuzzy=fuzzy, max_edits=max_edits
+    )
+    response.headers["X-Total-Count"] = str(page["total"])
+    if page["next_offset"] is not None:
+        response.headers["X-Next-Cursor"] = _encode_external_cursor(page["next_offset"], page["version"], query_key)
+    return page["results"]
+
+# AI enrichment of imported universities lives in the optional hipo_import module
+ENRICHMENT_AVAILABLE = importlib.util.find_spec("hipo_import") is not None
 
 @app.post("/universities/import", response_model=UniversityResponse)
 def import_external_university(
     uni_data: dict, # Expecting the Hipo object {name, country, web_pages...}
+    response: Response,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    """Convert an external global university search result into a local record with AI enrichment"""
+    """Convert an external global university search result into a local record with AI enrichment.
+    
+    Enrichment runs as a job (its id is in X-Job-Id) when the hipo_import module is installed.
+    """
     # Check if exists
     name = uni_data.get('name')
     existing = db.query(University).filter(University.name == name).first()
     if existing:
         return existing
     
-    # Enrich with AI
-    from hipo_import import enrich_with_gemini
-    enriched = enrich_with_gemini([uni_data], uni_data.get('country'))
-    
-    if not enriched:
-        # Fallback to basic data if AI fails
-        new_uni = University(
-            name=name,
-            country=uni_data.get('country'),
-            city="Unknown",
-            ranking=1000,
-            programs=json.dumps(["General Studies"]),
-            website=uni_data.get('web_pages', [""])[0] if uni_data.get('web_pages') else ""
-        )
-    else:
-        # Use AI enriched data
-        data = enriched[0]
-        # Add scholarship logic
-        data['scholarship_available'] = True if data.get('ranking', 1000) < 500 else False
-        data['scholarship_details'] = "International merit based scholarships available." if data['scholarship_available'] else None
-        new_uni = University(**data)
+    # Basic record now; AI enrichment fills in the details in the background
+    new_uni = University(
+        name=name,
+        country=uni_data.get('country'),
+        city="Unknown",
+        ranking=1000,
+        programs=json.dumps(["General Studies"]),
+        website=uni_data.get('web_pages', [""])[0] if uni_data.get('web_pages') else ""
+    )
     
     db.add(new_uni)
     db.commit()
     db.refresh(new_uni)
+    invalidate_catalog()
+    requirement_index.add_many([new_uni])
+    
+    if ENRICHMENT_AVAILABLE:
+        job = job_queue.enqueue(
+            "enrich_university",
+            {"university_id": new_uni.id, "source": uni_data},
+            user_id=current_user.id,
+            db=db
+        )
+        response.headers["X-Job-Id"] = str(job.id)
     return new_uni
 
 # ==================== SHORTLIST ROUTES ====================
@@ -663,6 +803,7 @@ def add_to_shortlist(
         current_user.current_stage = UserStage.FINALIZING_UNIVERSITIES
     
     db.commit()
+    invalidate_user_context(current_user.id)
     db.refresh(shortlist)
     
     return shortlist
@@ -679,7 +820,7 @@ def get_shortlist(
     return shortlist
 
 @app.post("/shortlist/lock")
-async def lock_university(
+def lock_university(
     lock_data: LockUniversity,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
@@ -700,42 +841,22 @@ async def lock_university(
         shortlist.locked_at = datetime.utcnow()
         # Update user stage
         current_user.current_stage = UserStage.PREPARING_APPLICATIONS
-        
-        # Generate custom AI tasks for this university
-        try:
-            profile = current_user.profile
-            university = shortlist.university
-            
-            if profile and university:
-                # Generate tasks
-                ai_tasks = await ai_counsellor.generate_application_tasks(
-                    current_user, profile, university, db
-                )
-                
-                # Add tasks to DB
-                for t_data in ai_tasks:
-                    # Check for duplicates by title
-                    existing = db.query(Task).filter(
-                        Task.user_id == current_user.id,
-                        Task.title == t_data["title"]
-                    ).first()
-                    
-                    if not existing:
-                        new_task = Task(
-                            user_id=current_user.id,
-                            title=t_data["title"],
-                            description=t_data.get("description", ""),
-                            priority=t_data.get("priority", 3)
-                        )
-                        db.add(new_task)
-        except Exception as e:
-            print(f"Error generating tasks: {e}")
     else:
         shortlist.locked_at = None
-    
-    db.commit()
-    
-    return {"success": True, "locked": lock_data.lock}
+        db.commit()
+        invalidate_user_context(current_user.id)
+        return {"success": True, "locked": False}
+    
+    # Custom AI tasks for this university are generated after the response; poll /jobs/{id}.
+    # The lock and its job commit together.
+    job = job_queue.enqueue(
+        "generate_application_tasks",
+        {"user_id": current_user.id, "shortlist_id": shortlist.id},
+        user_id=current_user.id,
+        db=db
+    )
+    invalidate_user_context(current_user.id)
+    return {"success": True, "locked": True, "job_id": job.id}
 
 @app.delete("/shortlist/{shortlist_id}")
 def remove_from_shortlist(
@@ -756,6 +877,7 @@ def remove_from_shortlist(
     
     db.delete(shortlist)
     db.commit()
+    invalidate_user_context(current_user.id)
     
     return {"success": True}
 
@@ -789,6 +911,100 @@ def create_task(
     
     return task
 
+TASK_BATCH_MAX_OPERATIONS = 200
+
+@app.post("/tasks/batch", response_model=List[TaskBatchResult])
+def batch_tasks(
+    batch: TaskBatchRequest,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Create, update and delete tasks in one request and one transaction.
+    
+    Operations are checked in order against a single lookup of the tasks they
+    reference; an invalid one gets status "error" and the rest still apply.
+    Creates skip titles the user already has (status "skipped"), like generated
+    tasks. Writes go out as one INSERT, one executemany UPDATE and one DELETE
+    under a single commit; if that fails nothing is saved.
+    """
+    operations = batch.operations
+    if len(operations) > TASK_BATCH_MAX_OPERATIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {TASK_BATCH_MAX_OPERATIONS} operations per batch"
+        )
+    user_id = current_user.id
+    
+    referenced = {op.task_id for op in operations if op.op != "create" and op.task_id is not None}
+    owned = {
+        task.id: task for task in
+        db.query(Task).filter(Task.user_id == user_id, Task.id.in_(referenced))
+    } if referenced else {}
+    new_rows = [
+        normalize_task(op.task.model_dump()) if op.task else None
+        for op in operations if op.op == "create"
+    ]
+    titles = existing_task_titles(db, user_id, (row["title"] for row in new_rows if row))
+    
+    results = []
+    inserts, insert_indexes = [], []
+    changes_by_id = {}
+    deleted = set()
+    creates = iter(new_rows)
+    for index, op in enumerate(operations):
+        result = {"index": index, "op": op.op, "status": "ok", "task_id": op.task_id}
+        results.append(result)
+        if op.op == "create":
+            row = next(creates)
+            if row is None:
+                result.update(status="error", detail="A task with a title is required")
+            elif row["title"] in titles:
+                result.update(status="skipped", detail=f"Task '{row['title']}' already exists")
+            else:
+                titles.add(row["title"])
+                inserts.append(row)
+                insert_indexes.append(index)
+            continue
+        
+        task = owned.get(op.task_id)
+        if task is None or op.task_id in deleted:
+            result.update(status="error", detail="Task not found")
+        elif op.op == "delete":
+            deleted.add(task.id)
+            changes_by_id.pop(task.id, None)
+        else:
+            changes = op.changes.model_dump(exclude_unset=True) if op.changes else {}
+            if not changes:
+                result.update(status="error", detail="No changes given")
+                continue
+            if changes.get("status") == TaskStatus.COMPLETED and not task.completed_at:
+                changes["completed_at"] = datetime.utcnow()
+            changes_by_id.setdefault(task.id, {}).update(changes)
+    
+    try:
+        for index, task_id in zip(insert_indexes, insert_tasks(db, user_id, inserts)):
+            results[index]["task_id"] = task_id
+        if changes_by_id:
+            db.execute(update(Task), [{"id": task_id, **changes} for task_id, changes in changes_by_id.items()])
+        if deleted:
+            db.query(Task).filter(Task.user_id == user_id, Task.id.in_(deleted)).delete(synchronize_session=False)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"TASK BATCH ERROR: {str(e)}")
+        raise HTTPException(status_code=500, detail="Task batch failed; no changes were saved")
+    
+    # Saved state of every created or updated task, in one query
+    touched = {r["task_id"] for r in results if r["status"] == "ok" and r["op"] != "delete"} - deleted
+    saved = {
+        task.id: task for task in db.query(Task).filter(Task.id.in_(touched))
+    } if touched else {}
+    for result in results:
+        if result["op"] != "delete" and result["status"] == "ok":
+            result["task"] = saved.get(result["task_id"])
+    return results
+
 @app.put("/tasks/{task_id}", response_model=TaskResponse)
 def update_task(
     task_id: int,
@@ -842,26 +1058,66 @@ def delete_task(
 
 # ==================== CHAT ROUTES ====================
 
+CHAT_HISTORY_PAGE_SIZE = 50
+CHAT_HISTORY_MAX_PAGE_SIZE = 200
+
+def _latest_messages(db: Session, user_id: int, limit: int, before_id: int = None) -> List[ChatMessage]:
+    """Up to `limit` most recent messages (older than message `before_id`), oldest first"""
+    query = db.query(ChatMessage).filter(ChatMessage.user_id == user_id)
+    if before_id is not None:
+        # Compare against the stored timestamp so the database does both sides of the comparison
+        before_created_at = db.query(ChatMessage.created_at).filter(ChatMessage.id == before_id).scalar_subquery()
+        query = query.filter(or_(
+            ChatMessage.created_at < before_created_at,
+            and_(ChatMessage.created_at == before_created_at, ChatMessage.id < before_id)
+        ))
+    messages = query.order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc()).limit(limit).all()
+    messages.reverse()
+    return messages
+
 @app.get("/chat/history", response_model=List[ChatMessageResponse])
 def get_chat_history(
+    response: Response,
+    before_id: int = None,
+    limit: int = CHAT_HISTORY_PAGE_SIZE,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    messages = db.query(ChatMessage).filter(
-        ChatMessage.user_id == current_user.id
-    ).order_by(ChatMessage.created_at).all()
+    """
+    Most recent chat messages, oldest first.
+    
+    When older messages exist, X-Next-Cursor holds the `before_id` for the previous page.
+    """
+    if not 1 <= limit <= CHAT_HISTORY_MAX_PAGE_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"limit must be between 1 and {CHAT_HISTORY_MAX_PAGE_SIZE}"
+        )
+    
+    if before_id is not None:
+        before = db.query(ChatMessage.id).filter(
+            ChatMessage.id == before_id,
+            ChatMessage.user_id == current_user.id
+        ).first()
+        if not before:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Chat message not found"
+            )
+    
+    # One extra row tells whether an older page exists
+    messages = _latest_messages(db, current_user.id, limit + 1, before_id)
+    if len(messages) > limit:
+        messages = messages[1:]
+        response.headers["X-Next-Cursor"] = str(messages[0].id)
     
     return messages
 
-@app.post("/chat", response_model=dict)
-async def chat_with_ai(
-    chat_data: ChatRequest,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
-):
+def _start_chat_turn(chat_data: ChatRequest, user: User, db: Session):
+    """Validate the user can chat, save their message and return (profile, chat_history, summary)"""
     # Get profile
     profile = db.query(UserProfile).filter(
-        UserProfile.user_id == current_user.id
+        UserProfile.user_id == user.id
     ).first()
     
     if not profile:
@@ -872,201 +1128,279 @@ async def chat_with_ai(
     
     # Save user message
     user_message = ChatMessage(
-        user_id=current_user.id,
+        user_id=user.id,
         role="user",
         content=chat_data.message
     )
     db.add(user_message)
     db.commit()
     
-    # Get chat history
-    history = db.query(ChatMessage).filter(
-        ChatMessage.user_id == current_user.id
-    ).order_by(ChatMessage.created_at).all()
-    
-    chat_history = [{"role": msg.role, "content": msg.content} for msg in history]
-    
-    # Get AI response
-    response = await ai_counsellor.chat(
-        chat_data.message,
-        current_user,
-        profile,
-        chat_history,
-        db
-    )
+    # Only the messages that make it into the prompt
+    history = _latest_messages(db, user.id, CHAT_HISTORY_TURNS)
     
+    chat_history = [{"id": msg.id, "role": msg.role, "content": msg.content} for msg in history]
+    summary = db.query(ConversationSummary).filter(
+        ConversationSummary.user_id == user.id
+    ).first()
+    return profile, chat_history, summary
+
+async def _update_conversation_summary(user_id: int):
+    """Background task: fold older turns into the rolling summary after the reply is sent"""
+    db = SessionLocal()
+    try:
+        # A long backlog is folded oldest first, one chunk per model call
+        while True:
+            plan = ai_counsellor.plan_summary_fold(user_id, db)
+            if plan is None:
+                break
+            # Nothing is held open while the model summarizes
+            db.commit()
+            updated = await ai_counsellor.summarize_fold(plan)
+            if not ai_counsellor.save_summary_fold(user_id, plan, updated, db):
+                # Another turn is folding this conversation
+                break
+    except Exception as e:
+        print(f"Error updating conversation summary: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+async def _finish_chat_turn(response: dict, user: User, db: Session) -> dict:
+    """Save the AI message and execute its actions"""
     # Save AI message
     ai_message = ChatMessage(
-        user_id=current_user.id,
+        user_id=user.id,
         role="assistant",
         content=response["message"]
     )
     db.add(ai_message)
     db.commit()
     
-    # Execute actions if any
+    # Execute actions if any, all in one transaction
     if response.get("actions"):
-        action_results = []
-        for action in response["actions"]:
-            result = await execute_ai_action(action, current_user, db)
-            if result:
-                action_results.append(result)
-        
-        if action_results:
-            response["action_results"] = action_results
+        response["action_results"] = execute_ai_actions(response["actions"], user, db)
+    
+    return response
+
+@app.post("/chat", response_model=dict)
+async def chat_with_ai(
+    chat_data: ChatRequest,
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    user_id = current_user.id
+    profile, chat_history, summary = _start_chat_turn(chat_data, current_user, db)
+    conversation = ai_counsellor.build_conversation(
+        chat_data.message, current_user, profile, chat_history, db, summary
+    )
+    # End the transaction so the pooled connection is free while the model runs
+    db.commit()
+    
+    # Get AI response
+    response = await ai_counsellor.chat(
+        chat_data.message,
+        current_user,
+        profile,
+        conversation,
+        bypass_cache=chat_data.bypass_cache
+    )
     
+    response = await _finish_chat_turn(response, current_user, db)
+    background_tasks.add_task(_update_conversation_summary, user_id)
     return response
 
-async def execute_ai_action(action: dict, user: User, db: Session):
-    """Execute actions requested by AI"""
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@app.post("/chat/stream")
+async def chat_with_ai_stream(
+    chat_data: ChatRequest,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Server-sent events version of /chat.
+    
+    Emits `token` events ({"text": ...}) as the reply is generated, with action
+    lines hidden, then one `done` event carrying the same payload as /chat once
+    actions have run and the message is saved.
+    """
+    _, chat_history, summary = _start_chat_turn(chat_data, current_user, db)
+    user_id = current_user.id
+    # Give the request session's connection back now rather than holding it for the whole stream
+    db.close()
+    
+    async def events():
+        # The request session is closed once the response starts, so the stream uses its own
+        stream_db = SessionLocal()
+        try:
+            user = stream_db.query(User).filter(User.id == user_id).first()
+            profile = stream_db.query(UserProfile).filter(UserProfile.user_id == user_id).first()
+            conversation = ai_counsellor.build_conversation(
+                chat_data.message, user, profile, chat_history, stream_db, summary
+            )
+            # End the transaction so the pooled connection is free while the model runs
+            stream_db.commit()
+            response = None
+            async for kind, payload in ai_counsellor.chat_stream(
+                chat_data.message, user, profile, conversation,
+                bypass_cache=chat_data.bypass_cache
+            ):
+                if kind == "token":
+                    yield _sse("token", {"text": payload})
+                else:
+                    response = payload
+            
+            response = await _finish_chat_turn(response, user, stream_db)
+            yield _sse("done", response)
+        finally:
+            stream_db.close()
+        # The client already has its reply; summarize older turns before closing the stream
+        await _update_conversation_summary(user_id)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# ==================== JOB ROUTES ====================
+
+JOB_WAIT_MAX_SECONDS = 30
+
+@app.get("/jobs/{job_id}")
+async def get_job(
+    job_id: int,
+    wait: float = 0,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Status of a background job started by one of your requests.
+    
+    With `wait`, holds the request for up to that many seconds (at most 30)
+    until the job has succeeded or failed, so clients can long-poll.
+    """
+    job = db.query(Job).filter(Job.id == job_id, Job.user_id == current_user.id).first()
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    if wait > 0 and job.status in (JobStatus.PENDING, JobStatus.RUNNING):
+        db.commit()  # don't hold a connection while waiting
+        await job_queue.wait(job_id, min(wait, JOB_WAIT_MAX_SECONDS))
+        db.refresh(job)
+    return job_to_dict(job)
+
+@job_queue.handler("generate_application_tasks")
+async def generate_application_tasks_job(payload: dict) -> dict:
+    db = SessionLocal()
     try:
-        action_name = action.get("action")
-        params = action.get("params", {})
+        shortlist = db.query(ShortlistedUniversity).filter(
+            ShortlistedUniversity.id == payload["shortlist_id"],
+            ShortlistedUniversity.user_id == payload["user_id"]
+        ).first()
+        if not shortlist or not shortlist.is_locked:
+            return {"tasks_created": 0, "skipped": "University is no longer locked"}
+        user = shortlist.user
+        profile = user.profile
+        university = shortlist.university
+        if not profile or not university:
+            return {"tasks_created": 0, "skipped": "Missing profile or university"}
         
-        if action_name == "SEARCH_UNIVERSITIES":
-            # Extract filters
-            country = params.get("country")
-            max_pricing = params.get("max_pricing")
-            min_ranking = params.get("min_ranking")
-            scholarship_only = params.get("scholarship_only", False)
-            
-            # Perform DB search
-            query = db.query(University)
-            if country:
-                query = query.filter(University.country.ilike(f"%{country}%"))
-            if max_pricing:
-                query = query.filter(University.tuition_fee_min <= max_pricing)
-            if min_ranking:
-                query = query.filter(University.ranking >= min_ranking)
-            if scholarship_only:
-                query = query.filter(University.scholarship_available == True)
-            
-            universities = query.limit(5).all()
-            
-            # Format results for the frontend
-            results = []
-            for uni in universities:
-                results.append({
-                    "id": uni.id,
-                    "name": uni.name,
-                    "country": uni.country,
-                    "ranking": uni.ranking,
-                    "tuition": uni.tuition_fee_min,
-                    "scholarship": uni.scholarship_available
-                })
-            
-            return {"type": "UNIVERSITY_SEARCH", "results": results}
-            
-        elif action_name == "CREATE_TASK":
-            priority = params.get("priority", 3)
-            # Ensure priority is an integer
-            if isinstance(priority, str):
-                try:
-                    priority = int(priority)
-                except:
-                    priority = 3
-            
-            task = Task(
-                user_id=user.id,
-                title=params.get("title", "New Task"),
-                description=params.get("description", ""),
-                priority=priority
-            )
-            db.add(task)
-            db.commit()
+        # Their columns are loaded; close so no connection is held while the model runs
+        db.close()
+        ai_tasks = await ai_counsellor.generate_application_tasks(user, profile, university)
         
-        elif action_name == "UPDATE_STAGE":
-            stage = params.get("stage")
-            if stage in [s.value for s in UserStage]:
-                user.current_stage = UserStage(stage)
-                db.commit()
-
-        elif action_name == "SHORTLIST_UNIVERSITY":
-            uni_id = params.get("university_id")
-            if uni_id:
-                # Ensure uni_id is an integer
-                if isinstance(uni_id, str):
-                    try:
-                        uni_id = int(uni_id)
-                    except:
-                        return
-
-                # Check if exists
-                existing = db.query(ShortlistedUniversity).filter(
-                    ShortlistedUniversity.user_id == user.id,
-                    ShortlistedUniversity.university_id == uni_id
-                ).first()
-                if not existing:
-                    shortlist = ShortlistedUniversity(
-                        user_id=user.id,
-                        university_id=uni_id,
-                        category=params.get("category", "target"),
-                        fit_score=params.get("fit_score", 70),
-                        risk_level=params.get("risk_level", "Medium"),
-                        ai_reasoning=params.get("reasoning", "Recommended by AI Counsellor")
-                    )
-                    db.add(shortlist)
-                    # Update stage if needed
-                    if user.current_stage == UserStage.DISCOVERING_UNIVERSITIES:
-                        user.current_stage = UserStage.FINALIZING_UNIVERSITIES
-                    db.commit()
-
-        elif action_name == "LOCK_UNIVERSITY":
-            uni_id = params.get("university_id")
-            if uni_id:
-                # Ensure uni_id is an integer
-                if isinstance(uni_id, str):
-                    try:
-                        uni_id = int(uni_id)
-                    except:
-                        return
-                        
-                shortlist = db.query(ShortlistedUniversity).filter(
-                    ShortlistedUniversity.user_id == user.id,
-                    ShortlistedUniversity.university_id == uni_id
-                ).first()
-                if shortlist:
-                    shortlist.is_locked = True
-                    shortlist.locked_at = datetime.utcnow()
-                    user.current_stage = UserStage.PREPARING_APPLICATIONS
-                    db.commit()
-
-        elif action_name == "UPDATE_PROFILE":
-            profile = db.query(UserProfile).filter(UserProfile.user_id == user.id).first()
-            if profile:
-                for field, value in params.items():
-                    if hasattr(profile, field):
-                        setattr(profile, field, value)
-                
-                # Recalculate strengths if GPA change
-                if "gpa" in params:
-                    gpa = params["gpa"]
-                    if gpa >= 3.5:
-                        profile.academic_strength = ProfileStrength.STRONG
-                    elif gpa >= 3.0:
-                        profile.academic_strength = ProfileStrength.AVERAGE
-                    else:
-                        profile.academic_strength = ProfileStrength.WEAK
-                
-                db.commit()
-                return {"type": "PROFILE_UPDATE", "fields": list(params.keys())}
-
-        elif action_name == "DELETE_TASK":
-            task_id = params.get("task_id")
-            if task_id:
-                # Ensure task_id is an integer
-                if isinstance(task_id, str):
-                    try:
-                        task_id = int(task_id)
-                    except:
-                        return
-                task = db.query(Task).filter(Task.id == task_id, Task.user_id == user.id).first()
-                if task:
-                    db.delete(task)
-                    db.commit()
-    except Exception as e:
-        print(f"Error executing AI action {action}: {e}")
-        db.rollback()
+        # Skip titles the user already has; one lookup and one insert
+        created = ingest_tasks(db, payload["user_id"], ai_tasks)
+        db.commit()
+        return {"tasks_created": len(created)}
+    finally:
+        db.close()
+
+@job_queue.handler("enrich_university")
+def enrich_university_job(payload: dict) -> dict:
+    try:
+        from hipo_import import enrich_with_gemini
+    except ImportError as e:
+        # Jobs queued before the module went missing; another attempt would fail the same way
+        raise PermanentJobError(f"University enrichment is not available: {e}")
+    source = payload["source"]
+    enriched = enrich_with_gemini([source], source.get('country'))
+    if not enriched:
+        return {"enriched": False}
+    
+    db = SessionLocal()
+    try:
+        uni = db.query(University).filter(University.id == payload["university_id"]).first()
+        if not uni:
+            return {"enriched": False}
+        data = enriched[0]
+        # Add scholarship logic
+        data['scholarship_available'] = True if data.get('ranking', 1000) < 500 else False
+        data['scholarship_details'] = "International merit based scholarships available." if data['scholarship_available'] else None
+        for field, value in data.items():
+            if field != "id" and hasattr(uni, field):
+                setattr(uni, field, value)
+        db.commit()
+    finally:
+        db.close()
+    invalidate_catalog()
+    # Requirement columns may have changed; rebuilt on the next recommendation request
+    requirement_index.invalidate()
+    return {"enriched": True}
+
+@job_queue.handler("warm_recommendations")
+def warm_recommendations_job(payload: dict) -> dict:
+    db = SessionLocal()
+    try:
+        profile = db.query(UserProfile).filter(UserProfile.user_id == payload["user_id"]).first()
+        if not profile:
+            return {"warmed": 0}
+        ranked = ai_counsellor.rank_for_profile(profile, db)
+        return {"warmed": len(ranked)}
+    finally:
+        db.close()
+
+@job_queue.handler("seed_catalog")
+def seed_catalog_job(payload: dict) -> dict:
+    from seed import seed_universities
+    db = SessionLocal()
+    try:
+        count = db.query(University).count()
+    finally:
+        db.close()
+    if count == 0:
+        print("🚀 Production DB is empty. Initializing seed...")
+        seed_universities()
+    else:
+        print(f"✅ Database already has {count} universities.")
+    job_queue.enqueue("warm_requirement_index", dedupe=True)
+    return {"seeded": count == 0}
+
+@job_queue.handler("warm_requirement_index")
+def warm_requirement_index_job(payload: dict) -> dict:
+    db = SessionLocal()
+    try:
+        requirement_index.ensure_loaded(db)
+    finally:
+        db.close()
+    return {"universities": len(requirement_index)}
+
+@job_queue.handler("load_external_dataset")
+def load_external_dataset_job(payload: dict) -> dict:
+    # Loader for global uni data; {"refresh": true} downloads it and rebuilds the snapshot
+    print("🌍 Loading global research engine data...")
+    refresh = bool(payload.get("refresh"))
+    previous = external_search.snapshot
+    external_search.load_data(refresh=refresh)
+    if not external_search.loaded or (refresh and external_search.snapshot is previous):
+        raise RuntimeError("Global university dataset did not load")
+    print("✅ Global research engine ready.")
+    return external_search.info()
 
 # ==================== DASHBOARD ROUTE ====================
 
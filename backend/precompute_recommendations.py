@@ -0,0 +1,188 @@
+"""
+Precompute ranked recommendations for every user into `materialized_recommendations`.
+
+Run nightly and after catalog changes:
+    python precompute_recommendations.py --workers 4
+    python precompute_recommendations.py --resume          # continue an interrupted run
+    python precompute_recommendations.py --benchmark 1,2,4  # profiles/sec per worker count, no writes
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+
+from database import SessionLocal, engine
+from fit_scoring import UniversityCatalog, profile_signature, score_catalog, top_k_indices
+from models import Base, MaterializedRecommendation, University, UserProfile
+from recommendation_planner import SCORING_COLUMNS, catalog_signature
+
+DEFAULT_CHECKPOINT = ".recommendations_checkpoint.json"
+
+# Catalog columns, set once per worker process by _init_worker
+_catalog = None
+
+
+def _init_worker(ids, min_gpa, min_ielts, total_cost):
+    global _catalog
+    _catalog = UniversityCatalog(ids, min_gpa, min_ielts, total_cost)
+
+
+def _score_chunk(profiles, top_k):
+    """Rank the catalog for each (profile_id, user_id, gpa, ielts_score, budget_max) tuple"""
+    results = []
+    skipped = 0
+    for profile_id, user_id, gpa, ielts_score, budget_max in profiles:
+        profile = SimpleNamespace(gpa=gpa, ielts_score=ielts_score, budget_max=budget_max)
+        try:
+            scores = score_catalog(profile, _catalog)
+        except TypeError:
+            # Non-numeric profile values; the API scores these row by row on demand
+            skipped += 1
+            continue
+        order = top_k_indices(scores, top_k)
+        results.append((user_id, profile_signature(profile), _catalog.ids[order], scores[order]))
+    return results, skipped
+
+
+def _load_catalog_columns(db):
+    rows = db.query(*SCORING_COLUMNS).order_by(University.id).all()
+    catalog = UniversityCatalog.from_rows(rows)
+    return catalog.ids, catalog.min_gpa, catalog.min_ielts, catalog.total_cost
+
+
+def _profile_chunks(db, after_id, chunk_size):
+    """Stream profiles in id order without loading the table at once"""
+    while True:
+        rows = (
+            db.query(
+                UserProfile.id, UserProfile.user_id, UserProfile.gpa,
+                UserProfile.ielts_score, UserProfile.budget_max
+            )
+            .filter(UserProfile.id > after_id)
+            .order_by(UserProfile.id)
+            .limit(chunk_size)
+            .all()
+        )
+        if not rows:
+            return
+        yield [tuple(r) for r in rows]
+        after_id = rows[-1][0]
+
+
+def _write_results(db, results, catalog_sig):
+    user_ids = [user_id for user_id, _, _, _ in results]
+    if not user_ids:
+        return
+    db.query(MaterializedRecommendation).filter(
+        MaterializedRecommendation.user_id.in_(user_ids)
+    ).delete(synchronize_session=False)
+    db.bulk_insert_mappings(MaterializedRecommendation, [
+        {
+            "user_id": user_id,
+            "university_id": uni_id,
+            "rank": rank,
+            "fit_score": score,
+            "profile_signature": signature,
+            "catalog_signature": catalog_sig,
+        }
+        for user_id, signature, ids, scores in results
+        for rank, (uni_id, score) in enumerate(zip(ids.tolist(), scores.tolist()))
+    ])
+
+
+def _read_checkpoint(path, catalog_sig):
+    if not os.path.exists(path):
+        return 0
+    with open(path) as f:
+        state = json.load(f)
+    if state.get("catalog_signature") != catalog_sig:
+        print("Catalog changed since the checkpoint was written. Starting over.")
+        return 0
+    return state.get("last_profile_id", 0)
+
+
+def _write_checkpoint(path, catalog_sig, last_profile_id):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"catalog_signature": catalog_sig, "last_profile_id": last_profile_id}, f)
+    os.replace(tmp, path)
+
+
+def run(workers, chunk_size, top_k, checkpoint, resume, write=True):
+    """Score every profile; returns (profiles scored, seconds)"""
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        catalog_sig = catalog_signature(db)
+        columns = _load_catalog_columns(db)
+        after_id = _read_checkpoint(checkpoint, catalog_sig) if resume else 0
+        total = db.query(UserProfile).filter(UserProfile.id > after_id).count()
+        if after_id:
+            print(f"Resuming after profile {after_id}")
+
+        done = skipped = 0
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=columns) as pool:
+            in_flight = []
+            chunks = _profile_chunks(db, after_id, chunk_size)
+            # Keep a couple of chunks queued per worker so no process idles
+            for chunk in chunks:
+                in_flight.append((chunk[-1][0], len(chunk), pool.submit(_score_chunk, chunk, top_k)))
+                if len(in_flight) < workers * 2:
+                    continue
+                done, skipped = _drain(db, in_flight.pop(0), catalog_sig, checkpoint, write, done, skipped, total, start)
+            while in_flight:
+                done, skipped = _drain(db, in_flight.pop(0), catalog_sig, checkpoint, write, done, skipped, total, start)
+
+        elapsed = time.perf_counter() - start
+        if skipped:
+            print(f"Skipped {skipped} profiles with non-numeric scoring fields.")
+        if write and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        return done, elapsed
+    finally:
+        db.close()
+
+
+def _drain(db, entry, catalog_sig, checkpoint, write, done, skipped, total, start):
+    last_profile_id, size, future = entry
+    results, chunk_skipped = future.result()
+    if write:
+        _write_results(db, results, catalog_sig)
+        db.commit()
+        _write_checkpoint(checkpoint, catalog_sig, last_profile_id)
+    done += size
+    elapsed = time.perf_counter() - start
+    print(f"  {done}/{total} profiles ({done / elapsed:,.0f} profiles/sec)")
+    return done, skipped + chunk_skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--top-k", type=int, default=100, help="recommendations stored per user")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT)
+    parser.add_argument("--resume", action="store_true", help="continue after the last checkpointed profile")
+    parser.add_argument("--benchmark", help="comma-separated worker counts to time without writing")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        timings = []
+        for workers in [int(w) for w in args.benchmark.split(",")]:
+            print(f"Benchmarking {workers} workers...")
+            timings.append((workers, *run(workers, args.chunk_size, args.top_k, args.checkpoint, resume=False, write=False)))
+        print(f"{'workers':>8} {'profiles':>10} {'seconds':>9} {'profiles/sec':>13}")
+        for workers, done, elapsed in timings:
+            print(f"{workers:>8} {done:>10,} {elapsed:>9.2f} {done / elapsed if elapsed else 0:>13,.0f}")
+        return
+
+    done, elapsed = run(args.workers, args.chunk_size, args.top_k, args.checkpoint, args.resume)
+    print(f"✅ Precomputed recommendations for {done} profiles in {elapsed:.1f}s "
+          f"({done / elapsed if elapsed else 0:,.0f} profiles/sec, {args.workers} workers)")
+
+
+if __name__ == "__main__":
+    main()
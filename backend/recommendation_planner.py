@@ -0,0 +1,174 @@
+import json
+import os
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import BigInteger, cast, func, or_
+from sqlalchemy.orm import Session
+
+from cache import catalog_version
+from fit_scoring import UniversityCatalog, RankedUniversities, profile_signature, top_k_indices
+from models import MaterializedRecommendation, University, UserProfile
+
+# Only the columns fit scoring reads; description/programs stay in the database
+SCORING_COLUMNS = (
+    University.id,
+    University.min_gpa,
+    University.min_ielts,
+    University.tuition_fee_max,
+    University.living_cost_yearly,
+)
+
+# Above this many ids, one filtered scan beats a long IN (...) list
+MAX_IN_CLAUSE = 1000
+# Seconds a catalog signature is reused for checking precomputed rankings. invalidate_catalog()
+# in this process takes effect at once; edits made by other processes within this long.
+CATALOG_SIGNATURE_TTL = float(os.getenv("CATALOG_SIGNATURE_TTL", "30"))
+
+
+def parse_preferred_countries(value: Optional[str]) -> List[str]:
+    """Preferred countries are stored either as a JSON list or as free text ("USA, UK")"""
+    if not value:
+        return []
+    try:
+        parsed = json.loads(value)
+        items = parsed if isinstance(parsed, list) else [parsed]
+    except (ValueError, TypeError):
+        items = value.split(",")
+    return [str(c).strip() for c in items if str(c).strip()]
+
+
+def catalog_signature(db: Session) -> str:
+    """Fingerprint of the catalog as fit scoring sees it: "count:max_id:checksum".
+
+    The checksum sums id * value (to hundredths, as integers so the result does
+    not depend on row order) for each scoring column, so it changes when
+    universities are added or removed and when their scoring columns are edited.
+    """
+    checksums = [
+        func.sum(University.id * cast(func.round(func.coalesce(column, -1) * 100), BigInteger))
+        for column in SCORING_COLUMNS[1:]
+    ]
+    count, max_id, *sums = db.query(func.count(University.id), func.max(University.id), *checksums).one()
+    return f"{count}:{max_id or 0}:" + "-".join(str(int(s or 0)) for s in sums)
+
+
+_signature_memo = (None, 0.0, None)  # (catalog version, computed at, signature)
+
+
+def current_catalog_signature(db: Session) -> str:
+    """catalog_signature(), reused until the catalog version changes or CATALOG_SIGNATURE_TTL passes"""
+    global _signature_memo
+    version = catalog_version.get()
+    memo_version, computed_at, signature = _signature_memo
+    if memo_version == version and time.monotonic() - computed_at < CATALOG_SIGNATURE_TTL:
+        return signature
+    signature = catalog_signature(db)
+    _signature_memo = (version, time.monotonic(), signature)
+    return signature
+
+
+def materialized_ranking(
+    db: Session,
+    profile: UserProfile,
+    limit: Optional[int] = None
+) -> Optional[RankedUniversities]:
+    """Ranking precomputed by precompute_recommendations.py, if it is still current and long enough"""
+    mine = db.query(MaterializedRecommendation).filter(MaterializedRecommendation.user_id == profile.user_id)
+    # Every row of a user's ranking carries the same signatures; the best one is enough to check
+    head = mine.with_entities(
+        MaterializedRecommendation.profile_signature,
+        MaterializedRecommendation.catalog_signature,
+    ).order_by(MaterializedRecommendation.rank).first()
+    if head is None or head.profile_signature != profile_signature(profile):
+        return None
+    catalog = current_catalog_signature(db)
+    if head.catalog_signature != catalog:
+        return None
+
+    query = mine.with_entities(
+        MaterializedRecommendation.university_id,
+        MaterializedRecommendation.fit_score,
+    ).order_by(MaterializedRecommendation.rank)
+    if limit is not None:
+        query = query.limit(limit)
+    rows = query.all()
+    # Top-K rows answer any shorter request; a full request needs the whole catalog
+    catalog_size = int(catalog.split(":")[0])
+    if len(rows) < catalog_size and (limit is None or len(rows) < limit):
+        return None
+    return RankedUniversities(
+        np.array([r.university_id for r in rows], dtype=np.int64),
+        np.array([r.fit_score for r in rows], dtype=np.float64)
+    )
+
+
+class RecommendationPlan:
+    """Turns a profile's hard limits into SQL so only plausible rows are scored.
+
+    - `preferred_only` restricts the catalog to the profile's preferred countries.
+    - Rows costing more than 1.2x the budget lose 20 points, so they are left out
+      of the first pass and only fetched when they could still reach the top K.
+    """
+
+    def __init__(self, profile: UserProfile, preferred_only: bool = False):
+        self.profile = profile
+        self.countries = parse_preferred_countries(profile.preferred_countries) if preferred_only else []
+        budget = profile.budget_max
+        self.budget_cap = budget * 1.2 if isinstance(budget, (int, float)) and budget else None
+
+    def _filtered(self, query):
+        if self.countries:
+            query = query.filter(or_(*[University.country.ilike(f"%{c}%") for c in self.countries]))
+        return query
+
+    def _within_budget_band(self):
+        total_cost = func.coalesce(University.tuition_fee_max, 0) + func.coalesce(University.living_cost_yearly, 0)
+        return or_(total_cost <= 0, total_cost <= self.budget_cap)
+
+    def _load_catalog(self, db: Session, band=None) -> UniversityCatalog:
+        query = self._filtered(db.query(*SCORING_COLUMNS))
+        if band is not None:
+            query = query.filter(band)
+        rows = query.order_by(University.id).all()
+        return UniversityCatalog.from_rows(rows, universities=rows)
+
+    def _over_budget_ceiling(self) -> float:
+        """Best score a row outside the budget band can still reach"""
+        ceiling = 50 - 20
+        if self.profile.gpa is not None:
+            ceiling += 20
+        if self.profile.ielts_score is not None:
+            ceiling += 15
+        return max(0.0, min(100.0, float(ceiling)))
+
+    def rank(
+        self,
+        db: Session,
+        score: Callable[[UniversityCatalog], np.ndarray],
+        limit: Optional[int] = None
+    ) -> RankedUniversities:
+        """Rank the catalog in id order with `score`, pruning over-budget rows when it is safe"""
+        if limit is not None and self.budget_cap is not None:
+            catalog = self._load_catalog(db, band=self._within_budget_band())
+            scores = score(catalog)
+            order = top_k_indices(scores, limit)
+            # Strictly better than anything outside the band: pruned rows cannot place
+            if len(order) == limit and scores[order[-1]] > self._over_budget_ceiling():
+                return RankedUniversities(catalog.ids[order], scores[order])
+
+        catalog = self._load_catalog(db)
+        scores = score(catalog)
+        order = top_k_indices(scores, limit)
+        return RankedUniversities(catalog.ids[order], scores[order])
+
+    def fetch_universities(self, db: Session, ids: List[int]) -> Dict[int, University]:
+        """Full University rows for the final results only"""
+        if not ids:
+            return {}
+        if len(ids) > MAX_IN_CLAUSE:
+            universities = self._filtered(db.query(University)).all()
+        else:
+            universities = db.query(University).filter(University.id.in_(ids)).all()
+        return {u.id: u for u in universities}
@@ -0,0 +1,246 @@
+import threading
+from bisect import bisect_right
+from collections import defaultdict
+from itertools import product
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from models import University, UserProfile
+from recommendation_planner import SCORING_COLUMNS
+
+# Score ranges [low, high) per category, matching AICounsellor._categorize
+TIER_RANGES = {
+    "safe": (80.0, float("inf")),
+    "target": (60.0, 80.0),
+    "dream": (float("-inf"), 60.0),
+}
+
+
+class _SortedColumn:
+    """One requirement column kept sorted by value; rows without a value are kept aside"""
+
+    def __init__(self):
+        self.values: List[float] = []
+        self.ids: List[int] = []
+        self.unknown: List[int] = []
+
+    def add(self, value: Optional[float], uni_id: int) -> None:
+        if value is None:
+            self.unknown.append(uni_id)
+            return
+        pos = bisect_right(self.values, value)
+        self.values.insert(pos, value)
+        self.ids.insert(pos, uni_id)
+
+
+class _Band:
+    """Rows whose requirement falls in one band, as (list, start, stop) slices of sorted columns"""
+
+    def __init__(self, *segments):
+        self.segments = segments
+
+    def __len__(self) -> int:
+        return sum(stop - start for _, start, stop in self.segments)
+
+    def __iter__(self):
+        for ids, start, stop in self.segments:
+            yield from ids[start:stop]
+
+
+class RequirementIndex:
+    """In-memory index of universities sorted by min_gpa, min_ielts and total cost.
+
+    Fit scores only depend on which band each requirement falls into, so for a
+    profile the band boundaries are found by bisection and whole bands are
+    combined instead of scoring every row.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.loaded = False
+        self._reset()
+
+    def _reset(self):
+        self._gpa = _SortedColumn()
+        self._ielts = _SortedColumn()
+        self._cost = _SortedColumn()  # only rows with total_cost > 0
+        self._free: List[int] = []  # total_cost == 0, never affects the score
+        self._rows = {}  # id -> (min_gpa, min_ielts, total_cost)
+        self._by_country = defaultdict(list)
+
+    def rebuild(self, db: Session) -> None:
+        rows = db.query(*SCORING_COLUMNS, University.country).order_by(University.id).all()
+        with self._lock:
+            self._reset()
+            for row in rows:
+                self._add_row(row.id, row.min_gpa, row.min_ielts, row.tuition_fee_max, row.living_cost_yearly, row.country)
+            self.loaded = True
+
+    def ensure_loaded(self, db: Session) -> None:
+        if not self.loaded:
+            self.rebuild(db)
+
+    def invalidate(self) -> None:
+        """Rebuild from the database on next use, e.g. after requirement columns change"""
+        with self._lock:
+            self.loaded = False
+
+    def add_many(self, universities: Iterable[University]) -> None:
+        """Insert new universities without a rebuild; a no-op until the index is first loaded"""
+        with self._lock:
+            if not self.loaded:
+                return
+            for u in universities:
+                if u.id not in self._rows:
+                    self._add_row(u.id, u.min_gpa, u.min_ielts, u.tuition_fee_max, u.living_cost_yearly, u.country)
+
+    def _add_row(self, uni_id, min_gpa, min_ielts, tuition_fee_max, living_cost_yearly, country) -> None:
+        # Same `or 0` semantics as `_calculate_fit_score`
+        total_cost = (tuition_fee_max or 0) + (living_cost_yearly or 0)
+        self._rows[uni_id] = (min_gpa, min_ielts, total_cost)
+        self._gpa.add(min_gpa, uni_id)
+        self._ielts.add(min_ielts, uni_id)
+        if total_cost > 0:
+            self._cost.add(total_cost, uni_id)
+        else:
+            self._free.append(uni_id)
+        self._by_country[(country or "").lower().strip()].append(uni_id)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    # ---- banding ----
+
+    @staticmethod
+    def _requirement_bands(column: _SortedColumn, value, bonus: float, met: float, miss: float):
+        """[(points, band)] for a `value >= min + 0.5 / >= min / below` requirement"""
+        if value is None:
+            return [(0.0, _Band((column.ids, 0, len(column.ids)), (column.unknown, 0, len(column.unknown))))]
+        # `value >= m + 0.5` is monotonic in m, so both boundaries bisect the sorted column
+        strong = bisect_right(column.values, value, key=lambda m: m + 0.5)
+        meets = bisect_right(column.values, value)
+        return [
+            (bonus, _Band((column.ids, 0, strong))),
+            (met, _Band((column.ids, strong, meets))),
+            (miss, _Band((column.ids, meets, len(column.ids)))),
+            (0.0, _Band((column.unknown, 0, len(column.unknown)))),
+        ]
+
+    def _budget_bands(self, budget):
+        cost, free = self._cost.ids, self._free
+        if not budget:
+            return [(0.0, _Band((cost, 0, len(cost)), (free, 0, len(free))))]
+        within = bisect_right(self._cost.values, budget)
+        tolerated = bisect_right(self._cost.values, budget * 1.2)
+        return [
+            (15.0, _Band((cost, 0, within))),
+            (5.0, _Band((cost, within, tolerated))),
+            (-20.0, _Band((cost, tolerated, len(cost)))),
+            (0.0, _Band((free, 0, len(free)))),
+        ]
+
+    def _score_row(self, profile: UserProfile, uni_id: int) -> float:
+        min_gpa, min_ielts, total_cost = self._rows[uni_id]
+        score = 50
+        if profile.gpa is not None and min_gpa is not None:
+            score += 20 if profile.gpa >= min_gpa + 0.5 else 10 if profile.gpa >= min_gpa else -20
+        if profile.ielts_score is not None and min_ielts is not None:
+            score += 15 if profile.ielts_score >= min_ielts + 0.5 else 7 if profile.ielts_score >= min_ielts else -15
+        if profile.budget_max and total_cost > 0:
+            budget = profile.budget_max
+            score += 15 if total_cost <= budget else 5 if total_cost <= budget * 1.2 else -20
+        return max(0.0, min(100.0, float(score)))
+
+    def query(
+        self,
+        profile: UserProfile,
+        category: Optional[str] = None,
+        country: Optional[str] = None,
+        limit: Optional[int] = None
+    ) -> List[Tuple[int, float]]:
+        """(university id, fit score) pairs, best first, optionally restricted to a tier and/or country.
+
+        Raises TypeError when profile values are not numeric.
+        """
+        for value in (profile.gpa, profile.ielts_score, profile.budget_max):
+            if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))):
+                raise TypeError(f"Expected a number, got {type(value).__name__}")
+
+        low, high = TIER_RANGES[category] if category else (float("-inf"), float("inf"))
+        with self._lock:
+            country_ids = None
+            if country:
+                country_ids = self._by_country.get(country.lower().strip(), [])
+
+            dimensions = [
+                self._requirement_bands(self._gpa, profile.gpa, 20.0, 10.0, -20.0),
+                self._requirement_bands(self._ielts, profile.ielts_score, 15.0, 7.0, -15.0),
+                self._budget_bands(profile.budget_max),
+            ]
+            if limit is not None:
+                return self._top(profile, dimensions, low, high, country_ids, limit)
+
+            if category is None:
+                candidates = country_ids if country_ids is not None else list(self._rows)
+            else:
+                candidates = []
+                for combo in product(*dimensions):
+                    score = max(0.0, min(100.0, 50.0 + sum(points for points, _ in combo)))
+                    if not (low <= score < high):
+                        continue
+                    # Walk the narrowest band of the combination; others are checked per row
+                    narrowest = min((band for _, band in combo), key=len)
+                    if country_ids is not None and len(country_ids) < len(narrowest):
+                        narrowest = country_ids
+                    candidates.extend(narrowest)
+                candidates = set(candidates)
+                if country_ids is not None:
+                    candidates &= set(country_ids)
+
+            scored = []
+            for uni_id in candidates:
+                score = self._score_row(profile, uni_id)
+                if low <= score < high:
+                    scored.append((uni_id, score))
+
+        return sorted(scored, key=lambda pair: (-pair[1], pair[0]))
+
+    def _top(self, profile: UserProfile, dimensions, low, high, country_ids, limit) -> List[Tuple[int, float]]:
+        """The best `limit` rows, walking band combinations from the highest score down.
+
+        Every row falls in exactly one band per dimension, so a combination fixes
+        the score of its rows; once a whole score level brings the total to
+        `limit`, lower levels are never looked at.
+        """
+        by_score = defaultdict(list)
+        for combo in product(*dimensions):
+            score = max(0.0, min(100.0, 50.0 + sum(points for points, _ in combo)))
+            if low <= score < high:
+                by_score[score].append([band for _, band in combo])
+        # With one band per dimension every row has the same score and none needs checking
+        split = sum(len(bands) > 1 for bands in dimensions)
+        country_set = set(country_ids) if country_ids is not None else None
+
+        results = []
+        for score in sorted(by_score, reverse=True):
+            if len(results) >= limit:
+                break
+            level = set()
+            for bands in by_score[score]:
+                # Walk the narrowest band of the combination; others are checked per row
+                narrowest = min(bands, key=len)
+                if country_ids is not None and len(country_ids) < len(narrowest):
+                    narrowest = country_ids
+                if split == 0:
+                    # A country list is never longer than the whole catalog, so it was picked above
+                    level.update(narrowest)
+                    continue
+                for uni_id in narrowest:
+                    if (country_set is None or uni_id in country_set) and self._score_row(profile, uni_id) == score:
+                        level.add(uni_id)
+            results.extend((uni_id, score) for uni_id in sorted(level))
+        return results[:limit]
+
+
+requirement_index = RequirementIndex()
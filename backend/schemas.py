@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, Field
-from typing import Optional, List
+from typing import Optional, List, Literal
 from datetime import datetime
 from models import UserStage, ProfileStrength, UniversityCategory, TaskStatus
 
@@ -183,6 +183,23 @@ class TaskResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class TaskBatchOperation(BaseModel):
+    op: Literal["create", "update", "delete"]
+    task_id: Optional[int] = None  # update / delete
+    task: Optional[TaskCreate] = None  # create
+    changes: Optional[TaskUpdate] = None  # update
+
+class TaskBatchRequest(BaseModel):
+    operations: List[TaskBatchOperation]
+
+class TaskBatchResult(BaseModel):
+    index: int
+    op: str
+    status: str  # ok, skipped or error
+    task_id: Optional[int] = None
+    task: Optional[TaskResponse] = None
+    detail: Optional[str] = None
+
 # Chat Schemas
 class ChatMessageCreate(BaseModel):
     content: str
@@ -200,6 +217,8 @@ class ChatMessageResponse(BaseModel):
 class ChatRequest(BaseModel):
     message: str
     context: Optional[dict] = None
+    # Ask the model again even if an identical prompt was answered recently
+    bypass_cache: bool = False
 
 class DashboardResponse(BaseModel):
     user: UserResponse
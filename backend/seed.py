@@ -1,6 +1,8 @@
 from sqlalchemy.orm import Session
 from database import SessionLocal, engine
 from models import University, Base
+from cache import invalidate_catalog
+from requirement_index import requirement_index
 
 def seed_universities():
     db = SessionLocal()
@@ -42,12 +44,16 @@ def seed_universities():
         }
     ]
 
+    created = []
     for uni_data in universities:
         uni = University(**uni_data)
         db.add(uni)
+        created.append(uni)
     
     db.commit()
+    requirement_index.add_many(created)
     db.close()
+    invalidate_catalog()
     print("✅ Seeding complete!")
 
 if __name__ == "__main__":
@@ -0,0 +1,65 @@
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from models import Task, TaskStatus
+
+DEFAULT_PRIORITY = 3
+
+
+def normalize_task(data: Dict) -> Optional[Dict]:
+    """Row values for a generated or requested task; None if it has no title"""
+    title = str(data.get("title") or "").strip()
+    if not title:
+        return None
+    try:
+        priority = int(data.get("priority", DEFAULT_PRIORITY))
+    except (TypeError, ValueError):
+        priority = DEFAULT_PRIORITY
+    return {
+        "title": title,
+        "description": data.get("description") or "",
+        "priority": priority,
+        "due_date": data.get("due_date"),
+    }
+
+
+def existing_task_titles(db: Session, user_id: int, titles: Iterable[str]) -> Set[str]:
+    """Which of `titles` the user already has, in one query"""
+    titles = set(titles)
+    if not titles:
+        return set()
+    return {
+        title for (title,) in
+        db.query(Task.title).filter(Task.user_id == user_id, Task.title.in_(titles))
+    }
+
+
+def insert_tasks(db: Session, user_id: int, rows: List[Dict]) -> List[int]:
+    """Insert normalized rows in one statement; returns their ids in order. The caller commits"""
+    if not rows:
+        return []
+    result = db.execute(
+        insert(Task).returning(Task.id, sort_by_parameter_order=True),
+        [{**row, "user_id": user_id, "status": TaskStatus.PENDING} for row in rows]
+    )
+    return [task_id for (task_id,) in result]
+
+
+def ingest_tasks(db: Session, user_id: int, tasks: Iterable[Dict]) -> List[Dict]:
+    """Add tasks whose titles the user does not have yet; returns the rows inserted, with ids.
+
+    Existing titles are fetched once and duplicates within `tasks` are dropped,
+    so any number of tasks costs two statements. Nothing is committed.
+    """
+    rows = [row for row in map(normalize_task, tasks) if row is not None]
+    seen = existing_task_titles(db, user_id, (row["title"] for row in rows))
+    new_rows = []
+    for row in rows:
+        if row["title"] not in seen:
+            seen.add(row["title"])
+            new_rows.append(row)
+    for row, task_id in zip(new_rows, insert_tasks(db, user_id, new_rows)):
+        row["id"] = task_id
+    return new_rows
@@ -0,0 +1,61 @@
+"""
+UPDATE_PROFILE actions from the model: which values are stored and how.
+"""
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from action_executor import APPLIED, SKIPPED, execute_ai_actions
+from database import Base
+from models import User, UserProfile
+from recommendation_planner import parse_preferred_countries
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def user(db):
+    user = User(email="student@example.com", full_name="Student", hashed_password="x")
+    db.add(user)
+    db.commit()
+    db.add(UserProfile(user_id=user.id, gpa=3.0, age=21))
+    db.commit()
+    return user
+
+
+def update_profile(db, user, **params):
+    [result] = execute_ai_actions([{"action": "UPDATE_PROFILE", "params": params}], user, db)
+    return result, db.query(UserProfile).filter(UserProfile.user_id == user.id).one()
+
+
+def test_country_list_is_stored_readably(db, user):
+    result, profile = update_profile(db, user, preferred_countries=["Germany", "Canada"])
+    assert result["status"] == APPLIED
+    assert parse_preferred_countries(profile.preferred_countries) == ["Germany", "Canada"]
+
+
+def test_country_text_is_kept_as_is(db, user):
+    _, profile = update_profile(db, user, preferred_countries="USA, UK")
+    assert parse_preferred_countries(profile.preferred_countries) == ["USA", "UK"]
+
+
+@pytest.mark.parametrize("gpa", [True, "nan", float("inf"), "abc"])
+def test_invalid_gpa_is_skipped(db, user, gpa):
+    result, profile = update_profile(db, user, gpa=gpa)
+    assert result["status"] == SKIPPED
+    assert profile.gpa == 3.0
+
+
+def test_invalid_fields_are_dropped_and_the_rest_applied(db, user):
+    result, profile = update_profile(db, user, age=float("nan"), ielts_score=False, major="CS", user_id=99)
+    assert result["status"] == APPLIED
+    assert result["fields"] == ["major"]
+    assert (profile.age, profile.ielts_score, profile.major, profile.user_id) == (21, None, "CS", user.id)
@@ -0,0 +1,76 @@
+"""
+ActionStreamParser against the old two-pass _parse_actions/_clean_message:
+random replies split at random chunk boundaries must parse the same way.
+"""
+import random
+
+import pytest
+
+from action_parser import ActionStreamParser, parse_reply
+from benchmarks.bench_action_parser import legacy_clean_message, legacy_parse_actions, long_reply
+
+FUZZ_CASES = 5000
+
+ATOMS = [
+    "ACTION: CREATE_TASK", "ACTION: SHORTLIST_UNIVERSITY", "ACTION:", "ACTION", "ACT", "  ACTION: X",
+    'PARAMS: {"title": "Book IELTS", "priority": 2}', 'PARAMS: {"university_id": 7}', "PARAMS: {}",
+    "PARAMS: [1, 2]", "PARAMS:", "PARAMS: {oops", "\tPARAMS: {}", "PARAM",
+    "hello", "world ", "- item", "", "  ", "A", "P",
+]
+
+# Slips the old parser rejected and the new one is expected to repair
+TOLERANT_CASES = [
+    ("{'title': 'Book IELTS', 'priority': 2}", {"title": "Book IELTS", "priority": 2}),
+    ('{"title": "Book IELTS", "priority": 2,}', {"title": "Book IELTS", "priority": 2}),
+    ('```json {"university_id": 7} ```', {"university_id": 7}),
+    ('{"university_id": 7} (shortlisting now)', {"university_id": 7}),
+    ('{"done": True, "note": None}', {"done": True, "note": None}),
+    ("not json at all", {}),
+]
+
+
+def split_randomly(text, rng):
+    cuts = sorted(rng.sample(range(len(text) + 1), min(len(text) + 1, rng.randint(0, 6))))
+    return [text[a:b] for a, b in zip([0] + cuts, cuts + [len(text)])]
+
+
+def random_reply(rng):
+    text = "\n".join(rng.choice(ATOMS) for _ in range(rng.randint(0, 8)))
+    if rng.random() < 0.3:
+        text = rng.choice(["", "\n", " "]) + text + rng.choice(["", "\n", "  "])
+    return text
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_streamed_parse_matches_old_parser(seed):
+    rng = random.Random(seed)
+    for _ in range(FUZZ_CASES):
+        text = random_reply(rng)
+
+        parser = ActionStreamParser()
+        streamed = []
+        for chunk in split_randomly(text, rng):
+            streamed.extend(parser.feed(chunk))
+        streamed.extend(parser.close())
+
+        expected_actions = legacy_parse_actions(text)
+        assert parser.message == legacy_clean_message(text), repr(text)
+        assert "".join(v for k, v in streamed if k == "text") == parser.message, repr(text)
+        assert [v for k, v in streamed if k == "action"] == parser.actions, repr(text)
+        assert [a["action"] for a in parser.actions] == [a["action"] for a in expected_actions], repr(text)
+        for new, old in zip(parser.actions, expected_actions):
+            # Identical whenever the old parser produced an object; otherwise always a dict now
+            if isinstance(old["params"], dict) and old["params"]:
+                assert new["params"] == old["params"], repr(text)
+            assert isinstance(new["params"], dict), repr(text)
+
+
+def test_long_reply_matches_old_parser():
+    reply = long_reply(200)
+    assert parse_reply(reply) == (legacy_clean_message(reply), legacy_parse_actions(reply))
+
+
+@pytest.mark.parametrize("raw,expected", TOLERANT_CASES)
+def test_tolerant_params(raw, expected):
+    _, actions = parse_reply(f"ACTION: CREATE_TASK\nPARAMS: {raw}")
+    assert actions[0]["params"] == expected
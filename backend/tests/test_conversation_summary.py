@@ -0,0 +1,65 @@
+"""
+Folding a long unsummarized backlog into the rolling conversation summary.
+"""
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import main
+from ai_counsellor import CHAT_SUMMARY_MAX_FOLD
+from database import Base
+from models import ChatMessage, ConversationSummary, User
+
+BACKLOG = 180
+
+
+@pytest.fixture
+def session_factory(monkeypatch):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    monkeypatch.setattr(main, "SessionLocal", factory)
+    return factory
+
+
+def test_backlog_is_folded_oldest_first_in_chunks(session_factory, monkeypatch):
+    db = session_factory()
+    user = User(email="student@example.com", hashed_password="x", full_name="Student")
+    db.add(user)
+    db.commit()
+    db.add_all([
+        ChatMessage(user_id=user.id, role="user" if i % 2 == 0 else "assistant", content=f"message {i}")
+        for i in range(BACKLOG)
+    ])
+    db.commit()
+    user_id = user.id
+    db.close()
+
+    chunks = []
+    summarize_fold = main.ai_counsellor.summarize_fold
+
+    async def recording_summarize_fold(plan):
+        chunks.append([m["content"] for m in plan["messages"]])
+        return await summarize_fold(plan)
+
+    monkeypatch.setattr(main.ai_counsellor, "summarize_fold", recording_summarize_fold)
+    asyncio.run(main._update_conversation_summary(user_id))
+
+    folded = [content for chunk in chunks for content in chunk]
+    assert all(len(chunk) <= CHAT_SUMMARY_MAX_FOLD for chunk in chunks)
+    assert len(chunks) > 1
+    # Contiguous from the very first message: nothing skipped, nothing folded twice
+    assert folded == [f"message {i}" for i in range(len(folded))]
+
+    db = session_factory()
+    summary = db.query(ConversationSummary).filter(ConversationSummary.user_id == user_id).one()
+    remaining = db.query(ChatMessage).filter(
+        ChatMessage.user_id == user_id, ChatMessage.id > summary.last_message_id
+    ).count()
+    assert remaining == BACKLOG - len(folded)
+    # Caught up: the next update has nothing left to fold
+    assert main.ai_counsellor.plan_summary_fold(user_id, db) is None
+    db.close()
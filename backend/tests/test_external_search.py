@@ -0,0 +1,39 @@
+"""
+Name-query pages of the global university search against ranking every match.
+"""
+import random
+
+import numpy as np
+import pytest
+
+from benchmarks.bench_external_load import make_dataset
+from external_unis import ExternalUniversitySearch
+from uni_snapshot import UniversitySnapshot, build_snapshot
+
+
+@pytest.fixture(scope="module")
+def snapshot(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("snapshot") / "world_universities.snap")
+    build_snapshot(make_dataset(3000), path, "synthetic")
+    return UniversitySnapshot(path)
+
+
+def ranked_unique(search, snapshot, name, country, fuzzy):
+    """Every match ranked, then the first record of each name"""
+    ids = np.asarray(search.match(snapshot, name, country, max_edits=2 if fuzzy else 0), dtype=np.intp)
+    _, first = np.unique(np.asarray(snapshot.columns["name"])[ids], return_index=True)
+    return ids[np.sort(first)].tolist()
+
+
+@pytest.mark.parametrize("fuzzy", [False, True])
+def test_partial_pages_match_the_full_ranking(snapshot, fuzzy):
+    search = ExternalUniversitySearch()
+    rng = random.Random(1)
+    words = [w for i in rng.sample(range(len(snapshot)), 30) for w in snapshot.name_of(i).split()]
+    for name in ["university", "univ", "of", "institute tech", "xyzq"] + words:
+        for country in (None, "Germany"):
+            expected = ranked_unique(search, snapshot, name, country, fuzzy)
+            for count in (None, 0, 1, 7, 40, len(expected) + 5):
+                ids, total = search.results(snapshot, country, name, fuzzy, count=count)
+                assert total == len(expected)
+                assert ids.tolist() == expected[:count]
@@ -0,0 +1,90 @@
+"""
+JobQueue bookkeeping against an in-memory database.
+"""
+import asyncio
+import time
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database import Base
+from jobs import JobQueue, PermanentJobError
+from models import Job, JobStatus
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture
+def queue(session_factory):
+    queue = JobQueue(workers=1, max_attempts=3, retry_base_delay=0, session_factory=session_factory)
+    queue.handler("noop")(lambda payload: {})
+    return queue
+
+
+def set_status(session_factory, job_id, status):
+    db = session_factory()
+    db.query(Job).filter(Job.id == job_id).update({Job.status: status})
+    db.commit()
+    db.close()
+
+
+def test_waiter_that_sees_a_finished_job_wakes_the_others(queue, session_factory):
+    # Not started, so the job stays pending until we finish it by hand
+    job_id = queue.enqueue("noop").id
+
+    async def run():
+        first = asyncio.create_task(queue.wait(job_id, timeout=5))
+        await asyncio.sleep(0.1)
+        # Finished, but the worker has not woken anyone yet
+        set_status(session_factory, job_id, JobStatus.SUCCEEDED)
+        await queue.wait(job_id, timeout=5)
+        start = time.perf_counter()
+        await first
+        return time.perf_counter() - start
+
+    assert asyncio.run(run()) < 1
+    assert job_id not in queue._waiters
+
+
+def run_until_finished(queue, session_factory, kind):
+    async def run():
+        await queue.start()
+        try:
+            job_id = queue.enqueue(kind).id
+            await queue.wait(job_id, timeout=5)
+        finally:
+            await queue.stop()
+        db = session_factory()
+        job = db.query(Job).filter(Job.id == job_id).one()
+        db.close()
+        return job
+
+    return asyncio.run(run())
+
+
+def test_failing_job_is_retried_until_max_attempts(queue, session_factory):
+    @queue.handler("flaky")
+    def flaky(payload):
+        raise RuntimeError("upstream down")
+
+    job = run_until_finished(queue, session_factory, "flaky")
+    assert job.status == JobStatus.FAILED
+    assert job.attempts == 3
+
+
+def test_permanent_error_fails_without_retrying(queue, session_factory):
+    @queue.handler("broken")
+    def broken(payload):
+        raise PermanentJobError("module missing")
+
+    job = run_until_finished(queue, session_factory, "broken")
+    assert job.status == JobStatus.FAILED
+    assert job.attempts == 1
+    assert "module missing" in job.error
@@ -0,0 +1,37 @@
+"""
+LLMResponseCache on the in-memory backend: expiry and discards free their entries.
+"""
+import time
+
+from cache import LRUCache
+from llm_cache import LLMResponseCache, MemoryBackend
+
+
+def test_lru_pop_removes_one_entry_and_its_bytes():
+    lru = LRUCache(max_entries=10, sizeof=len)
+    lru.set("a", "xxx")
+    lru.set("b", "yy")
+    assert lru.pop("a") == "xxx"
+    assert lru.pop("a") is None
+    assert lru.stats()["entries"] == 1
+    assert lru.stats()["bytes"] == 2
+
+
+def test_discard_frees_the_entry():
+    cache = LLMResponseCache(MemoryBackend(max_entries=10, max_bytes=1000), ttl=60)
+    cache.set("model", "prompt", "reply")
+    cache.set("model", "other", "kept")
+    cache.discard("model", "prompt")
+    assert cache.get("model", "prompt") is None
+    assert cache.get("model", "other") == "kept"
+    assert cache.stats()["entries"] == 1
+    assert cache.stats()["bytes"] == len("kept")
+
+
+def test_expired_hit_is_a_miss_and_frees_the_entry():
+    cache = LLMResponseCache(MemoryBackend(max_entries=10, max_bytes=1000), ttl=0.01)
+    cache.set("model", "prompt", "reply")
+    time.sleep(0.02)
+    assert cache.get("model", "prompt") is None
+    stats = cache.stats()
+    assert (stats["expired"], stats["entries"], stats["bytes"]) == (1, 0, 0)
@@ -0,0 +1,129 @@
+"""
+Concurrency of AICounsellor.chat against the local fake model: overlapping calls,
+the in-flight bound and the per-call timeout.
+"""
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from ai_counsellor import AICounsellor
+from fake_llm import FakeGenerativeModel
+from llm_client import LLMClient, LLMTimeoutError
+
+LATENCY = 0.2
+
+USER = SimpleNamespace(id=1, full_name="Test User")
+PROFILE = SimpleNamespace(gpa=3.5, preferred_countries="Germany")
+
+
+class PeakTrackingModel(FakeGenerativeModel):
+    """Fake model that records how many calls were running at once"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.running = 0
+        self.peak = 0
+
+    async def generate_content_async(self, prompt: str, stream: bool = False):
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            return await super().generate_content_async(prompt, stream)
+        finally:
+            self.running -= 1
+
+
+def make_counsellor(model, **client_options):
+    counsellor = AICounsellor()
+    counsellor.use_mock = False
+    counsellor.model = model
+    # Every call should reach the model
+    counsellor.llm_cache = None
+    client_options.setdefault("max_retries", 0)
+    client_options.setdefault("rate_per_minute", 60000)
+    client_options.setdefault("burst", 1000)
+    counsellor.llm_client = LLMClient(**client_options)
+    return counsellor
+
+
+async def timed_chats(counsellor, n):
+    start = time.perf_counter()
+    results = await asyncio.gather(*[
+        counsellor.chat(f"message {i}", USER, PROFILE, f"USER: message {i}") for i in range(n)
+    ])
+    return time.perf_counter() - start, results
+
+
+def test_concurrent_chats_take_about_as_long_as_one():
+    counsellor = make_counsellor(FakeGenerativeModel(latency=LATENCY), max_in_flight=8)
+
+    async def run():
+        one, _ = await timed_chats(counsellor, 1)
+        many, results = await timed_chats(counsellor, 8)
+        return one, many, results
+
+    one, many, results = asyncio.run(run())
+    assert all(not r["is_mock"] for r in results)
+    assert many < 2 * one
+
+
+def test_in_flight_calls_are_bounded():
+    model = PeakTrackingModel(latency=LATENCY)
+    counsellor = make_counsellor(model, max_in_flight=2)
+
+    elapsed, results = asyncio.run(timed_chats(counsellor, 6))
+    assert all(not r["is_mock"] for r in results)
+    assert model.peak == 2
+    # Three waves of two calls
+    assert elapsed >= 3 * LATENCY * 0.9
+    assert counsellor.llm_client.in_flight == 0
+
+
+def test_slow_call_times_out_to_fallback():
+    counsellor = make_counsellor(FakeGenerativeModel(latency=5), timeout=0.1)
+
+    elapsed, results = asyncio.run(timed_chats(counsellor, 1))
+    assert results[0]["is_mock"]
+    assert elapsed < 1
+    assert counsellor.llm_client.failures == 1
+    assert counsellor.llm_client.in_flight == 0
+
+
+def test_client_raises_timeout_error():
+    client = LLMClient(timeout=0.1, max_retries=0)
+    with pytest.raises(LLMTimeoutError):
+        asyncio.run(client.generate(FakeGenerativeModel(latency=5), "prompt"))
+
+
+def half_open_client():
+    client = LLMClient(max_retries=0, breaker_threshold=1, breaker_cooldown=0)
+    client.breaker.record_failure()
+    assert client.breaker.state == client.breaker.OPEN
+    return client
+
+
+async def cancel_soon(coroutine):
+    task = asyncio.ensure_future(coroutine)
+    await asyncio.sleep(0.05)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+
+def test_cancelled_trial_call_frees_the_breaker():
+    client = half_open_client()
+    asyncio.run(cancel_soon(client.generate(FakeGenerativeModel(latency=5), "prompt")))
+    assert client.breaker.allow()
+
+
+def test_cancelled_trial_stream_frees_the_breaker():
+    client = half_open_client()
+
+    async def consume():
+        async for _ in client.stream(FakeGenerativeModel(latency=5), "prompt"):
+            pass
+
+    asyncio.run(cancel_soon(consume()))
+    assert client.breaker.allow()
@@ -0,0 +1,71 @@
+"""
+Precomputed rankings are used only while they match the profile and the catalog.
+"""
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from cache import invalidate_catalog
+from database import Base
+from fit_scoring import profile_signature
+from models import MaterializedRecommendation, University
+from recommendation_planner import catalog_signature, materialized_ranking
+
+CATALOG_SIZE = 10
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    session.add_all([
+        University(name=f"U{i}", country="Germany", min_gpa=3.0, tuition_fee_max=1000.0 * i)
+        for i in range(CATALOG_SIZE)
+    ])
+    session.commit()
+    invalidate_catalog()
+    yield session
+    session.close()
+
+
+PROFILE = SimpleNamespace(user_id=1, gpa=3.5, ielts_score=7.0, budget_max=20000)
+
+
+def materialize(db, rows):
+    catalog = catalog_signature(db)
+    db.add_all([
+        MaterializedRecommendation(
+            user_id=PROFILE.user_id, university_id=uni_id, rank=rank, fit_score=100.0 - rank,
+            profile_signature=profile_signature(PROFILE), catalog_signature=catalog
+        )
+        for rank, uni_id in enumerate(rows)
+    ])
+    db.commit()
+
+
+def test_top_k_answers_shorter_requests_only(db):
+    materialize(db, [5, 3, 8, 1])
+    assert materialized_ranking(db, PROFILE, limit=3).ids.tolist() == [5, 3, 8]
+    assert materialized_ranking(db, PROFILE, limit=4).ids.tolist() == [5, 3, 8, 1]
+    assert materialized_ranking(db, PROFILE, limit=5) is None
+    assert materialized_ranking(db, PROFILE) is None
+
+
+def test_full_ranking_answers_any_request(db):
+    materialize(db, list(range(CATALOG_SIZE, 0, -1)))
+    assert len(materialized_ranking(db, PROFILE)) == CATALOG_SIZE
+    assert len(materialized_ranking(db, PROFILE, limit=50)) == CATALOG_SIZE
+
+
+def test_changed_profile_or_catalog_is_ignored(db):
+    materialize(db, [5, 3, 8, 1])
+    changed = SimpleNamespace(**{**vars(PROFILE), "gpa": 3.9})
+    assert materialized_ranking(db, changed, limit=2) is None
+    db.query(University).filter(University.name == "U3").update({University.min_gpa: 3.8})
+    db.commit()
+    invalidate_catalog()
+    assert materialized_ranking(db, PROFILE, limit=2) is None
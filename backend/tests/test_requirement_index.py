@@ -0,0 +1,58 @@
+"""
+RequirementIndex.query against scoring every university with _calculate_fit_score.
+"""
+import random
+from types import SimpleNamespace
+
+import pytest
+
+from ai_counsellor import AICounsellor
+from benchmarks.bench_fit_scoring import make_universities
+from requirement_index import RequirementIndex
+
+COUNTRIES = ["Germany", "Canada", "India"]
+
+
+@pytest.fixture(scope="module")
+def universities():
+    unis = make_universities(2000, seed=3)
+    for u in unis:
+        u.country = random.Random(u.id).choice(COUNTRIES)
+    return unis
+
+
+@pytest.fixture(scope="module")
+def index(universities):
+    index = RequirementIndex()
+    index.loaded = True
+    index.add_many(universities)
+    return index
+
+
+def random_profile(rng):
+    return SimpleNamespace(
+        gpa=rng.choice([None, round(rng.uniform(2, 4), 1), 3]),
+        ielts_score=rng.choice([None, 6.5, 7.0, 8]),
+        budget_max=rng.choice([0, None, rng.uniform(5000, 90000)])
+    )
+
+
+@pytest.mark.parametrize("category", [None, "safe", "target", "dream"])
+@pytest.mark.parametrize("country", [None, "germany", "Nowhere"])
+def test_query_matches_full_scoring(universities, index, category, country):
+    counsellor = AICounsellor.__new__(AICounsellor)
+    rng = random.Random(5)
+    for _ in range(25):
+        profile = random_profile(rng)
+        expected = sorted(
+            [
+                (u.id, score) for u in universities
+                for score in [counsellor._calculate_fit_score(profile, u)]
+                if (country is None or u.country.lower() == country.lower())
+                and (category is None or counsellor._categorize(score)[0] == category)
+            ],
+            key=lambda pair: (-pair[1], pair[0])
+        )
+        assert index.query(profile, category, country) == expected
+        for limit in (0, 1, 7, 500):
+            assert index.query(profile, category, country, limit=limit) == expected[:limit]
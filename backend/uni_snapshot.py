@@ -0,0 +1,461 @@
+"""
+On-disk snapshot of the global university dataset (Hipo world_universities_and_domains).
+
+The snapshot holds the records plus the indexes `ExternalUniversitySearch` needs,
+laid out as flat little-endian arrays so it can be memory-mapped and searched
+without parsing the whole dataset or rebuilding anything at startup.
+
+    python uni_snapshot.py build                          # download and write the snapshot
+    python uni_snapshot.py build --source unis.json       # build from a local copy
+    python uni_snapshot.py info                           # show version and counts
+
+File layout: MAGIC, uint32 format version, uint32 header length, a JSON header
+(dataset version, source, build time, counts and the offset/length/type of every
+section), then the sections, each aligned to 8 bytes. String columns are a byte
+blob plus uint32 offsets; index sections are uint32 arrays of record ids. Record
+fields are columns of ids into one shared, deduplicated string table, so a country,
+state or domain used by many records is stored once. Name
+tokens and character trigrams are stored as inverted indexes: sorted keys, and
+for each key a run of ascending record ids. A third one maps the trigrams of each
+padded token to token positions, for finding misspelled words.
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import re
+import sys
+import time
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence
+
+import requests
+
+MAGIC = b"UNISNAP\0"
+# Bump when the section layout changes; older snapshots are refused and must be rebuilt
+FORMAT_VERSION = 5
+
+DEFAULT_SOURCE = "https://raw.githubusercontent.com/Hipo/university-domains-list/master/world_universities_and_domains.json"
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "world_universities.snap")
+SNAPSHOT_PATH = os.getenv("EXTERNAL_UNIS_SNAPSHOT", DEFAULT_PATH)
+SOURCE_URL = os.getenv("EXTERNAL_UNIS_SOURCE", DEFAULT_SOURCE)
+
+_PREAMBLE = len(MAGIC) + 8
+_ALIGN = 8
+_TOKEN = re.compile(r"\w+")
+# String id of a missing value
+NONE = 0xFFFFFFFF
+# Hipo record fields, in the dataset's key order; any other keys are kept as JSON
+TEXT_FIELDS = ("name", "alpha_two_code", "state-province", "country")
+LIST_FIELDS = ("web_pages", "domains")
+FIELDS = ("web_pages", "name", "alpha_two_code", "state-province", "domains", "country")
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def normalize(value: str) -> str:
+    return value.lower().strip()
+
+
+def tokenize(value: str) -> List[str]:
+    return _TOKEN.findall(normalize(value))
+
+
+def trigrams(value: str) -> set:
+    return {value[i:i + 3] for i in range(len(value) - 2)}
+
+
+def word_trigrams(word: str) -> set:
+    """Trigrams of a word padded with two '$' on each side, so short words and word ends count"""
+    return trigrams(f"$${word}$$")
+
+
+def fetch_dataset(source: str = SOURCE_URL) -> List[Dict]:
+    """The raw dataset from a URL or a local JSON file"""
+    if source.startswith(("http://", "https://")):
+        response = requests.get(source, timeout=60)
+        response.raise_for_status()
+        return response.json()
+    with open(source, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _string_column(values: Sequence[bytes]):
+    offsets = array("I", [0])
+    for value in values:
+        offsets.append(offsets[-1] + len(value))
+    return b"".join(values), offsets
+
+
+def _inverted(groups: Dict[str, List[int]]):
+    """Sorted keys with the record ids of each key stored back to back"""
+    keys = sorted(key.encode("utf-8") for key in groups)
+    starts = array("I", [0])
+    ids = array("I")
+    for key in keys:
+        ids.extend(groups[key.decode("utf-8")])
+        starts.append(len(ids))
+    blob, offsets = _string_column(keys)
+    return blob, offsets, starts, ids
+
+
+class _StringTable:
+    """Builds the shared string table: each distinct string gets one id"""
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+
+    def add(self, value) -> int:
+        if value is None:
+            return NONE
+        return self.ids.setdefault(str(value), len(self.ids))
+
+    def column(self):
+        return _string_column([value.encode("utf-8") for value in self.ids])
+
+
+def _record_columns(records: List[Dict]) -> Dict:
+    strings = _StringTable()
+    columns = {field: array("I") for field in TEXT_FIELDS}
+    lists = {field: (array("I", [0]), array("I")) for field in LIST_FIELDS}
+    extra = array("I")
+    for r in records:
+        for field in TEXT_FIELDS:
+            columns[field].append(strings.add(r.get(field)))
+        for field in LIST_FIELDS:
+            starts, ids = lists[field]
+            ids.extend(strings.add(value) for value in r.get(field) or [])
+            starts.append(len(ids))
+        rest = {k: v for k, v in r.items() if k not in FIELDS}
+        extra.append(strings.add(json.dumps(rest, ensure_ascii=False)) if rest else NONE)
+
+    blob, offsets = strings.column()
+    sections = {"strings": blob, "string_offsets": offsets, "field_extra": extra}
+    for field in TEXT_FIELDS:
+        sections[f"field_{field}"] = columns[field]
+    for field in LIST_FIELDS:
+        sections[f"field_{field}_starts"], sections[f"field_{field}"] = lists[field]
+    return sections
+
+
+def build_snapshot(records: List[Dict], path: str = SNAPSHOT_PATH, source: str = "") -> Dict:
+    """Write `records` and their indexes to `path` atomically; returns the header"""
+    records = [r for r in records if r.get("name") and r.get("country")]
+    # Content hash, so the same dataset always gets the same version
+    digest = hashlib.sha256()
+    for r in records:
+        digest.update(json.dumps(r, ensure_ascii=False, sort_keys=True).encode("utf-8"))
+    names = [normalize(r["name"]).encode("utf-8") for r in records]
+    # Records are visited in id order, so every posting list comes out ascending
+    token_groups = defaultdict(list)
+    trigram_groups = defaultdict(list)
+    for i, r in enumerate(records):
+        for token in sorted(set(tokenize(r["name"]))):
+            token_groups[token].append(i)
+        for gram in trigrams(normalize(r["name"])):
+            trigram_groups[gram].append(i)
+    countries = sorted({normalize(r["country"]).encode("utf-8") for r in records})
+    country_pos = {country: i for i, country in enumerate(countries)}
+
+    # Byte order of UTF-8 equals code point order, so these sort like the decoded strings
+    by_name = sorted(range(len(records)), key=names.__getitem__)
+    name_rank = array("I", bytes(4 * len(records)))
+    for rank, i in enumerate(by_name):
+        name_rank[i] = rank
+    record_country = array("I", (country_pos[normalize(r["country"]).encode("utf-8")] for r in records))
+    # Browsing lists hold each university name once (its first record), so a
+    # page is a plain slice and the list length is the total
+    unique_ids = array("I")
+    members = defaultdict(list)
+    seen = set()
+    for i, (r, pos) in enumerate(zip(records, record_country)):
+        if r["name"] not in seen:
+            seen.add(r["name"])
+            unique_ids.append(i)
+        if (pos, r["name"]) not in seen:
+            seen.add((pos, r["name"]))
+            members[pos].append(i)
+    country_starts = array("I", [0])
+    country_ids = array("I")
+    for pos in range(len(countries)):
+        country_ids.extend(members[pos])
+        country_starts.append(len(country_ids))
+
+    name_blob, name_offsets = _string_column([names[i] for i in by_name])
+    country_blob, country_offsets = _string_column(countries)
+    token_blob, token_offsets, token_starts, token_ids = _inverted(token_groups)
+    trigram_blob, trigram_offsets, trigram_starts, trigram_ids = _inverted(trigram_groups)
+    # Positions follow the sorted token keys written by _inverted above
+    word_groups = defaultdict(list)
+    for pos, token in enumerate(sorted(token_groups, key=lambda t: t.encode("utf-8"))):
+        for gram in word_trigrams(token):
+            word_groups[gram].append(pos)
+    word_blob, word_offsets, word_starts, word_ids = _inverted(word_groups)
+    sections = {
+        **_record_columns(records),
+        "record_country": record_country,
+        "names": name_blob,
+        "name_offsets": name_offsets,
+        "name_ids": array("I", by_name),
+        "name_rank": name_rank,
+        "countries": country_blob,
+        "country_offsets": country_offsets,
+        "country_starts": country_starts,
+        "country_ids": country_ids,
+        "unique_ids": unique_ids,
+        "tokens": token_blob,
+        "token_offsets": token_offsets,
+        "token_starts": token_starts,
+        "token_ids": token_ids,
+        "trigrams": trigram_blob,
+        "trigram_offsets": trigram_offsets,
+        "trigram_starts": trigram_starts,
+        "trigram_ids": trigram_ids,
+        "word_trigrams": word_blob,
+        "word_trigram_offsets": word_offsets,
+        "word_trigram_starts": word_starts,
+        "word_trigram_tokens": word_ids,
+    }
+
+    payloads = {}
+    layout = {}
+    position = 0
+    for name, data in sections.items():
+        if isinstance(data, array):
+            if sys.byteorder != "little":
+                data = array(data.typecode, data)
+                data.byteswap()
+            layout[name] = [position, len(data) * data.itemsize, data.typecode]
+            data = data.tobytes()
+        else:
+            layout[name] = [position, len(data), "B"]
+        payloads[name] = data
+        position += len(data) + (-len(data)) % _ALIGN
+
+    header = {
+        "format": FORMAT_VERSION,
+        "version": digest.hexdigest()[:16],
+        "source": source,
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "records": len(records),
+        "distinct_names": len(unique_ids),
+        "countries": len(countries),
+        "tokens": len(token_groups),
+        "trigrams": len(trigram_groups),
+        "sections": layout,
+    }
+    header_bytes = json.dumps(header).encode("utf-8")
+    header_bytes += b" " * ((-(_PREAMBLE + len(header_bytes))) % _ALIGN)
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(FORMAT_VERSION.to_bytes(4, "little"))
+        f.write(len(header_bytes).to_bytes(4, "little"))
+        f.write(header_bytes)
+        for data in payloads.values():
+            f.write(data)
+            f.write(b"\0" * ((-len(data)) % _ALIGN))
+        f.flush()
+        os.fsync(f.fileno())
+    # Readers holding the old file keep their mapping; new opens see the new one
+    os.replace(tmp_path, path)
+    return header
+
+
+class _StringColumn:
+    """Read-only sequence of byte strings stored as one blob plus offsets"""
+    __slots__ = ("blob", "offsets")
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> bytes:
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]])
+
+
+class _InvertedIndex:
+    """Sorted keys, each with an ascending run of ids (records, or token positions)"""
+    __slots__ = ("keys", "starts", "ids")
+
+    def __init__(self, keys: _StringColumn, starts, ids):
+        self.keys = keys
+        self.starts = starts
+        self.ids = ids
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def postings(self, pos: int):
+        return self.ids[self.starts[pos]:self.starts[pos + 1]]
+
+    def get(self, key: str):
+        """Record ids for exactly `key` (empty if absent)"""
+        encoded = key.encode("utf-8")
+        pos = bisect_left(self.keys, encoded)
+        if pos < len(self.keys) and self.keys[pos] == encoded:
+            return self.postings(pos)
+        return self.ids[0:0]
+
+    def prefix_range(self, prefix: str) -> range:
+        """Key positions of every key starting with `prefix`"""
+        encoded = prefix.encode("utf-8")
+        start = bisect_left(self.keys, encoded)
+        return range(start, bisect_left(self.keys, encoded + b"\xff", start))
+
+
+class UniversitySnapshot:
+    """A snapshot file mapped into memory.
+
+    Pages are read by the OS on demand and shared between worker processes
+    mapping the same file. Records are assembled from their columns only when
+    returned.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buffer = memoryview(self._mmap)
+        if bytes(buffer[:len(MAGIC)]) != MAGIC:
+            raise SnapshotError(f"{path} is not a university snapshot")
+        file_format = int.from_bytes(buffer[len(MAGIC):len(MAGIC) + 4], "little")
+        if file_format != FORMAT_VERSION:
+            raise SnapshotError(
+                f"{path} has snapshot format {file_format}, expected {FORMAT_VERSION}; rebuild it"
+            )
+        header_length = int.from_bytes(buffer[len(MAGIC) + 4:_PREAMBLE], "little")
+        self.header = json.loads(bytes(buffer[_PREAMBLE:_PREAMBLE + header_length]))
+        base = _PREAMBLE + header_length
+
+        sections = {}
+        for name, (offset, length, typecode) in self.header["sections"].items():
+            view = buffer[base + offset:base + offset + length]
+            if typecode != "B":
+                if sys.byteorder == "little":
+                    view = view.cast(typecode)
+                else:
+                    view = array(typecode, bytes(view))
+                    view.byteswap()
+            sections[name] = view
+
+        self.strings = _StringColumn(sections["strings"], sections["string_offsets"])
+        self.columns = {field: sections[f"field_{field}"] for field in TEXT_FIELDS}
+        self.lists = {
+            field: (sections[f"field_{field}_starts"], sections[f"field_{field}"]) for field in LIST_FIELDS
+        }
+        self.extra = sections["field_extra"]
+        self.record_country = sections["record_country"]
+        self.names = _StringColumn(sections["names"], sections["name_offsets"])
+        self.name_ids = sections["name_ids"]
+        self.name_rank = sections["name_rank"]
+        self.countries = _StringColumn(sections["countries"], sections["country_offsets"])
+        self.country_starts = sections["country_starts"]
+        self.country_ids = sections["country_ids"]
+        self.unique_ids = sections["unique_ids"]
+        self.tokens = _InvertedIndex(
+            _StringColumn(sections["tokens"], sections["token_offsets"]),
+            sections["token_starts"], sections["token_ids"]
+        )
+        self.trigrams = _InvertedIndex(
+            _StringColumn(sections["trigrams"], sections["trigram_offsets"]),
+            sections["trigram_starts"], sections["trigram_ids"]
+        )
+        self.word_trigrams = _InvertedIndex(
+            _StringColumn(sections["word_trigrams"], sections["word_trigram_offsets"]),
+            sections["word_trigram_starts"], sections["word_trigram_tokens"]
+        )
+
+    @property
+    def version(self) -> str:
+        return self.header["version"]
+
+    def __len__(self) -> int:
+        return len(self.record_country)
+
+    def text(self, string_id: int) -> Optional[str]:
+        if string_id == NONE:
+            return None
+        return self.strings[string_id].decode("utf-8")
+
+    def record(self, record_id: int) -> Dict:
+        """The dataset record, rebuilt from the string table"""
+        uni = {}
+        for field in FIELDS:
+            if field in self.lists:
+                starts, ids = self.lists[field]
+                uni[field] = [self.text(i) for i in ids[starts[record_id]:starts[record_id + 1]]]
+            else:
+                uni[field] = self.text(self.columns[field][record_id])
+        extra = self.extra[record_id]
+        if extra != NONE:
+            uni.update(json.loads(self.text(extra)))
+        return uni
+
+    def name_of(self, record_id: int) -> str:
+        """Normalized name of a record"""
+        return self.names[self.name_rank[record_id]].decode("utf-8")
+
+    def country_of(self, record_id: int) -> str:
+        return self.countries[self.record_country[record_id]].decode("utf-8")
+
+    def name_prefix(self, prefix: str):
+        """Record ids whose normalized name starts with `prefix`, in name order"""
+        key = prefix.encode("utf-8")
+        start = bisect_left(self.names, key)
+        # 0xFF never occurs in UTF-8, so it sorts after every continuation of the prefix
+        stop = bisect_left(self.names, key + b"\xff", start)
+        return self.name_ids[start:stop]
+
+    def country(self, country: str) -> Optional[int]:
+        """Position of a normalized country name, or None"""
+        key = country.encode("utf-8")
+        pos = bisect_left(self.countries, key)
+        if pos < len(self.countries) and self.countries[pos] == key:
+            return pos
+        return None
+
+    def in_country(self, country: str):
+        """Record ids in a country, one per distinct name, in dataset order"""
+        pos = self.country(country)
+        if pos is None:
+            return []
+        return self.country_ids[self.country_starts[pos]:self.country_starts[pos + 1]]
+
+    def info(self) -> Dict:
+        return {k: v for k, v in self.header.items() if k != "sections"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["build", "info"])
+    parser.add_argument("--source", default=SOURCE_URL, help="dataset URL or local JSON file (build)")
+    parser.add_argument("--output", default=SNAPSHOT_PATH, help="snapshot path")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        start = time.perf_counter()
+        header = build_snapshot(fetch_dataset(args.source), args.output, args.source)
+        print(f"Wrote {args.output}: {header['records']} universities in {header['countries']} countries, "
+              f"version {header['version']} ({os.path.getsize(args.output) / 1e6:.1f} MB, "
+              f"{time.perf_counter() - start:.2f}s)")
+    else:
+        start = time.perf_counter()
+        snapshot = UniversitySnapshot(args.output)
+        elapsed = time.perf_counter() - start
+        print(json.dumps(snapshot.info(), indent=2))
+        print(f"opened in {elapsed * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -17,6 +17,7 @@ export default function ChatPage() {
     const [input, setInput] = useState('');
     const [isLoading, setIsLoading] = useState(false);
     const [isFetchingHistory, setIsFetchingHistory] = useState(true);
+    const [earlierCursor, setEarlierCursor] = useState<number | null>(null);
     const messagesEndRef = useRef<HTMLDivElement>(null);
 
     // Voice State
@@ -50,6 +51,8 @@ export default function ChatPage() {
         try {
             const response = await chatAPI.getHistory();
             setMessages(response.data);
+            const cursor = response.headers['x-next-cursor'];
+            setEarlierCursor(cursor ? Number(cursor) : null);
         } catch (error: any) {
             if (error.response?.status === 401) {
                 router.push('/login');
@@ -61,6 +64,18 @@ export default function ChatPage() {
         }
     };
 
+    const loadEarlierMessages = async () => {
+        if (earlierCursor === null) return;
+        try {
+            const response = await chatAPI.getHistory({ before_id: earlierCursor });
+            setMessages((prev) => [...response.data, ...prev]);
+            const cursor = response.headers['x-next-cursor'];
+            setEarlierCursor(cursor ? Number(cursor) : null);
+        } catch (error) {
+            toast.error('Failed to load earlier messages');
+        }
+    };
+
     const scrollToBottom = () => {
         messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
     };
@@ -108,31 +123,49 @@ export default function ChatPage() {
         };
         setMessages(prev => [...prev, tempUserMsg]);
 
-        try {
-            const response = await chatAPI.sendMessage({ message: userMessage });
+        // Replace the in-progress AI message (always last once streaming starts)
+        let streaming = false;
+        const updateAiMessage = (update: (msg: any) => any) => {
+            setMessages(prev => [...prev.slice(0, -1), update(prev[prev.length - 1])]);
+        };
 
-            // Add AI response
+        try {
+            const result = await chatAPI.streamMessage({ message: userMessage }, (text) => {
+                if (!streaming) {
+                    streaming = true;
+                    setIsLoading(false);
+                    setMessages(prev => [...prev, { role: 'assistant', content: text, created_at: new Date().toISOString() }]);
+                } else {
+                    updateAiMessage(msg => ({ ...msg, content: msg.content + text }));
+                }
+            });
+
+            // The final message is authoritative (e.g. after a fallback)
             const aiMessage = {
                 role: 'assistant',
-                content: response.data.message,
-                action_results: response.data.action_results,
+                content: result.message,
+                action_results: result.action_results,
                 created_at: new Date().toISOString()
             };
-            setMessages(prev => [...prev, aiMessage]);
+            if (streaming) {
+                updateAiMessage(() => aiMessage);
+            } else {
+                setMessages(prev => [...prev, aiMessage]);
+            }
 
             // Perform TTS on AI response
             if (isTTSActive) {
-                speakMessage(response.data.message);
+                speakMessage(result.message);
             }
 
             // Show success for actions
-            if (response.data.actions && response.data.actions.length > 0) {
+            if (result.actions && result.actions.length > 0) {
                 toast.success('AI Counsellor performed actions based on our conversation');
             }
         } catch (error: any) {
             toast.error('Failed to send message');
-            // Remove the temporary user message on error
-            setMessages(prev => prev.slice(0, -1));
+            // Remove the temporary user message (and any partial reply) on error
+            setMessages(prev => prev.slice(0, streaming ? -2 : -1));
         } finally {
             setIsLoading(false);
         }
@@ -223,6 +256,16 @@ export default function ChatPage() {
                         </div>
                     ) : (
                         <div className="space-y-6">
+                            {earlierCursor !== null && (
+                                <div className="flex justify-center">
+                                    <button
+                                        onClick={loadEarlierMessages}
+                                        className="text-sm text-indigo-400 hover:text-indigo-300 transition-colors"
+                                    >
+                                        Load earlier messages
+                                    </button>
+                                </div>
+                            )}
                             {messages.map((message, index) => (
                                 <div
                                     key={index}
@@ -264,7 +307,7 @@ export default function ChatPage() {
                                             {/* Action Results (e.g. University Search) */}
                                             {message.action_results && message.action_results.map((result: any, rid: number) => (
                                                 <div key={rid} className="mt-2 space-y-4">
-                                                    {result.type === 'PROFILE_UPDATE' && (
+                                                    {result.type === 'PROFILE_UPDATE' && result.status === 'applied' && (
                                                         <motion.div
                                                             initial={{ opacity: 0, x: -10 }}
                                                             animate={{ opacity: 1, x: 0 }}
@@ -2,7 +2,7 @@
 
 import { useState, useEffect } from 'react';
 import { useRouter } from 'next/navigation';
-import { shortlistAPI } from '@/lib/api';
+import { jobAPI, shortlistAPI } from '@/lib/api';
 import Button from '@/components/ui/Button';
 import Card from '@/components/ui/Card';
 import toast, { Toaster } from 'react-hot-toast';
@@ -42,12 +42,18 @@ export default function ShortlistPage() {
 
     const handleLock = async (shortlistId: number) => {
         try {
-            await shortlistAPI.lock({ shortlist_id: shortlistId, lock: true });
+            const { data } = await shortlistAPI.lock({ shortlist_id: shortlistId, lock: true });
+            fetchShortlist();
+            // Tasks are generated in the background; report once the job is done
+            const job = data.job_id ? await jobAPI.waitFor(data.job_id) : null;
+            if (job && job.status === 'failed') {
+                toast.error('University locked, but the AI roadmap could not be generated');
+                return;
+            }
             toast.success('UNIVERISTY LOCKED: AI roadmap generated for this institution!', {
                 duration: 5000,
                 icon: '🚀'
             });
-            fetchShortlist();
         } catch (error) {
             toast.error('Failed to lock university');
         }
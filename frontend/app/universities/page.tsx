@@ -48,7 +48,9 @@ export default function UniversitiesPage() {
                 const response = await universityAPI.searchGlobal({
                     country: filters.country,
                     name: filters.name,
-                    limit: 20
+                    limit: 20,
+                    // Tolerate typos; exact matches still come first
+                    fuzzy: true
                 });
                 setUniversities(response.data);
             } else {
@@ -71,8 +71,36 @@ export const universityAPI = {
         max_ranking?: number;
         major?: string
     }) => api.get('/universities', { params: filters }),
-    getRecommendations: () => api.get('/universities/recommendations'),
-    searchGlobal: (params: { country?: string; name?: string; limit?: number; offset?: number }) =>
+    getRecommendations: (params?: { limit?: number; cursor?: string; preferred_only?: boolean }) =>
+        api.get('/universities/recommendations', { params }),
+    // Reads the NDJSON stream so each recommendation can render as soon as it arrives
+    streamRecommendations: async (
+        onItem: (rec: any) => void,
+        params?: { limit?: number; preferred_only?: boolean }
+    ) => {
+        const query = new URLSearchParams({ stream: 'true' });
+        if (params?.limit) query.set('limit', String(params.limit));
+        if (params?.preferred_only) query.set('preferred_only', 'true');
+        const response = await fetch(`${API_BASE_URL}/universities/recommendations?${query}`, {
+            headers: { Authorization: `Bearer ${localStorage.getItem('token') || ''}` },
+        });
+        if (!response.ok || !response.body) throw new Error(`Recommendations failed: ${response.status}`);
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffered = '';
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            buffered += decoder.decode(value, { stream: true });
+            const lines = buffered.split('\n');
+            buffered = lines.pop() || '';
+            lines.filter(Boolean).forEach((line) => onItem(JSON.parse(line)));
+        }
+        if (buffered.trim()) onItem(JSON.parse(buffered));
+        return response.headers.get('X-Next-Cursor');
+    },
+    // X-Total-Count has the number of results, X-Next-Cursor the `cursor` for the next page
+    searchGlobal: (params: { country?: string; name?: string; limit?: number; offset?: number; cursor?: string; fuzzy?: boolean; max_edits?: number }) =>
         api.get('/external-universities/search', { params }),
     importExternal: (uniData: any) => api.post('/universities/import', uniData),
 };
@@ -86,19 +114,76 @@ export const shortlistAPI = {
     remove: (id: number) => api.delete(`/shortlist/${id}`),
 };
 
+// Background job API (task generation after a lock, university enrichment)
+export const jobAPI = {
+    // With wait (seconds, max 30) the server holds the request until the job finishes
+    get: (id: number, wait?: number) => api.get(`/jobs/${id}`, { params: wait ? { wait } : undefined }),
+    // Long-polls until the job has succeeded or failed, or until timeoutMs passes
+    waitFor: async (id: number, timeoutMs = 120000) => {
+        const deadline = Date.now() + timeoutMs;
+        while (true) {
+            const { data } = await jobAPI.get(id, 25);
+            if (data.status === 'succeeded' || data.status === 'failed' || Date.now() > deadline) {
+                return data;
+            }
+        }
+    },
+};
+
 // Task API
 export const taskAPI = {
     getAll: () => api.get('/tasks'),
     create: (data: any) => api.post('/tasks', data),
     update: (id: number, data: any) => api.put(`/tasks/${id}`, data),
     delete: (id: number) => api.delete(`/tasks/${id}`),
+    // Several creates/updates/deletes in one request and one transaction; one result per operation
+    batch: (operations: TaskBatchOperation[]) => api.post('/tasks/batch', { operations }),
 };
 
+export type TaskBatchOperation =
+    | { op: 'create'; task: { title: string; description?: string; priority?: number; due_date?: string } }
+    | { op: 'update'; task_id: number; changes: { title?: string; description?: string; status?: string; priority?: number; due_date?: string } }
+    | { op: 'delete'; task_id: number };
+
 // Chat API
 export const chatAPI = {
-    getHistory: () => api.get('/chat/history'),
+    // Latest messages first page; pass the X-Next-Cursor header back as before_id for older ones
+    getHistory: (params?: { before_id?: number; limit?: number }) =>
+        api.get('/chat/history', { params }),
     sendMessage: (data: { message: string; context?: any }) =>
         api.post('/chat', data),
+    // Streams the reply over server-sent events; resolves with the final /chat-shaped payload
+    streamMessage: async (data: { message: string; context?: any }, onToken: (text: string) => void) => {
+        const response = await fetch(`${API_BASE_URL}/chat/stream`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                Authorization: `Bearer ${localStorage.getItem('token') || ''}`,
+            },
+            body: JSON.stringify(data),
+        });
+        if (!response.ok || !response.body) throw new Error(`Chat failed: ${response.status}`);
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffered = '';
+        let result: any = null;
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            buffered += decoder.decode(value, { stream: true });
+            const events = buffered.split('\n\n');
+            buffered = events.pop() || '';
+            for (const block of events) {
+                const event = block.match(/^event: (.*)$/m)?.[1];
+                const payload = block.match(/^data: (.*)$/m)?.[1];
+                if (!payload) continue;
+                if (event === 'token') onToken(JSON.parse(payload).text);
+                else if (event === 'done') result = JSON.parse(payload);
+            }
+        }
+        if (!result) throw new Error('Chat stream ended early');
+        return result;
+    },
 };
 
 // Dashboard API